@@ -0,0 +1,1442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Astra DB 效能基準測試
+使用本地替身（無需網路與 API 金鑰）量測 AstraDBManager 的吞吐量
+
+用法:
+    python examples/astra-benchmark.py embed --docs 500 --collection documents
+    python examples/astra-benchmark.py upload --docs 2000 --concurrency 1 2 4 8 16
+    python examples/astra-benchmark.py reingest --docs 2000 --changed 0.05
+    python examples/astra-benchmark.py ann --vectors 50000 --dimension 384 --nprobe 1 4 16 64
+    python examples/astra-benchmark.py chunking --mb 50 --max-tokens 512 --overlap-tokens 64
+    python examples/astra-benchmark.py query-cache --docs 5000 --queries 50 --repeat 20
+    python examples/astra-benchmark.py wire --docs 20 --dimensions 384 1536
+    python examples/astra-benchmark.py batch --docs 2000 --collection documents
+    python examples/astra-benchmark.py collections --create-latency 0.5
+    python examples/astra-benchmark.py cold-start --runs 5 --max-import-ms 200
+    python examples/astra-benchmark.py search-many --queries 64 --concurrency 8
+    python examples/astra-benchmark.py hybrid --docs 2000 --queries 50 --modes vector hybrid auto
+    python examples/astra-benchmark.py threshold --docs 2000 --queries 50 --limit 5 --threshold 0.7
+    python examples/astra-benchmark.py context --docs 5000 --queries 500 --limit 10 --max-tokens 2000
+    python examples/astra-benchmark.py quantization --vectors 20000 --rescore 0 4
+    python examples/astra-benchmark.py filter --vectors 50000 --categories 10
+    python examples/astra-benchmark.py dimensions --dimensions 256 512 1024 1536 --corpus docs.jsonl
+    python examples/astra-benchmark.py concurrency --tasks 1 2 4 8 16 32 --workload mixed
+    python examples/astra-benchmark.py --output base.json suite --docs 2000 --queries 200
+    python examples/astra-benchmark.py compare base.json new.json --threshold 0.10
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from astra_ann_index import IVFPQIndex
+from astra_batch import DocumentBatch
+from astra_chunking import CHUNK_STRATEGIES, TextChunker, chunk_documents, count_tokens
+from astra_context import ContextBuilder
+from astra_ingest import iter_documents
+from astra_lexical import SEARCH_MODES
+from astra_loader import load_astra_integration
+from astra_local_index import LocalVectorIndex
+from astra_manifest import IngestManifest
+from astra_vector_codec import encode_document_vectors, vector_matrix
+from astra_standins import (
+    FakeAsyncOpenAIClient, FakeCollection, FakeDatabase, FakeOpenAIClient, FakeSentenceTransformer, fake_vector
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def make_manager(args: argparse.Namespace):
+    """建立接上本地替身的 AstraDBManager"""
+    module = load_astra_integration()
+    manager = module.AstraDBManager(args.config)
+    if not manager.config:
+        sys.exit(1)
+
+    # 停用嵌入快取與匯入清單，避免前一輪的結果讓後一輪直接命中或略過
+    manager.embedding_cache = None
+    manager.ingest_manifest = None
+    manager.openai_client = FakeOpenAIClient(
+        request_latency=args.request_latency,
+        per_text_latency=args.per_text_latency
+    )
+    manager.async_openai_client = FakeAsyncOpenAIClient(
+        request_latency=args.request_latency,
+        per_text_latency=args.per_text_latency,
+        blocking=getattr(args, "blocking", False)
+    )
+    manager.embedding_model = FakeSentenceTransformer(
+        call_latency=args.request_latency / 4,
+        per_text_latency=args.per_text_latency
+    )
+    return manager
+
+
+def sample_texts(count: int) -> List[str]:
+    """產生基準測試用的範例文字"""
+    return [f"第 {i} 號文檔：人工智慧是計算機科學的一個分支，機器學習與深度學習是其子領域。" for i in range(count)]
+
+
+def bench_embed(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較逐文檔嵌入與批量嵌入的吞吐量"""
+    manager = make_manager(args)
+    texts = sample_texts(args.docs)
+
+    collection_config = manager.config['astra_db']['collections'][args.collection]
+    if collection_config['service'] == 'openai':
+        embed_one = manager.get_embedding_openai
+    else:
+        embed_one = manager.get_embedding_sentence_transformers
+
+    print(f"🧪 嵌入吞吐量: {args.docs} 個文檔, 集合 '{args.collection}' ({collection_config['service']})")
+
+    start = time.perf_counter()
+    for text in texts:
+        embed_one(text)
+    per_document_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    manager.embed_texts(texts, args.collection)
+    batched_seconds = time.perf_counter() - start
+
+    result = {
+        "docs": args.docs,
+        "batch_size": manager.config['astra_db'].get('settings', {}).get('batch_size', 100),
+        "per_document_docs_per_sec": args.docs / per_document_seconds,
+        "batched_docs_per_sec": args.docs / batched_seconds,
+        "speedup": per_document_seconds / batched_seconds
+    }
+
+    print(f"   - 逐文檔: {per_document_seconds:.2f} 秒 ({result['per_document_docs_per_sec']:.1f} docs/sec)")
+    print(f"   - 批量 (batch_size={result['batch_size']}): {batched_seconds:.2f} 秒 ({result['batched_docs_per_sec']:.1f} docs/sec)")
+    print(f"   - 加速: {result['speedup']:.1f}x")
+    return result
+
+
+def bench_upload(args: argparse.Namespace) -> Dict[str, Any]:
+    """量測 insert_documents 在不同並行度下的上傳吞吐量"""
+    manager = make_manager(args)
+    dimension = manager.config['astra_db']['collections'][args.collection]['dimension']
+    texts = sample_texts(args.docs)
+    vectors = [fake_vector(text, dimension).tolist() for text in texts]
+
+    print(f"🧪 上傳吞吐量: {args.docs} 個文檔, 區塊大小 "
+          f"{manager.config['astra_db'].get('settings', {}).get('insert_chunk_size', 20)}, "
+          f"模擬容量 {args.max_in_flight or '無上限'}")
+
+    results = []
+    for concurrency in args.concurrency:
+        collection = FakeCollection(
+            args.collection,
+            request_latency=args.insert_latency,
+            max_in_flight=args.max_in_flight
+        )
+        manager.collections[args.collection] = collection
+        documents = [{"text": text, "$vector": vector} for text, vector in zip(texts, vectors)]
+
+        report = asyncio.run(manager.insert_documents(documents, args.collection, concurrency=concurrency))
+        result = {
+            "concurrency": concurrency,
+            "docs_per_sec": report.inserted / report.seconds if report.seconds else 0.0,
+            "inserted": report.inserted,
+            "failed": report.failed,
+            "requests": collection.requests,
+            "rejected": collection.rejected
+        }
+        results.append(result)
+        print(f"   - 並行 {concurrency:>3}: {result['docs_per_sec']:8.1f} docs/sec, "
+              f"請求 {result['requests']}, 被拒 {result['rejected']}, 失敗 {result['failed']}")
+    return {"runs": results}
+
+
+def bench_reingest(args: argparse.Namespace) -> Dict[str, Any]:
+    """第一次完整匯入後修改部分文檔再重新匯入，比較有無匯入清單時的耗時、嵌入與 Data API 請求數"""
+    texts = sample_texts(args.docs)
+    changed = set(range(0, args.docs, max(1, round(1 / args.changed)))) if args.changed > 0 else set()
+    revised = [f"{text}（修訂版）" if i in changed else text for i, text in enumerate(texts)]
+    # 每個文檔有穩定的來源鍵，修改後的文檔覆寫原本的 _id，集合內不會留下舊版本
+    original = [{"text": text, "metadata": {"source": f"doc-{i}.md"}} for i, text in enumerate(texts)]
+    edited = [{"text": text, "metadata": {"source": f"doc-{i}.md"}} for i, text in enumerate(revised)]
+
+    print(f"🧪 重新匯入: {args.docs} 個文檔, 其中 {len(changed)} 個內容變更")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("full", "manifest"):
+            manager = make_manager(args)
+            manager.id_fields = ["metadata.source", "metadata.chunk_index"]
+            if mode == "manifest":
+                manager.ingest_manifest = IngestManifest(os.path.join(directory, "manifest.sqlite3"))
+            collection = FakeCollection(args.collection, request_latency=args.insert_latency)
+            manager.collections[args.collection] = collection
+            asyncio.run(manager.insert_documents([dict(doc) for doc in original], args.collection))
+
+            embeddings = manager.openai_client.embeddings
+            embedded_before = embeddings.texts + manager.async_openai_client.embeddings.texts
+            requests_before = collection.requests
+            start = time.perf_counter()
+            report = asyncio.run(manager.insert_documents([dict(doc) for doc in edited], args.collection))
+            seconds = time.perf_counter() - start
+            results[mode] = {
+                "seconds": seconds,
+                "uploaded": report.inserted,
+                "skipped": report.skipped,
+                "embedded_texts": embeddings.texts + manager.async_openai_client.embeddings.texts - embedded_before,
+                "astra_requests": collection.requests - requests_before,
+                "stored_documents": len(collection.documents)
+            }
+            label = "匯入清單" if mode == "manifest" else "無清單"
+            print(f"   - {label}: {seconds:.2f} 秒, 嵌入 {results[mode]['embedded_texts']} 段文字, "
+                  f"上傳 {report.inserted} 個, 略過 {report.skipped} 個, Data API 請求 {results[mode]['astra_requests']}, "
+                  f"集合內 {len(collection.documents)} 個文檔")
+    results["speedup"] = results["full"]["seconds"] / results["manifest"]["seconds"]
+    print(f"   - 加速: {results['speedup']:.1f}x")
+    return results
+
+
+def clustered_vectors(count: int, dimension: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """產生分群結構的合成向量（比均勻亂數更接近真實嵌入的分佈）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    noise = rng.standard_normal((count, dimension)).astype(np.float32)
+    return centers[rng.integers(0, clusters, count)] + 0.5 * noise
+
+
+def measure_queries(index, queries: np.ndarray, k: int):
+    """執行全部查詢，回傳每個查詢的結果 _id 列表與 QPS"""
+    start = time.perf_counter()
+    results = [[hit['_id'] for hit in index.search(query, k)] for query in queries]
+    elapsed = time.perf_counter() - start
+    return results, len(queries) / elapsed
+
+
+def recall_at_k(results: List[List[Any]], truth: List[List[Any]], k: int) -> float:
+    """recall@k: 近似結果前 k 名中包含多少精確前 k 名"""
+    hits = sum(len(set(result[:k]) & set(expected[:k])) for result, expected in zip(results, truth))
+    return hits / (k * len(truth))
+
+
+def bench_ann(args: argparse.Namespace) -> Dict[str, Any]:
+    """建置 IVF-PQ 索引，並以精確搜索為基準報告 recall@k、QPS 與每向量記憶體"""
+    vectors = clustered_vectors(args.vectors, args.dimension, args.clusters)
+    payloads = [{"_id": i} for i in range(args.vectors)]
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(args.vectors, args.queries, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    print(f"🧪 ANN 索引: {args.vectors} 個 {args.dimension} 維向量, metric={args.metric}, "
+          f"nlist={args.nlist}, m={args.m}")
+
+    exact = LocalVectorIndex(args.dimension, args.metric, initial_capacity=args.vectors)
+    exact.add_vectors(vectors, payloads)
+    truth, exact_qps = measure_queries(exact, queries, args.k)
+
+    start = time.perf_counter()
+    ann = IVFPQIndex(args.dimension, args.metric, nlist=args.nlist, m=args.m, keep_vectors=any(args.rerank))
+    ann.build(vectors, payloads)
+    build_seconds = time.perf_counter() - start
+
+    result = {
+        "vectors": args.vectors,
+        "dimension": args.dimension,
+        "build_seconds": build_seconds,
+        "exact": {"qps": exact_qps, "bytes_per_vector": exact.memory_bytes() / len(exact)},
+        "ann_bytes_per_vector": ann.memory_bytes(include_vectors=False) / len(ann),
+        "runs": []
+    }
+    print(f"   - 建置耗時: {build_seconds:.1f} 秒")
+    print(f"   - 記憶體: 精確 {result['exact']['bytes_per_vector']:.0f} bytes/向量, "
+          f"IVF-PQ {result['ann_bytes_per_vector']:.1f} bytes/向量（重新計分用的原始向量可 mmap 放在磁碟）")
+    print(f"   - 精確搜索: {exact_qps:.0f} QPS")
+
+    for rerank in args.rerank:
+        for nprobe in args.nprobe:
+            ann.nprobe, ann.rerank = nprobe, rerank
+            results, qps = measure_queries(ann, queries, args.k)
+            run = {"nprobe": nprobe, "rerank": rerank, "qps": qps,
+                   f"recall@{args.k}": recall_at_k(results, truth, args.k)}
+            result["runs"].append(run)
+            print(f"   - nprobe {nprobe:>4}, rerank {rerank:>2}: "
+                  f"recall@{args.k} {run[f'recall@{args.k}']:.3f}, {qps:.0f} QPS")
+    return result
+
+
+def bench_filter(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較單一分類的查詢：多取結果後在客戶端過濾，與以 filter 預先篩選後只對該分類計分"""
+    vectors = clustered_vectors(args.vectors, args.dimension, args.clusters)
+    categories = [f"category-{i}" for i in range(args.categories)]
+    payloads = [{"_id": i, "metadata": {"category": categories[i % args.categories], "source": f"source-{i % 7}"}}
+                for i in range(args.vectors)]
+    index = LocalVectorIndex(args.dimension, precision=args.precision)
+    index.add_vectors(vectors, payloads)
+    queries = clustered_vectors(args.queries, args.dimension, args.clusters, seed=1)
+    targets = [categories[i % args.categories] for i in range(args.queries)]
+    fetch = args.k * args.overfetch
+
+    print(f"🧪 過濾搜索: {args.vectors} 個向量, {args.categories} 個分類, {args.precision}, "
+          f"{args.queries} 個查詢, k={args.k}")
+    index.search(queries[0], args.k, filter={"metadata.category": targets[0]})  # 建立倒排表
+
+    start = time.perf_counter()
+    short = 0
+    for query, category in zip(queries, targets):
+        hits = [hit for hit in index.search(query, fetch) if hit["metadata"]["category"] == category][:args.k]
+        short += len(hits) < args.k
+    overfetch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prefilter_short = 0
+    for query, category in zip(queries, targets):
+        hits = index.search(query, args.k, filter={"metadata.category": category})
+        prefilter_short += len(hits) < args.k
+    prefilter_seconds = time.perf_counter() - start
+
+    result = {
+        "overfetch": {"qps": args.queries / overfetch_seconds, "transferred": fetch, "short_queries": short},
+        "prefilter": {"qps": args.queries / prefilter_seconds, "transferred": args.k, "short_queries": prefilter_short},
+        "scored_fraction": 1 / args.categories
+    }
+    print(f"   - 多取 {fetch} 個後客戶端過濾: {result['overfetch']['qps']:.0f} QPS, 每次傳回 {fetch} 個文檔, "
+          f"{short} 個查詢不足 {args.k} 個結果")
+    print(f"   - filter 預先篩選: {result['prefilter']['qps']:.0f} QPS, 每次傳回 {args.k} 個文檔, "
+          f"只對 {result['scored_fraction']:.0%} 的向量計分, {prefilter_short} 個查詢不足 {args.k} 個結果")
+    return result
+
+
+def bench_quantization(args: argparse.Namespace) -> Dict[str, Any]:
+    """依各集合的維度與度量，比較 float32 / float16 / int8 本地索引的記憶體、QPS 與 recall@k"""
+    collections = load_astra_integration().AstraDBManager(args.config).config['astra_db']['collections']
+    names = args.collection or list(collections)
+    report = {"k": args.k, "collections": {}}
+
+    for name in names:
+        dimension, metric = collections[name]['dimension'], collections[name]['vector_metric']
+        if args.vectors_file:
+            vectors = np.load(args.vectors_file).astype(np.float32)
+            if vectors.shape[1] != dimension:
+                print(f"⚠️  {args.vectors_file} 為 {vectors.shape[1]} 維，跳過集合 '{name}' ({dimension} 維)")
+                continue
+        else:
+            vectors = clustered_vectors(args.vectors, dimension, args.clusters)
+        payloads = [{"_id": i} for i in range(len(vectors))]
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+        queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+        exact = LocalVectorIndex(dimension, metric, initial_capacity=len(vectors))
+        exact.add_vectors(vectors, payloads)
+        truth, exact_qps = measure_queries(exact, queries, args.k)
+        # list[float]：每個元素一個 8 位元組指標加一個 24 位元組 float 物件
+        list_bytes = sys.getsizeof([0.0] * dimension) + 24 * dimension
+
+        print(f"🧪 量化存儲: 集合 '{name}' ({len(vectors)} 個 {dimension} 維向量, metric={metric})")
+        print(f"   {'精度':<8} {'rescore':>7} {'bytes/向量':>10} {'vs float32':>10} {'vs list':>8} "
+              f"{'QPS':>8} {'recall@' + str(args.k):>10}")
+        rows = [{"precision": "float32", "rescore": 0, "bytes_per_vector": exact.memory_bytes() / len(exact),
+                 "qps": exact_qps, "recall": 1.0}]
+        for precision in ("float16", "int8"):
+            for rescore in args.rescore:
+                index = LocalVectorIndex(dimension, metric, initial_capacity=len(vectors),
+                                         precision=precision, rescore=rescore)
+                index.add_vectors(vectors, payloads)
+                results, qps = measure_queries(index, queries, args.k)
+                # 精確重新計分的原始向量保存後以 mmap 載入，不計入常駐記憶體
+                rows.append({
+                    "precision": precision,
+                    "rescore": rescore,
+                    "bytes_per_vector": index.memory_bytes(include_vectors=False) / len(index),
+                    "qps": qps,
+                    "recall": recall_at_k(results, truth, args.k)
+                })
+        for row in rows:
+            row["compression_vs_float32"] = rows[0]["bytes_per_vector"] / row["bytes_per_vector"]
+            row["compression_vs_list"] = list_bytes / row["bytes_per_vector"]
+            print(f"   {row['precision']:<8} {row['rescore']:>7} {row['bytes_per_vector']:>10.0f} "
+                  f"{row['compression_vs_float32']:>9.1f}x {row['compression_vs_list']:>7.1f}x "
+                  f"{row['qps']:>8.0f} {row['recall']:>10.3f}")
+        report["collections"][name] = {"dimension": dimension, "metric": metric, "list_bytes_per_vector": list_bytes,
+                                       "runs": rows}
+    return report
+
+
+def load_queries(path: Optional[str], count: int) -> List[str]:
+    """評估用查詢：每行一個查詢的文字檔，預設取 test-cases.json 的 input，不足時補上合成查詢"""
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()][:count]
+
+    queries = []
+    test_cases = Path(__file__).resolve().parent / "test-cases.json"
+    if test_cases.exists():
+        with open(test_cases, 'r', encoding='utf-8') as f:
+            queries = [case['input'] for case in json.load(f).get('test_cases', []) if case.get('input')]
+    queries += [f"關於第 {i} 號主題的問題" for i in range(max(0, count - len(queries)))]
+    return queries[:count]
+
+
+def bench_dimensions(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較 OpenAI 集合縮短嵌入維度（dimensions 參數）後的 recall@k、嵌入與搜索延遲，以最大維度的結果為基準"""
+    if args.live:
+        manager = load_astra_integration().AstraDBManager(args.config)
+        if not manager.config:
+            sys.exit(1)
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            print("❌ --live 需要設置 OPENAI_API_KEY 環境變數")
+            sys.exit(1)
+        manager.setup_embedding_models(api_key)
+        manager.embedding_cache = None
+    else:
+        manager = make_manager(args)
+
+    collection_config = manager.config['astra_db']['collections'][args.collection]
+    if collection_config['service'] != 'openai':
+        print(f"❌ 集合 '{args.collection}' 不是 OpenAI 集合，無法縮短維度")
+        sys.exit(1)
+
+    if args.corpus:
+        texts = [doc['text'] for doc in iter_documents(args.corpus, args.text_field)][:args.docs]
+    else:
+        texts = sample_texts(args.docs)
+    queries = load_queries(args.queries_file, args.queries)
+    payloads = [{"_id": i} for i in range(len(texts))]
+    dimensions = sorted(set(args.dimensions))
+    metric = collection_config['vector_metric']
+    print(f"🧪 嵌入維度: 集合 '{args.collection}' ({len(texts)} 個文檔, {len(queries)} 個查詢, "
+          f"metric={metric}{', OpenAI API' if args.live else ''})")
+
+    original_dimension = collection_config.get('dimension')
+    runs = []
+    try:
+        for dimension in dimensions:
+            collection_config['dimension'] = dimension
+            start = time.perf_counter()
+            vectors = manager.embed_texts(texts, args.collection)
+            embed_seconds = time.perf_counter() - start
+
+            query_latencies, query_vectors = [], []
+            for query in queries:
+                start = time.perf_counter()
+                query_vectors.extend(manager.embed_texts([query], args.collection))
+                query_latencies.append(time.perf_counter() - start)
+
+            index = LocalVectorIndex(dimension, metric, initial_capacity=len(texts))
+            index.add_vectors(np.asarray(vectors, dtype=np.float32), payloads)
+            results, qps = measure_queries(index, np.asarray(query_vectors, dtype=np.float32), args.k)
+            runs.append({
+                "dimension": dimension,
+                "results": results,
+                "embed_docs_per_second": len(texts) / embed_seconds,
+                "query_embed_ms": latency_summary(query_latencies),
+                "search_qps": qps,
+                # Data API 以 JSON 陣列傳送 $vector，維度直接決定每次插入與查詢的請求大小
+                "json_bytes_per_vector": sum(len(json.dumps(vector)) for vector in vectors) / len(vectors),
+                "bytes_per_vector": index.memory_bytes() / len(index)
+            })
+    finally:
+        collection_config['dimension'] = original_dimension
+
+    truth = runs[-1].pop("results")
+    runs[-1][f"recall@{args.k}"] = 1.0
+    for run in runs[:-1]:
+        run[f"recall@{args.k}"] = recall_at_k(run.pop("results"), truth, args.k)
+
+    print(f"   {'維度':>6} {'recall@' + str(args.k):>10} {'嵌入 docs/s':>12} {'查詢嵌入 p50':>13} "
+          f"{'搜索 QPS':>10} {'JSON bytes':>11} {'bytes/向量':>10}")
+    for run in runs:
+        print(f"   {run['dimension']:>6} {run[f'recall@{args.k}']:>10.3f} {run['embed_docs_per_second']:>12.0f} "
+              f"{run['query_embed_ms']['p50_ms']:>11.1f}ms {run['search_qps']:>10.0f} "
+              f"{run['json_bytes_per_vector']:>11.0f} {run['bytes_per_vector']:>10.0f}")
+    print(f"   （recall 以 {dimensions[-1]} 維的前 {args.k} 名為基準；在配置中為集合設定 dimension 即可採用較小維度，"
+          f"已存在的集合需重建）")
+    return {"collection": args.collection, "metric": metric, "docs": len(texts), "queries": len(queries),
+            "k": args.k, "live": args.live, "runs": runs}
+
+
+def synthetic_corpus(megabytes: float, seed: int = 0) -> List[Dict[str, Any]]:
+    """產生以繁體中文為主、夾雜英文句子的合成長文檔，總大小約 megabytes MB（UTF-8）"""
+    rng = np.random.default_rng(seed)
+    sentences = [
+        "人工智慧是計算機科學的一個分支，致力於創造能夠執行需要人類智能的任務的系統。",
+        "機器學習讓電腦從資料中學習模式，而不需要明確的程式指令。",
+        "向量數據庫以嵌入向量儲存文檔，支援語義搜索與相似度查詢！",
+        "「檢索增強生成」結合了檢索與生成，能提高回答的準確性。",
+        "Retrieval-augmented generation grounds model answers in retrieved documents.",
+        "Astra DB supports vector search with cosine and dot product metrics.",
+        "深度學習是否總是需要大量的標註資料？並不一定。",
+    ]
+    documents, size, number = [], 0, 0
+    while size < megabytes * 1024 * 1024:
+        paragraphs = [
+            "".join(sentences[i] for i in rng.integers(0, len(sentences), rng.integers(3, 9)))
+            for _ in range(rng.integers(5, 40))
+        ]
+        text = "\n\n".join(paragraphs)
+        documents.append({"text": text, "metadata": {"source": f"doc-{number}.md"}})
+        size += len(text.encode('utf-8'))
+        number += 1
+    return documents
+
+
+def bench_chunking(args: argparse.Namespace) -> Dict[str, Any]:
+    """量測各分塊策略的吞吐量（MB/s）、片段數與片段 token 數分佈；片段以生成器逐一產生，不保留在記憶體中"""
+    if args.corpus:
+        documents = list(iter_documents(args.corpus, args.text_field))
+    else:
+        documents = synthetic_corpus(args.mb)
+    megabytes = sum(len(doc["text"].encode('utf-8')) for doc in documents) / (1024 * 1024)
+    print(f"🧪 分塊: {len(documents)} 個文檔, {megabytes:.1f} MB, max_tokens={args.max_tokens}, "
+          f"overlap_tokens={args.overlap_tokens}")
+
+    results = {"documents": len(documents), "megabytes": megabytes, "strategies": {}}
+    for strategy in args.strategies:
+        chunker = TextChunker(strategy, args.max_tokens, args.overlap_tokens)
+        best, chunks, token_counts = float("inf"), 0, []
+        for run in range(args.runs):
+            start = time.perf_counter()
+            chunks = 0
+            for chunk in chunk_documents(documents, chunker):
+                chunks += 1
+                if run == 0 and len(token_counts) < 2000:
+                    token_counts.append(count_tokens(chunk["text"]))
+            best = min(best, time.perf_counter() - start)
+        result = {
+            "mb_per_second": megabytes / best,
+            "seconds": best,
+            "chunks": chunks,
+            "avg_tokens": float(np.mean(token_counts)) if token_counts else 0.0,
+            "max_tokens": int(max(token_counts)) if token_counts else 0
+        }
+        results["strategies"][strategy] = result
+        print(f"   - {strategy:<9}: {result['mb_per_second']:6.1f} MB/s, {chunks} 個片段, "
+              f"平均 {result['avg_tokens']:.0f} / 最多 {result['max_tokens']} tokens")
+    return results
+
+
+def bench_wire(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較 insert_many 請求中 $vector 以十進位 JSON 陣列與 base64 打包 float32 傳輸的大小與序列化 / 解析時間"""
+    results = {}
+    print(f"🧪 向量傳輸編碼: 每批 {args.docs} 個文檔, 取 {args.runs} 次中最快一次")
+    for dimension in args.dimensions:
+        # 嵌入 API 回傳的是 Python list[float]，以此為兩種編碼的共同起點
+        vectors = np.random.default_rng(0).standard_normal((args.docs, dimension)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        vector_lists = vectors.tolist()
+        texts = sample_texts(args.docs)
+
+        row = {}
+        for encoding in ("json", "binary"):
+            encode_seconds, parse_seconds = float("inf"), float("inf")
+            for _ in range(args.runs):
+                documents = [{"text": text, "$vector": list(vector)} for text, vector in zip(texts, vector_lists)]
+                start = time.perf_counter()
+                encode_document_vectors(documents, encoding)
+                body = json.dumps({"insertMany": {"documents": documents}}, ensure_ascii=False)
+                encode_seconds = min(encode_seconds, time.perf_counter() - start)
+
+                start = time.perf_counter()
+                received = json.loads(body)["insertMany"]["documents"]
+                vector_matrix([doc["$vector"] for doc in received])
+                parse_seconds = min(parse_seconds, time.perf_counter() - start)
+            row[encoding] = {
+                "bytes_per_doc": len(body.encode("utf-8")) / args.docs,
+                "encode_ms": 1000 * encode_seconds,
+                "parse_ms": 1000 * parse_seconds
+            }
+        row["size_ratio"] = row["json"]["bytes_per_doc"] / row["binary"]["bytes_per_doc"]
+        results[dimension] = row
+        print(f"   - {dimension} 維: JSON {row['json']['bytes_per_doc'] / 1024:.1f} KB/文檔, "
+              f"序列化 {row['json']['encode_ms']:.1f} ms, 解析 {row['json']['parse_ms']:.1f} ms | "
+              f"binary {row['binary']['bytes_per_doc'] / 1024:.1f} KB/文檔, "
+              f"序列化 {row['binary']['encode_ms']:.1f} ms, 解析 {row['binary']['parse_ms']:.1f} ms | "
+              f"縮小 {row['size_ratio']:.1f}x")
+    return results
+
+
+def bench_batch(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較以 dict + list[float] 與列式 DocumentBatch 匯入同一批文檔時的峰值記憶體、GC 次數與耗時"""
+    manager = make_manager(args)
+    manager.chunker = None
+    dimension = manager.config['astra_db']['collections'][args.collection]['dimension']
+    texts = sample_texts(args.docs)
+
+    def build(layout: str):
+        documents = [{"text": text, "metadata": {"source": "benchmark", "index": i}} for i, text in enumerate(texts)]
+        return DocumentBatch.from_documents(documents) if layout == "batch" else documents
+
+    def ingest(layout: str):
+        # 替身集合不保存文檔，量到的只有客戶端的嵌入、編碼與上傳
+        manager.collections[args.collection] = FakeCollection(
+            args.collection, request_latency=0.0, per_doc_latency=0.0, keep_documents=False
+        )
+        return asyncio.run(manager.insert_documents(build(layout), args.collection))
+
+    print(f"🧪 列式批次: {args.docs} 個文檔, 集合 '{args.collection}' ({dimension} 維)")
+    results = {}
+    for layout in ("dicts", "batch"):
+        gc.collect()
+        collections = sum(stat["collections"] for stat in gc.get_stats())
+        start = time.perf_counter()
+        report = ingest(layout)
+        seconds = time.perf_counter() - start
+        collections = sum(stat["collections"] for stat in gc.get_stats()) - collections
+
+        # 峰值記憶體另外量測（含建立輸入），避免 tracemalloc 的開銷影響耗時
+        gc.collect()
+        tracemalloc.start()
+        ingest(layout)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[layout] = {
+            "inserted": report.inserted,
+            "seconds": seconds,
+            "docs_per_sec": report.inserted / seconds if seconds else 0.0,
+            "gc_collections": collections,
+            "peak_mb": peak_bytes / (1024 * 1024),
+            "peak_bytes_per_doc": peak_bytes / args.docs
+        }
+    results["peak_ratio"] = results["dicts"]["peak_mb"] / results["batch"]["peak_mb"]
+    results["gc_ratio"] = results["dicts"]["gc_collections"] / max(1, results["batch"]["gc_collections"])
+    for layout, label in (("dicts", "dict + list"), ("batch", "DocumentBatch")):
+        row = results[layout]
+        print(f"   - {label:<13}: 峰值 {row['peak_mb']:.1f} MB ({row['peak_bytes_per_doc'] / 1024:.1f} KB/文檔), "
+              f"GC {row['gc_collections']} 次, {row['docs_per_sec']:.0f} docs/sec")
+    print(f"   - 峰值記憶體縮小 {results['peak_ratio']:.1f}x, GC 次數減少 {results['gc_ratio']:.1f}x")
+    return results
+
+
+def bench_collections(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較逐一 create_collection 與 create_collections（一次列出 + 並行創建缺少的集合）的首次與重複啟動耗時"""
+    manager = make_manager(args)
+    collections_config = manager.config['astra_db']['collections']
+
+    async def sequential(database: FakeDatabase):
+        # 原本的做法：每個集合依序 await create_collection，已存在時以例外判斷
+        for collection_config in collections_config.values():
+            try:
+                await database.create_collection(collection_config['name'], dimension=collection_config['dimension'],
+                                                 metric=collection_config['vector_metric'])
+            except ValueError:
+                database.get_collection(collection_config['name'])
+
+    async def run() -> Dict[str, Any]:
+        results = {}
+        for strategy in ("sequential", "create_collections"):
+            database = FakeDatabase(request_latency=args.create_latency)
+            for phase in ("cold", "warm"):
+                requests = database.requests
+                start = time.perf_counter()
+                if strategy == "sequential":
+                    await sequential(database)
+                else:
+                    manager.database = database
+                    manager.collections = {}
+                    await manager.create_collections()
+                results[f"{strategy}_{phase}"] = {
+                    "seconds": time.perf_counter() - start,
+                    "requests": database.requests - requests
+                }
+        return results
+
+    print(f"🧪 集合設置: {len(collections_config)} 個集合, 每次請求 {args.create_latency * 1000:.0f} ms")
+    results = asyncio.run(run())
+    for strategy, label in (("sequential", "逐一創建"), ("create_collections", "create_collections")):
+        cold, warm = results[f"{strategy}_cold"], results[f"{strategy}_warm"]
+        print(f"   - {label}: 首次 {cold['seconds'] * 1000:.0f} ms ({cold['requests']} 個請求), "
+              f"重複啟動 {warm['seconds'] * 1000:.0f} ms ({warm['requests']} 個請求)")
+    return results
+
+
+def bench_query_cache(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較 search_similar 快取未命中（嵌入 + 搜索）與命中的延遲"""
+    manager = make_manager(args)
+    local_index = manager.create_local_index(args.collection)
+    dimension = manager.config['astra_db']['collections'][args.collection]['dimension']
+    texts = sample_texts(args.docs)
+    local_index.add([{"_id": i, "text": text, "$vector": fake_vector(text, dimension).tolist()}
+                     for i, text in enumerate(texts)])
+    queries = [f"查詢 {i}：什麼是機器學習？" for i in range(args.queries)]
+
+    async def run():
+        miss_latencies, hit_latencies = [], []
+        for round_number in range(args.repeat):
+            for query in queries:
+                start = time.perf_counter()
+                await manager.search_similar(query, args.collection, limit=5)
+                (miss_latencies if round_number == 0 else hit_latencies).append(time.perf_counter() - start)
+        return miss_latencies, hit_latencies
+
+    print(f"🧪 查詢結果快取: {args.queries} 個查詢 × {args.repeat} 輪, 本地索引 {args.docs} 個文檔")
+    miss_latencies, hit_latencies = asyncio.run(run())
+    result = {
+        "miss_mean_us": 1e6 * sum(miss_latencies) / len(miss_latencies),
+        "hit_mean_us": 1e6 * sum(hit_latencies) / len(hit_latencies) if hit_latencies else 0.0,
+        "stats": manager.query_cache.stats()
+    }
+    print(f"   - 未命中: 平均 {result['miss_mean_us']:.0f} µs")
+    print(f"   - 命中: 平均 {result['hit_mean_us']:.1f} µs")
+    print(f"   - 統計: {result['stats']}")
+    return result
+
+
+def bench_search_many(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較逐一呼叫 search_similar 與 search_similar_many 的總延遲"""
+    manager = make_manager(args)
+    manager.query_cache = None
+    dimension = manager.config['astra_db']['collections'][args.collection]['dimension']
+    collection = FakeCollection(args.collection, request_latency=args.search_latency)
+    collection.documents = [{"_id": i, "text": text, "$vector": fake_vector(text, dimension).tolist()}
+                            for i, text in enumerate(sample_texts(args.docs))]
+    manager.collections[args.collection] = collection
+    queries = [f"查詢 {i}：什麼是機器學習？" for i in range(args.queries)]
+
+    async def run():
+        start = time.perf_counter()
+        sequential = [await manager.search_similar(query, args.collection, limit=5) for query in queries]
+        sequential_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = await manager.search_similar_many(queries, args.collection, limit=5, concurrency=args.concurrency)
+        batched_seconds = time.perf_counter() - start
+        if [[hit['text'] for hit in hits] for hits in sequential] != [[hit['text'] for hit in hits] for hits in batched]:
+            print("❌ search_similar_many 的結果與逐一搜索不一致")
+            sys.exit(1)
+        return sequential_seconds, batched_seconds
+
+    print(f"🧪 批量搜索: {args.queries} 個查詢, 並行 {args.concurrency}, 每次搜索延遲 {args.search_latency * 1000:.0f} ms")
+    sequential_seconds, batched_seconds = asyncio.run(run())
+    result = {
+        "queries": args.queries,
+        "sequential_seconds": sequential_seconds,
+        "batched_seconds": batched_seconds,
+        "speedup": sequential_seconds / batched_seconds
+    }
+    print(f"   - 逐一 search_similar: {sequential_seconds:.2f} 秒")
+    print(f"   - search_similar_many: {batched_seconds:.2f} 秒")
+    print(f"   - 加速: {result['speedup']:.1f}x")
+    return result
+
+
+HYBRID_TOPICS = [
+    "人工智慧是計算機科學的一個分支，機器學習與深度學習是其子領域。",
+    "向量資料庫以近似最近鄰索引回答相似度查詢，常用於檢索增強生成。",
+    "Kubernetes 以 Deployment 管理無狀態服務，滾動更新時逐步替換 Pod。",
+    "資料庫連線逾時通常來自連線池耗盡，應檢查 max_connections 設定。",
+]
+
+
+def bench_hybrid(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較 vector / hybrid / auto 搜索模式：識別碼查詢的 hit@1 / hit@5、平均延遲與嵌入呼叫次數"""
+    manager = make_manager(args)
+    manager.query_cache = None
+    collection = FakeCollection(args.collection, request_latency=args.search_latency)
+    manager.collections[args.collection] = collection
+    documents = [{"_id": f"doc-{i}", "text": f"工單 TICKET-{i:05d}：{HYBRID_TOPICS[i % len(HYBRID_TOPICS)]}"}
+                 for i in range(args.docs)]
+    asyncio.run(manager.insert_documents(documents, args.collection))
+    # 詞彙索引不會在插入時建立，從集合載入完整索引後 auto 模式才會單獨使用
+    asyncio.run(manager.load_lexical_index(args.collection))
+    step = max(1, args.docs // args.queries)
+    identifiers = [(f"TICKET-{i:05d}", f"doc-{i}") for i in range(0, args.docs, step)][:args.queries]
+    questions = [f"{topic[:12]}？" for topic in HYBRID_TOPICS]
+
+    async def run(mode: str):
+        embeddings = manager.async_openai_client.embeddings
+        calls_before = embeddings.calls
+        top1, top5, identifier_latencies, question_latencies = 0, 0, [], []
+        for query, doc_id in identifiers:
+            start = time.perf_counter()
+            results = await manager.search_similar(query, args.collection, limit=5, fields=["_id", "text"], mode=mode)
+            identifier_latencies.append(time.perf_counter() - start)
+            ranked = [hit["_id"] for hit in results]
+            top1 += ranked[:1] == [doc_id]
+            top5 += doc_id in ranked
+        for query in questions:
+            start = time.perf_counter()
+            await manager.search_similar(query, args.collection, limit=5, mode=mode)
+            question_latencies.append(time.perf_counter() - start)
+        return {
+            "identifier_hit_at_1": top1 / len(identifiers),
+            "identifier_hit_at_5": top5 / len(identifiers),
+            "identifier_mean_ms": 1000 * statistics.mean(identifier_latencies),
+            "question_mean_ms": 1000 * statistics.mean(question_latencies),
+            "embedding_calls": embeddings.calls - calls_before
+        }
+
+    print(f"🧪 混合檢索: {args.docs} 個文檔, {len(identifiers)} 個識別碼查詢 + {len(questions)} 個自然語言查詢")
+    print(f"   - 詞彙索引: {manager.lexical_indexes[args.collection].stats()}")
+    results = {}
+    for mode in args.modes:
+        results[mode] = asyncio.run(run(mode))
+        print(f"   - {mode:<7}: 識別碼 hit@1 {results[mode]['identifier_hit_at_1']:.2f} / "
+              f"hit@5 {results[mode]['identifier_hit_at_5']:.2f}, "
+              f"識別碼查詢 {results[mode]['identifier_mean_ms']:.1f} ms, "
+              f"自然語言查詢 {results[mode]['question_mean_ms']:.1f} ms, 嵌入呼叫 {results[mode]['embedding_calls']} 次")
+    return results
+
+
+def bench_threshold(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較固定 limit、分數門檻（一次取 limit 個）與自適應門檻搜索（從 --initial-k 個開始）：
+    vector_find 請求數、回傳文檔數與位元組、上下文 token 數與延遲"""
+    manager = make_manager(args)
+    manager.query_cache = None
+    dimension = manager.config['astra_db']['collections'][args.collection]['dimension']
+    rng = np.random.default_rng(0)
+
+    def unit(vectors: np.ndarray) -> np.ndarray:
+        return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+    # 每個查詢有 0 ~ 2 × limit 個相關文檔（餘弦 0.3 ~ 0.9，分數 0.65 ~ 0.95），其餘文檔與查詢無關（分數約 0.5）
+    query_vectors = unit(rng.standard_normal((args.queries, dimension)).astype(np.float32))
+    texts = sample_texts(args.docs)
+    vectors = unit(rng.standard_normal((args.docs, dimension)).astype(np.float32))
+    row = 0
+    for query_vector in query_vectors:
+        for similarity in rng.uniform(0.3, 0.9, rng.integers(0, 2 * args.limit + 1)):
+            if row < args.docs:
+                vectors[row] = similarity * query_vector + np.sqrt(1 - similarity ** 2) * vectors[row]
+                row += 1
+    collection = FakeCollection(args.collection, request_latency=args.search_latency)
+    collection.documents = [{"_id": i, "text": text, "metadata": {"source": "benchmark"}, "$vector": vector}
+                            for i, (text, vector) in enumerate(zip(texts, vectors.tolist()))]
+    manager.collections[args.collection] = collection
+    queries = [f"查詢 {i}：什麼是機器學習？" for i in range(args.queries)]
+    vector_by_query = dict(zip(queries, query_vectors.tolist()))
+
+    async def embed(texts: List[str], collection_name: str = "documents") -> List[List[float]]:
+        return [vector_by_query[text] for text in texts]
+
+    manager.aembed_texts = embed
+    transferred = {"documents": 0, "bytes": 0}
+    vector_find = collection.vector_find
+
+    async def counting_vector_find(*args, **kwargs):
+        hits = await vector_find(*args, **kwargs)
+        transferred["documents"] += len(hits)
+        transferred["bytes"] += len(json.dumps(hits, ensure_ascii=False).encode("utf-8"))
+        return hits
+
+    collection.vector_find = counting_vector_find
+
+    adaptive_settings = manager.config['astra_db'].setdefault('settings', {}).setdefault('adaptive_search', {})
+
+    async def run(threshold: Optional[float], initial_k: Optional[int] = None) -> Dict[str, Any]:
+        adaptive_settings['initial_k'] = initial_k
+        requests = collection.requests
+        transferred.update(documents=0, bytes=0)
+        returned, relevant, context_tokens, latencies = 0, 0, 0, []
+        for query in queries:
+            start = time.perf_counter()
+            results = await manager.search_similar(query, args.collection, limit=args.limit, threshold=threshold)
+            latencies.append(time.perf_counter() - start)
+            returned += len(results)
+            relevant += sum(hit['score'] >= args.threshold for hit in results)
+            context_tokens += sum(count_tokens(hit['text']) for hit in results)
+        return {
+            "requests_per_query": (collection.requests - requests) / len(queries),
+            "transferred_documents": transferred["documents"],
+            "transferred_kb": transferred["bytes"] / 1024,
+            "returned": returned,
+            "below_threshold": returned - relevant,
+            "context_tokens": context_tokens,
+            "mean_ms": 1000 * statistics.mean(latencies)
+        }
+
+    print(f"🧪 分數門檻搜索: {args.docs} 個文檔, {args.queries} 個查詢, limit {args.limit}, 門檻 {args.threshold}, "
+          f"每次 vector_find {args.search_latency * 1000:.0f} ms")
+    results = {"fixed": asyncio.run(run(None)), "threshold": asyncio.run(run(args.threshold)),
+               "adaptive": asyncio.run(run(args.threshold, args.initial_k))}
+    for strategy, label in (("fixed", f"固定 limit={args.limit}"), ("threshold", f"門檻 {args.threshold}"),
+                            ("adaptive", f"門檻 {args.threshold}, initial_k={args.initial_k}")):
+        result = results[strategy]
+        print(f"   - {label}: 每查詢 {result['requests_per_query']:.2f} 個請求, "
+              f"傳輸 {result['transferred_documents']} 個文檔 ({result['transferred_kb']:.1f} KB), "
+              f"回傳 {result['returned']} 個（低於門檻 {result['below_threshold']}）, "
+              f"上下文 {result['context_tokens']} tokens, 平均 {result['mean_ms']:.1f} ms")
+    return results
+
+
+def bench_context(args: argparse.Namespace) -> Dict[str, Any]:
+    """ContextBuilder 每次請求的構建時間，以及去除近似重複與套用 token 預算前後的上下文 token 數"""
+    rng = np.random.default_rng(0)
+    chunker = TextChunker("sentence", args.chunk_tokens, args.chunk_tokens // 8)
+    chunks = []
+    for chunk in chunk_documents(synthetic_corpus(args.docs * args.chunk_tokens * 3 / 1024 / 1024), chunker):
+        chunks.append({"_id": len(chunks), "text": chunk["text"], "metadata": chunk["metadata"]})
+        if len(chunks) == args.docs:
+            break
+    vectors = rng.standard_normal((len(chunks), args.dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    # 轉載的近似重複片段：文字略有不同，向量與原片段的餘弦相似度約 0.99
+    copies = rng.choice(len(chunks), int(len(chunks) * args.duplicates), replace=False)
+    duplicates = [{"_id": len(chunks) + i, "text": f"（轉載）{chunks[row]['text']}", "metadata": chunks[row]["metadata"]}
+                  for i, row in enumerate(copies)]
+    noise = rng.standard_normal((len(copies), args.dimension)).astype(np.float32)
+    duplicate_vectors = vectors[copies] + 0.1 * noise / np.linalg.norm(noise, axis=1, keepdims=True)
+    index = LocalVectorIndex(args.dimension, metric="cosine")
+    index.add_vectors(np.vstack([vectors, duplicate_vectors]), chunks + duplicates)
+
+    # 查詢向量靠近某個片段，讓結果中同時出現原片段與轉載
+    targets = rng.choice(copies, args.queries)
+    noise = rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+    queries = vectors[targets] + noise / np.linalg.norm(noise, axis=1, keepdims=True)
+    results = [index.search(query, args.limit, fields=["text", "metadata", "$vector"]) for query in queries]
+
+    builder = ContextBuilder(max_tokens=args.max_tokens, dedup_threshold=args.dedup_threshold)
+    for hits in results[:10]:
+        builder.build(hits)  # 預熱 token 數快取與 BPE 編碼
+    latencies, contexts = [], []
+    for hits in results:
+        start = time.perf_counter()
+        contexts.append(builder.build(hits))
+        latencies.append(time.perf_counter() - start)
+    naive_tokens = [builder.tokenizer.count_uncached(builder.separator.join(hit["text"] for hit in hits))
+                    for hits in results]
+
+    result = {
+        "tokenizer": "tiktoken" if builder.tokenizer.exact else "estimate",
+        "build": {key.replace("_ms", "_us"): value * 1000 for key, value in latency_summary(latencies).items()},
+        "naive_tokens": statistics.mean(naive_tokens),
+        "over_budget": sum(tokens > args.max_tokens for tokens in naive_tokens) / len(naive_tokens),
+        "context_tokens": statistics.mean(context.tokens for context in contexts),
+        "sources": statistics.mean(len(context.sources) for context in contexts),
+        "duplicates": statistics.mean(context.duplicates for context in contexts),
+        "max_tokens": max(context.tokens for context in contexts)
+    }
+    print(f"🧪 上下文構建: {len(chunks)} 個片段 + {len(duplicates)} 個轉載, {args.queries} 個查詢 × {args.limit} 個結果, "
+          f"預算 {args.max_tokens} tokens（{result['tokenizer']}）")
+    print(f"   - 直接串接: 平均 {result['naive_tokens']:.0f} tokens, {result['over_budget']:.0%} 的查詢超出預算")
+    print(f"   - ContextBuilder: 平均 {result['context_tokens']:.0f} tokens（最多 {result['max_tokens']}）, "
+          f"{result['sources']:.1f} 個片段, 略過重複 {result['duplicates']:.1f} 個")
+    print(f"   - 構建時間: p50 {result['build']['p50_us']:.0f} µs, p95 {result['build']['p95_us']:.0f} µs, "
+          f"p99 {result['build']['p99_us']:.0f} µs")
+    return result
+
+
+def bench_concurrency(args: argparse.Namespace) -> Dict[str, Any]:
+    """同一事件迴圈中以不同數量的並行任務執行 search_similar / insert_documents，量測吞吐量如何隨之擴展"""
+    dimension = load_astra_integration().AstraDBManager(args.config).config['astra_db']['collections'][
+        args.collection]['dimension']
+    seed_documents = [{"_id": i, "text": text, "$vector": fake_vector(text, dimension).tolist()}
+                      for i, text in enumerate(sample_texts(args.docs))]
+
+    def make_operations(manager) -> List[Callable[[], Awaitable[Any]]]:
+        operations = []
+        for i in range(args.ops):
+            if args.workload == "search" or (args.workload == "mixed" and i % 4):
+                query = f"查詢 {i}：什麼是機器學習？"
+                operations.append(lambda query=query: manager.search_similar(query, args.collection, limit=5))
+            else:
+                batch = [{"text": f"新文檔 {i}-{j}：向量數據庫支援語義搜索。"} for j in range(args.insert_docs)]
+                operations.append(lambda batch=batch: manager.insert_documents(batch, args.collection))
+        return operations
+
+    async def run(tasks: int) -> float:
+        manager = make_manager(args)
+        manager.query_cache = None
+        collection = FakeCollection(args.collection, request_latency=args.astra_latency)
+        collection.documents = list(seed_documents)
+        manager.collections[args.collection] = collection
+        queue: asyncio.Queue = asyncio.Queue()
+        for operation in make_operations(manager):
+            queue.put_nowait(operation)
+
+        async def worker():
+            while not queue.empty():
+                await queue.get_nowait()()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(tasks)))
+        return time.perf_counter() - start
+
+    mode = "阻塞式嵌入" if args.blocking else "非阻塞"
+    print(f"🧪 並行擴展: {args.ops} 個 {args.workload} 操作, 集合 '{args.collection}', {mode}, "
+          f"Astra 延遲 {args.astra_latency * 1000:.0f} ms")
+
+    # 操作會逐一列印進度，量測時暫時關閉以免 I/O 影響數字
+    stdout = sys.stdout
+    rows = []
+    for tasks in args.tasks:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull:
+            sys.stdout = devnull
+            try:
+                seconds = asyncio.run(run(tasks))
+            finally:
+                sys.stdout = stdout
+        rows.append({"tasks": tasks, "seconds": seconds, "ops_per_sec": args.ops / seconds})
+
+    baseline = rows[0]["ops_per_sec"]
+    print(f"   {'任務數':>6} {'耗時':>10} {'ops/sec':>10} {'擴展':>8}")
+    for row in rows:
+        row["scaling"] = row["ops_per_sec"] / baseline
+        print(f"   {row['tasks']:>6} {row['seconds']:>9.2f}s {row['ops_per_sec']:>10.1f} {row['scaling']:>7.1f}x")
+    return {"workload": args.workload, "collection": args.collection, "blocking": args.blocking, "rows": rows}
+
+
+def peak_rss_mb() -> Optional[float]:
+    """行程至今的峰值常駐記憶體 (MB)；Windows 上無 resource 模組時回傳 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    """延遲分佈（毫秒）；沒有樣本時（操作全數用於配置量測）各項為 None"""
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None}
+    values = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean())
+    }
+
+
+async def measure_operation(operations: List[Callable[[], Awaitable[Any]]],
+                            docs_per_op: int, alloc_samples: int) -> Dict[str, Any]:
+    """逐一執行操作量測延遲，之後以 tracemalloc 另跑少量樣本量測每次操作的配置量"""
+    latencies = []
+    start = time.perf_counter()
+    for operation in operations[alloc_samples:]:
+        op_start = time.perf_counter()
+        await operation()
+        latencies.append(time.perf_counter() - op_start)
+    elapsed = time.perf_counter() - start
+
+    # 記憶體配置另外量測，避免 tracemalloc 的開銷影響延遲數字
+    alloc_bytes, alloc_blocks = [], []
+    tracemalloc.start()
+    for operation in operations[:alloc_samples]:
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        blocks_before = sys.getallocatedblocks()
+        await operation()
+        alloc_blocks.append(sys.getallocatedblocks() - blocks_before)
+        alloc_bytes.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    result = {
+        "operations": len(latencies),
+        "docs_per_sec": docs_per_op * len(latencies) / elapsed if elapsed else 0.0,
+        **latency_summary(latencies),
+        "alloc_peak_bytes_per_op": float(np.mean(alloc_bytes)) if alloc_bytes else None,
+        "retained_blocks_per_op": float(np.mean(alloc_blocks)) if alloc_blocks else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+    return result
+
+
+def bench_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    """以本地替身驅動 create_collections、insert_documents 與 search_similar，報告吞吐量、延遲分佈與記憶體"""
+    manager = make_manager(args)
+    manager.query_cache = None
+    collection_name = args.collection
+    dimension = manager.config['astra_db']['collections'][collection_name]['dimension']
+
+    def new_database() -> FakeDatabase:
+        return FakeDatabase(request_latency=args.create_latency, collection_latency=args.insert_latency)
+
+    async def create_collections():
+        manager.database = new_database()
+        manager.collections = {}
+        await manager.create_collections()
+
+    texts = sample_texts(args.docs)
+    batches = [texts[start:start + args.batch_docs] for start in range(0, len(texts), args.batch_docs)]
+
+    def insert_operation(batch: List[str]):
+        async def operation():
+            await manager.insert_documents([{"text": text} for text in batch], collection_name)
+        return operation
+
+    queries = [f"查詢 {i}：什麼是機器學習？" for i in range(args.queries)]
+
+    def search_operation(query: str):
+        async def operation():
+            await manager.search_similar(query, collection_name, limit=args.limit)
+        return operation
+
+    async def run() -> Dict[str, Any]:
+        results = {}
+        operations = [create_collections] * (args.create_runs + args.alloc_samples)
+        results["create_collections"] = await measure_operation(
+            operations, len(manager.config['astra_db']['collections']), args.alloc_samples
+        )
+
+        manager.database = new_database()
+        manager.collections = {collection_name: manager.database.get_collection(collection_name)}
+        results["insert_documents"] = await measure_operation(
+            [insert_operation(batch) for batch in batches], args.batch_docs, args.alloc_samples
+        )
+
+        manager.collections[collection_name].request_latency = args.search_latency
+        results["search_similar"] = await measure_operation(
+            [search_operation(query) for query in queries], 1, args.alloc_samples
+        )
+        return results
+
+    print(f"🧪 基準測試套件: {args.docs} 個文檔（每批 {args.batch_docs}）, {args.queries} 個查詢, "
+          f"集合 '{collection_name}' ({dimension} 維)")
+    print(f"   模擬延遲: 嵌入 {args.request_latency * 1000:.0f} ms, 創建集合 {args.create_latency * 1000:.0f} ms, "
+          f"插入 {args.insert_latency * 1000:.0f} ms, 搜索 {args.search_latency * 1000:.0f} ms")
+
+    # 套件中的每個操作都會列印進度，量測時暫時關閉以免 I/O 影響數字
+    stdout = sys.stdout
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        sys.stdout = devnull
+        try:
+            results = asyncio.run(run())
+        finally:
+            sys.stdout = stdout
+    for name, result in results.items():
+        if not result['operations']:
+            print(f"   - {name:<20} 沒有延遲樣本（操作數不超過 --alloc-samples {args.alloc_samples}）  "
+                  f"配置 {(result['alloc_peak_bytes_per_op'] or 0) / 1024:8.1f} KB/op")
+            continue
+        print(f"   - {name:<20} {result['docs_per_sec']:9.1f} docs/sec  "
+              f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+              f"配置 {(result['alloc_peak_bytes_per_op'] or 0) / 1024:8.1f} KB/op")
+    rss = peak_rss_mb()
+    print(f"   - 峰值 RSS: {f'{rss:.1f} MB' if rss is not None else '無法取得'}")
+    return results
+
+
+COMPARED_METRICS = {
+    "docs_per_sec": "higher",
+    "p50_ms": "lower",
+    "p95_ms": "lower",
+    "p99_ms": "lower",
+    "alloc_peak_bytes_per_op": "lower"
+}
+
+
+def bench_compare(args: argparse.Namespace) -> Dict[str, Any]:
+    """比較兩次套件結果，任一指標退步超過門檻時以非零狀態結束"""
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate, 'r', encoding='utf-8') as f:
+        candidate = json.load(f)["results"]
+
+    print(f"📊 比較 {args.baseline} → {args.candidate}（門檻 {args.threshold:.0%}）")
+    regressions = []
+    for operation, metrics in candidate.items():
+        if operation not in baseline:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = baseline[operation].get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < -args.threshold if direction == "higher" else change > args.threshold
+            marker = "❌" if worse else "  "
+            print(f"{marker} {operation:<20} {metric:<24} {old:12.2f} → {new:12.2f} ({change:+.1%})")
+            if worse:
+                regressions.append({"operation": operation, "metric": metric, "change": change})
+
+    if regressions:
+        print(f"❌ 發現 {len(regressions)} 項退步")
+        sys.exit(1)
+    print("✅ 沒有超過門檻的退步")
+    return {"regressions": regressions}
+
+
+HEAVY_MODULES = ["numpy", "pandas", "astrapy", "openai", "sentence_transformers"]
+
+COLD_START_SCRIPT = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+from astra_loader import load_astra_integration
+module = load_astra_integration()
+import_ms = 1000 * (time.perf_counter() - start)
+loaded = [name for name in {heavy_modules!r} if name in sys.modules]
+
+start = time.perf_counter()
+manager = module.AstraDBManager({config!r})
+manager.embedding_cache = None
+manager.query_cache = None
+init_ms = 1000 * (time.perf_counter() - start)
+
+from astra_standins import FakeAsyncOpenAIClient, FakeOpenAIClient, fake_vector
+manager.openai_client = FakeOpenAIClient(request_latency=0, per_text_latency=0)
+manager.async_openai_client = FakeAsyncOpenAIClient(request_latency=0, per_text_latency=0)
+start = time.perf_counter()
+local_index = manager.create_local_index({collection!r})
+dimension = manager.config['astra_db']['collections'][{collection!r}]['dimension']
+local_index.add([{{"_id": 0, "text": "範例", "$vector": fake_vector("範例", dimension).tolist()}}])
+results = asyncio.run(manager.search_similar("什麼是機器學習？", {collection!r}, limit=1))
+first_query_ms = 1000 * (time.perf_counter() - start)
+# 搜索失敗時 search_similar 回傳空串列，量到的會是錯誤路徑的延遲
+assert results, "第一次查詢沒有回傳結果"
+print(json.dumps({{"import_ms": import_ms, "init_ms": init_ms,
+                  "first_query_ms": first_query_ms, "heavy_modules_at_import": loaded}}))
+"""
+
+
+def bench_cold_start(args: argparse.Namespace) -> Dict[str, Any]:
+    """以全新子行程量測匯入、初始化與第一次查詢延遲，超過門檻時以非零狀態結束"""
+    script = COLD_START_SCRIPT.format(heavy_modules=HEAVY_MODULES, config=args.config, collection=args.collection)
+    python_path = os.pathsep.join(filter(None, [str(Path(__file__).resolve().parent), os.environ.get("PYTHONPATH")]))
+
+    runs = []
+    for _ in range(args.runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONPATH": python_path}
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    result = {
+        "runs": args.runs,
+        "import_ms": statistics.median(run["import_ms"] for run in runs),
+        "init_ms": statistics.median(run["init_ms"] for run in runs),
+        "first_query_ms": statistics.median(run["first_query_ms"] for run in runs),
+        "heavy_modules_at_import": runs[-1]["heavy_modules_at_import"]
+    }
+
+    print(f"🧪 冷啟動: {args.runs} 次全新行程（中位數）, 集合 '{args.collection}'")
+    print(f"   - 匯入 astra-integration.py: {result['import_ms']:.1f} ms")
+    print(f"   - 建立 AstraDBManager: {result['init_ms']:.1f} ms")
+    print(f"   - 第一次查詢: {result['first_query_ms']:.1f} ms")
+    print(f"   - 匯入時已載入的重量級模組: {', '.join(result['heavy_modules_at_import']) or '無'}")
+
+    if args.max_import_ms and result["import_ms"] > args.max_import_ms:
+        print(f"❌ 匯入時間 {result['import_ms']:.1f} ms 超過門檻 {args.max_import_ms} ms")
+        sys.exit(1)
+    if args.max_first_query_ms and result["first_query_ms"] > args.max_first_query_ms:
+        print(f"❌ 第一次查詢 {result['first_query_ms']:.1f} ms 超過門檻 {args.max_first_query_ms} ms")
+        sys.exit(1)
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Astra DB 離線效能基準測試")
+    parser.add_argument("--config", default="config/astra-config.json", help="Astra DB 配置文件")
+    parser.add_argument("--request-latency", type=float, default=0.02, help="每次嵌入請求的模擬延遲（秒）")
+    parser.add_argument("--per-text-latency", type=float, default=0.0002, help="每段文字的模擬處理時間（秒）")
+    parser.add_argument("--output", help="將結果保存為 JSON 檔案，供 compare 比較")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    embed_parser = subparsers.add_parser("embed", help="逐文檔與批量嵌入的吞吐量比較")
+    embed_parser.add_argument("--docs", type=int, default=200)
+    embed_parser.add_argument("--collection", default="documents")
+    embed_parser.set_defaults(func=bench_embed)
+
+    upload_parser = subparsers.add_parser("upload", help="不同並行度下的 insert_many 上傳吞吐量")
+    upload_parser.add_argument("--docs", type=int, default=1000)
+    upload_parser.add_argument("--collection", default="documents")
+    upload_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    upload_parser.add_argument("--insert-latency", type=float, default=0.05, help="每次 insert_many 的模擬延遲（秒）")
+    upload_parser.add_argument("--max-in-flight", type=int, default=8, help="模擬 Data API 可同時處理的請求數（0 為無上限）")
+    upload_parser.set_defaults(func=bench_upload)
+
+    reingest_parser = subparsers.add_parser("reingest", help="修改少量文檔後重新匯入，有無匯入清單的成本比較")
+    reingest_parser.add_argument("--docs", type=int, default=2000)
+    reingest_parser.add_argument("--changed", type=float, default=0.05, help="內容變更的文檔比例")
+    reingest_parser.add_argument("--collection", default="documents")
+    reingest_parser.add_argument("--insert-latency", type=float, default=0.05, help="每次 Data API 請求的模擬延遲（秒）")
+    reingest_parser.set_defaults(func=bench_reingest)
+
+    ann_parser = subparsers.add_parser("ann", help="IVF-PQ 近似索引的 recall@k、QPS 與記憶體")
+    ann_parser.add_argument("--vectors", type=int, default=20000)
+    ann_parser.add_argument("--dimension", type=int, default=384)
+    ann_parser.add_argument("--metric", choices=["cosine", "dot_product"], default="cosine")
+    ann_parser.add_argument("--clusters", type=int, default=200, help="合成資料的群數")
+    ann_parser.add_argument("--nlist", type=int, default=256)
+    ann_parser.add_argument("--m", type=int, default=48, help="PQ 子空間數（每向量位元組數）")
+    ann_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    ann_parser.add_argument("--rerank", type=int, nargs="+", default=[0, 10],
+                            help="精確重新計分的候選倍數（0 為只用 PQ 分數）")
+    ann_parser.add_argument("--queries", type=int, default=200)
+    ann_parser.add_argument("--k", type=int, default=10)
+    ann_parser.set_defaults(func=bench_ann)
+
+    filter_parser = subparsers.add_parser("filter", help="單一分類查詢：客戶端過濾與 filter 預先篩選的 QPS")
+    filter_parser.add_argument("--vectors", type=int, default=50000)
+    filter_parser.add_argument("--dimension", type=int, default=384)
+    filter_parser.add_argument("--clusters", type=int, default=100)
+    filter_parser.add_argument("--categories", type=int, default=10)
+    filter_parser.add_argument("--precision", choices=["float32", "float16", "int8"], default="float32")
+    filter_parser.add_argument("--overfetch", type=int, default=10, help="客戶端過濾時多取的倍數")
+    filter_parser.add_argument("--queries", type=int, default=200)
+    filter_parser.add_argument("--k", type=int, default=10)
+    filter_parser.set_defaults(func=bench_filter)
+
+    quant_parser = subparsers.add_parser("quantization", help="float16 / int8 量化本地索引的記憶體與召回率")
+    quant_parser.add_argument("--collection", nargs="+", help="要評估的集合（預設為配置中的全部集合）")
+    quant_parser.add_argument("--vectors", type=int, default=20000)
+    quant_parser.add_argument("--vectors-file", help="改用匯出的真實嵌入 (.npy, shape = (n, dimension))")
+    quant_parser.add_argument("--clusters", type=int, default=100)
+    quant_parser.add_argument("--queries", type=int, default=200)
+    quant_parser.add_argument("--k", type=int, default=10)
+    quant_parser.add_argument("--rescore", type=int, nargs="+", default=[0, 4], help="精確重新計分的候選倍數")
+    quant_parser.set_defaults(func=bench_quantization)
+
+    dims_parser = subparsers.add_parser("dimensions", help="OpenAI 縮短嵌入維度的 recall@k 與延遲取捨")
+    dims_parser.add_argument("--dimensions", type=int, nargs="+", default=[256, 512, 1024, 1536])
+    dims_parser.add_argument("--collection", default="documents")
+    dims_parser.add_argument("--corpus", help="評估語料（目錄 / .jsonl / .csv，預設為合成文字）")
+    dims_parser.add_argument("--text-field", default="text", help="語料中作為文字的欄位")
+    dims_parser.add_argument("--docs", type=int, default=2000, help="最多使用的文檔數")
+    dims_parser.add_argument("--queries-file", help="每行一個查詢（預設取 test-cases.json 的 input）")
+    dims_parser.add_argument("--queries", type=int, default=50)
+    dims_parser.add_argument("--k", type=int, default=10)
+    dims_parser.add_argument("--live", action="store_true", help="以 OPENAI_API_KEY 呼叫真實的嵌入 API")
+    dims_parser.set_defaults(func=bench_dimensions)
+
+    chunk_parser = subparsers.add_parser("chunking", help="段落 / 句子 / token 視窗分塊的吞吐量（MB/s）")
+    chunk_parser.add_argument("--mb", type=float, default=20, help="合成語料大小（MB）")
+    chunk_parser.add_argument("--corpus", help="改用真實語料（目錄 / .jsonl / .csv）")
+    chunk_parser.add_argument("--text-field", default="text")
+    chunk_parser.add_argument("--strategies", nargs="+", choices=CHUNK_STRATEGIES, default=list(CHUNK_STRATEGIES))
+    chunk_parser.add_argument("--max-tokens", type=int, default=512)
+    chunk_parser.add_argument("--overlap-tokens", type=int, default=64)
+    chunk_parser.add_argument("--runs", type=int, default=3, help="取最快一次")
+    chunk_parser.set_defaults(func=bench_chunking)
+
+    wire_parser = subparsers.add_parser("wire", help="$vector 以 JSON 陣列與二進位傳輸的請求大小與序列化時間")
+    wire_parser.add_argument("--docs", type=int, default=20, help="每批文檔數（預設同 insert_chunk_size）")
+    wire_parser.add_argument("--dimensions", type=int, nargs="+", default=[384, 1536])
+    wire_parser.add_argument("--runs", type=int, default=5, help="取最快一次")
+    wire_parser.set_defaults(func=bench_wire)
+
+    batch_parser = subparsers.add_parser("batch", help="dict 文檔與列式 DocumentBatch 匯入的峰值記憶體與 GC 次數")
+    batch_parser.add_argument("--docs", type=int, default=2000)
+    batch_parser.add_argument("--collection", default="documents")
+    batch_parser.set_defaults(func=bench_batch)
+
+    collections_parser = subparsers.add_parser("collections", help="逐一創建與 create_collections 的首次 / 重複啟動耗時")
+    collections_parser.add_argument("--create-latency", type=float, default=0.5, help="每次創建 / 列出集合的模擬延遲（秒）")
+    collections_parser.set_defaults(func=bench_collections)
+
+    cache_parser = subparsers.add_parser("query-cache", help="search_similar 結果快取命中與未命中的延遲")
+    cache_parser.add_argument("--docs", type=int, default=5000)
+    cache_parser.add_argument("--collection", default="documents")
+    cache_parser.add_argument("--queries", type=int, default=50)
+    cache_parser.add_argument("--repeat", type=int, default=20)
+    cache_parser.set_defaults(func=bench_query_cache)
+
+    many_parser = subparsers.add_parser("search-many", help="逐一搜索與批量搜索 API 的延遲比較")
+    many_parser.add_argument("--docs", type=int, default=500)
+    many_parser.add_argument("--collection", default="documents")
+    many_parser.add_argument("--queries", type=int, default=64)
+    many_parser.add_argument("--concurrency", type=int, default=8)
+    many_parser.add_argument("--search-latency", type=float, default=0.03, help="每次 vector_find 的模擬延遲（秒）")
+    many_parser.set_defaults(func=bench_search_many)
+
+    hybrid_parser = subparsers.add_parser("hybrid", help="向量 / 混合 / 自動搜索模式的識別碼命中率、延遲與嵌入呼叫數")
+    hybrid_parser.add_argument("--docs", type=int, default=2000)
+    hybrid_parser.add_argument("--collection", default="documents")
+    hybrid_parser.add_argument("--queries", type=int, default=50, help="識別碼查詢數")
+    hybrid_parser.add_argument("--modes", nargs="+", choices=SEARCH_MODES, default=["vector", "hybrid", "auto"])
+    hybrid_parser.add_argument("--search-latency", type=float, default=0.03, help="每次 vector_find 的模擬延遲（秒）")
+    hybrid_parser.set_defaults(func=bench_hybrid)
+
+    threshold_parser = subparsers.add_parser("threshold", help="固定 limit 與分數門檻自適應搜索的傳輸量、上下文與延遲")
+    threshold_parser.add_argument("--docs", type=int, default=2000)
+    threshold_parser.add_argument("--collection", default="knowledge_base")
+    threshold_parser.add_argument("--queries", type=int, default=50)
+    threshold_parser.add_argument("--limit", type=int, default=5)
+    threshold_parser.add_argument("--threshold", type=float, default=0.7)
+    threshold_parser.add_argument("--initial-k", type=int, default=3, help="自適應門檻搜索第一次請求的結果數")
+    threshold_parser.add_argument("--search-latency", type=float, default=0.03, help="每次 vector_find 的模擬延遲（秒）")
+    threshold_parser.set_defaults(func=bench_threshold)
+
+    context_parser = subparsers.add_parser("context", help="ContextBuilder 的構建時間、去重與 token 預算前後的上下文大小")
+    context_parser.add_argument("--docs", type=int, default=5000, help="片段數")
+    context_parser.add_argument("--queries", type=int, default=500)
+    context_parser.add_argument("--limit", type=int, default=10)
+    context_parser.add_argument("--dimension", type=int, default=1536)
+    context_parser.add_argument("--chunk-tokens", type=int, default=256)
+    context_parser.add_argument("--duplicates", type=float, default=0.3, help="有轉載副本的片段比例")
+    context_parser.add_argument("--max-tokens", type=int, default=2000)
+    context_parser.add_argument("--dedup-threshold", type=float, default=0.95)
+    context_parser.set_defaults(func=bench_context)
+
+    concurrency_parser = subparsers.add_parser("concurrency", help="並行任務數與吞吐量的擴展關係")
+    concurrency_parser.add_argument("--tasks", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    concurrency_parser.add_argument("--ops", type=int, default=128, help="每種任務數執行的操作總數")
+    concurrency_parser.add_argument("--workload", choices=["search", "insert", "mixed"], default="mixed",
+                                    help="mixed 為 3 次搜索搭配 1 次插入")
+    concurrency_parser.add_argument("--docs", type=int, default=2000, help="集合預先載入的文檔數")
+    concurrency_parser.add_argument("--insert-docs", type=int, default=10, help="每次 insert_documents 的文檔數")
+    concurrency_parser.add_argument("--collection", default="documents")
+    concurrency_parser.add_argument("--astra-latency", type=float, default=0.03, help="每次 Data API 請求的模擬延遲（秒）")
+    concurrency_parser.add_argument("--blocking", action="store_true",
+                                    help="以同步呼叫模擬嵌入，重現阻塞事件迴圈時的行為作為對照")
+    concurrency_parser.set_defaults(func=bench_concurrency)
+
+    suite_parser = subparsers.add_parser("suite", help="insert_documents / search_similar / create_collections 完整套件")
+    suite_parser.add_argument("--docs", type=int, default=2000)
+    suite_parser.add_argument("--batch-docs", type=int, default=100, help="每次 insert_documents 的文檔數")
+    suite_parser.add_argument("--queries", type=int, default=200)
+    suite_parser.add_argument("--limit", type=int, default=5)
+    suite_parser.add_argument("--collection", default="documents")
+    suite_parser.add_argument("--create-runs", type=int, default=5, help="create_collections 的量測次數")
+    suite_parser.add_argument("--alloc-samples", type=int, default=3, help="以 tracemalloc 量測配置量的操作數")
+    suite_parser.add_argument("--create-latency", type=float, default=0.05, help="每次創建 / 列出集合的模擬延遲（秒）")
+    suite_parser.add_argument("--insert-latency", type=float, default=0.03, help="每次 insert_many 的模擬延遲（秒）")
+    suite_parser.add_argument("--search-latency", type=float, default=0.02, help="每次 vector_find 的模擬延遲（秒）")
+    suite_parser.set_defaults(func=bench_suite)
+
+    compare_parser = subparsers.add_parser("compare", help="比較兩次 --output 保存的結果")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="可容忍的相對退步比例")
+    compare_parser.set_defaults(func=bench_compare)
+
+    cold_parser = subparsers.add_parser("cold-start", help="匯入與第一次查詢的冷啟動延遲（可設門檻偵測退步）")
+    cold_parser.add_argument("--runs", type=int, default=5)
+    cold_parser.add_argument("--collection", default="documents")
+    cold_parser.add_argument("--max-import-ms", type=float, default=0, help="匯入時間門檻（0 為不檢查）")
+    cold_parser.add_argument("--max-first-query-ms", type=float, default=0, help="第一次查詢門檻（0 為不檢查）")
+    cold_parser.set_defaults(func=bench_cold_start)
+
+    return parser
+
+
+def main():
+    """主程式"""
+    args = build_parser().parse_args()
+    results = args.func(args)
+
+    if args.output and args.func is not bench_compare:
+        options = {key: value for key, value in vars(args).items() if key not in ("func", "output")}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "benchmark": args.command,
+                "created_at": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "options": options,
+                "results": results
+            }, f, indent=2, ensure_ascii=False)
+        print(f"💾 結果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Astra DB 串流匯入工具
+將 JSONL、CSV 或文字檔目錄匯入指定集合，記憶體用量不隨語料大小成長
+
+用法:
+    python examples/astra-ingest.py corpus.jsonl --collection documents
+    python examples/astra-ingest.py docs/ --collection knowledge_base --batch-size 50
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from astra_chunking import CHUNK_STRATEGIES, TextChunker, chunk_documents
+from astra_ingest import StreamingIngestor, iter_documents
+from astra_loader import load_astra_integration
+
+
+async def run_ingest(args: argparse.Namespace):
+    """連接 Astra DB 並執行串流匯入"""
+    module = load_astra_integration()
+    astra_manager = module.AstraDBManager(args.config)
+    if not astra_manager.config:
+        print("❌ 配置文件載入失敗")
+        return
+
+    token = os.getenv("ASTRA_DB_TOKEN") or input("請輸入您的 Astra DB API Token: ").strip()
+    if not token or not astra_manager.connect(token):
+        return
+
+    astra_manager.setup_embedding_models(os.getenv("OPENAI_API_KEY"))
+    if not astra_manager.attach_collections():
+        return
+
+    # 命令列的分塊參數覆寫 settings.chunking，insert_documents 也使用同一個分塊器
+    settings = astra_manager.config['astra_db'].get('settings', {})
+    astra_manager.chunker = TextChunker.from_settings(
+        settings, strategy=args.chunk_strategy, max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens
+    )
+    ingestor = StreamingIngestor(astra_manager, args.collection, args.batch_size)
+    documents = iter_documents(args.source, args.text_field)
+    if astra_manager.chunker is not None:
+        documents = chunk_documents(documents, astra_manager.chunker)
+
+    print(f"📥 匯入 {args.source} → 集合 '{args.collection}'")
+    start = time.perf_counter()
+    stats = await ingestor.ingest(documents)
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ 完成: {stats['documents']} 個文檔, 略過未變更 {stats['skipped']} 個, {stats['batches']} 批, "
+          f"失敗 {stats['failed_batches']} 批")
+    print(f"⏱️  耗時 {elapsed:.1f} 秒 ({stats['documents'] / elapsed if elapsed else 0:.1f} docs/sec)")
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description="Astra DB 串流匯入")
+    parser.add_argument("source", help="JSONL / CSV 檔案或文字檔目錄")
+    parser.add_argument("--config", default="config/astra-config.json", help="Astra DB 配置文件")
+    parser.add_argument("--collection", default="documents", help="目標集合")
+    parser.add_argument("--batch-size", type=int, default=None, help="每批文檔數（預設 settings.batch_size）")
+    parser.add_argument("--text-field", default="text", help="JSONL / CSV 中的文字欄位")
+    parser.add_argument("--chunk-strategy", choices=CHUNK_STRATEGIES, help="分塊策略（預設 settings.chunking.strategy）")
+    parser.add_argument("--max-tokens", type=int, help="片段最大 token 數（預設 settings.chunking.max_tokens）")
+    parser.add_argument("--overlap-tokens", type=int, help="片段重疊 token 數（預設 settings.chunking.overlap_tokens）")
+    asyncio.run(run_ingest(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,21 +8,48 @@ Astra DB 集成範例
 import json
 import os
 import asyncio
-from typing import List, Dict, Any, Optional
+import functools
+import importlib
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple, Union, TYPE_CHECKING
 from datetime import datetime
-import numpy as np
-import pandas as pd
 
-try:
-    from astrapy import DataAPIClient, Collection
-    from astrapy.info import CollectionVectorServiceOptions
-    from astrapy.constants import VectorMetric
-    from openai import OpenAI
-    from sentence_transformers import SentenceTransformer
-except ImportError as e:
-    print(f"❌ 缺少必要的套件: {e}")
-    print("請執行: uv pip install astrapy openai sentence-transformers")
-    exit(1)
+from astra_embedding_cache import EmbeddingCache
+from astra_upload import InsertReport, delete_many_concurrently, insert_many_concurrently
+from astra_query_cache import QueryResultCache
+from astra_metrics import LatencyMetrics
+from astra_client import AstraClientFactory, get_client_factory
+from astra_encoder import encode_in_process
+from astra_manifest import IngestManifest, check_chunk_id_fields, content_hash, ensure_document_id
+from astra_chunking import TextChunker, chunk_documents
+from astra_lexical import BM25Index, SEARCH_MODES, is_exact_query, reciprocal_rank_fusion
+from astra_vector_codec import encode_document_vectors, wire_vector
+from astra_batch import DocumentBatch
+from astra_collections import CollectionSetup, default_create_options, ensure_collections
+
+if TYPE_CHECKING:
+    import numpy as np
+    from astra_local_index import LocalVectorIndex
+    from astra_ann_index import IVFPQIndex
+    from astra_context import PackedContext
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+OPENAI_EMBEDDING_DIMENSION = 1536
+SENTENCE_TRANSFORMERS_MODEL = "all-MiniLM-L6-v2"
+SENTENCE_TRANSFORMERS_DIMENSION = 384
+DEFAULT_SEARCH_FIELDS = ["text", "metadata"]
+
+def require_package(module_name: str):
+    """延遲匯入重量級套件（astrapy、openai、sentence_transformers、numpy），只在第一次用到時付出匯入成本"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(
+            f"缺少必要的套件: {e}，請執行: uv pip install astrapy openai sentence-transformers numpy"
+        ) from e
 
 class AstraDBManager:
     """Astra DB 管理器"""
@@ -31,9 +58,38 @@ class AstraDBManager:
         """初始化 Astra DB 管理器"""
         self.config = self._load_config(config_path)
         self.client = None
+        self.client_factory: Optional[AstraClientFactory] = None
         self.collections = {}
         self.openai_client = None
+        self.async_openai_client = None
+        self.openai_api_key = None
         self.embedding_model = None
+        self._embedding_model_error = None
+        self._embedding_model_lock = threading.Lock()
+        self._encode_executor: Optional[Executor] = None
+        self.embedding_cache = EmbeddingCache.from_settings(
+            self.config.get('astra_db', {}).get('settings', {})
+        ) if self.config else None
+        self.local_indexes: Dict[str, Any] = {}
+        self.lexical_indexes: Dict[str, BM25Index] = {}
+        # 由 load_local_index / load_lexical_index 從整個集合建立的詞彙索引，auto 模式只對這些集合單獨使用詞彙索引
+        self.complete_lexical_indexes: Set[str] = set()
+        self.query_cache = QueryResultCache.from_settings(
+            self.config.get('astra_db', {}).get('settings', {})
+        ) if self.config else None
+        self.metrics = LatencyMetrics.from_settings(
+            self.config.get('astra_db', {}).get('settings', {})
+        ) if self.config else None
+        self.ingest_manifest = IngestManifest.from_settings(
+            self.config.get('astra_db', {}).get('settings', {})
+        ) if self.config else None
+        self.chunker = TextChunker.from_settings(
+            self.config.get('astra_db', {}).get('settings', {})
+        ) if self.config else None
+        # 來源鍵欄位（settings.ingest_manifest.id_fields）：設定後 _id 由這些欄位決定，修改後的文檔覆寫原本的 _id
+        self.id_fields: List[str] = list(
+            self.config.get('astra_db', {}).get('settings', {}).get('ingest_manifest', {}).get('id_fields', [])
+        ) if self.config else []
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """載入配置文件"""
@@ -48,11 +104,12 @@ class AstraDBManager:
             return {}
     
     def connect(self, token: str) -> bool:
-        """連接到 Astra DB"""
+        """連接到 Astra DB（經由行程內共用的客戶端工廠取得非同步資料庫句柄，重複連接時重用連線池）"""
         try:
-            self.client = DataAPIClient(token)
+            self.client_factory = get_client_factory(token)
+            self.client = self.client_factory.client
             database_id = self.config['astra_db']['database_id']
-            self.database = self.client.get_database(database_id)
+            self.database = self.client_factory.get_async_database(database_id)
             print(f"✅ 成功連接到 Astra DB: {database_id}")
             return True
         except Exception as e:
@@ -60,121 +117,890 @@ class AstraDBManager:
             return False
     
     def setup_embedding_models(self, openai_api_key: str = None):
-        """設置嵌入模型"""
+        """設置嵌入模型（客戶端與模型延遲到對應 service 的集合第一次使用時才建立）"""
         # OpenAI 嵌入模型
         if openai_api_key:
-            self.openai_client = OpenAI(api_key=openai_api_key)
+            self.openai_api_key = openai_api_key
             print("✅ OpenAI 客戶端已設置")
+    
+    def _get_openai_client(self):
+        """第一次使用 OpenAI 集合時才匯入 openai 並建立客戶端"""
+        if self.openai_client is None and self.openai_api_key:
+            self.openai_client = require_package("openai").OpenAI(api_key=self.openai_api_key)
+        return self.openai_client
+    
+    def _get_async_openai_client(self):
+        """非同步路徑使用的 AsyncOpenAI 客戶端，同樣延遲到第一次使用時建立"""
+        if self.async_openai_client is None and self.openai_api_key:
+            self.async_openai_client = require_package("openai").AsyncOpenAI(api_key=self.openai_api_key)
+        return self.async_openai_client
+    
+    def _get_embedding_model(self):
+        """第一次使用 Sentence Transformers 集合時才匯入並載入模型，失敗後不再重試"""
+        with self._embedding_model_lock:  # 編碼執行緒可能同時要求載入
+            if self.embedding_model is None and self._embedding_model_error is None:
+                try:
+                    sentence_transformers = require_package("sentence_transformers")
+                    self.embedding_model = sentence_transformers.SentenceTransformer(SENTENCE_TRANSFORMERS_MODEL)
+                    print("✅ Sentence Transformers 模型已載入")
+                except Exception as e:
+                    self._embedding_model_error = e
+                    print(f"⚠️  Sentence Transformers 模型載入失敗: {e}")
+        return self.embedding_model
+    
+    def _get_encode_executor(self) -> Executor:
+        """本地模型編碼使用的執行緒池或行程池（settings.local_encoder）"""
+        if self._encode_executor is None:
+            encoder_settings = self.config['astra_db'].get('settings', {}).get('local_encoder', {})
+            max_workers = int(encoder_settings.get('max_workers', 2))
+            if encoder_settings.get('executor', 'thread') == 'process':
+                self._encode_executor = ProcessPoolExecutor(max_workers=max_workers)
+            else:
+                self._encode_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="encode")
+        return self._encode_executor
+    
+    async def create_collections(self) -> CollectionSetup:
+        """確保配置中的向量集合都存在（可重複執行），回傳可當作布林值的設置結果。
         
-        # Sentence Transformers 模型
-        try:
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            print("✅ Sentence Transformers 模型已載入")
-        except Exception as e:
-            print(f"⚠️  Sentence Transformers 模型載入失敗: {e}")
+        以一次 list_collections 取得現有集合：已存在的集合比對 dimension 與 vector_metric 後直接取得句柄，
+        只有缺少的集合以 settings.max_concurrency 並行創建。
+        astrapy 的列舉與服務選項只在經由 connect() 連線時使用，直接指定的 database（例如本地替身）以配置中的字串創建
+        """
+        database_id = self.config['astra_db']['database_id']
+        collections_config = self.config['astra_db']['collections']
+        
+        create_options = default_create_options
+        if self.client_factory is not None:
+            try:
+                CollectionVectorServiceOptions = require_package("astrapy.info").CollectionVectorServiceOptions
+                VectorMetric = require_package("astrapy.constants").VectorMetric
+            except ImportError as e:
+                print(f"❌ 創建集合失敗: {e}")
+                return CollectionSetup(error=str(e))
+            
+            def create_options(collection_config: Dict[str, Any]) -> Dict[str, Any]:
+                return {
+                    "metric": VectorMetric[collection_config['vector_metric'].upper()],
+                    "dimension": collection_config['dimension'],
+                    # 設置向量服務選項
+                    "service": CollectionVectorServiceOptions(provider=collection_config['service'])
+                }
+        
+        def get_collection(name: str):
+            if self.client_factory is not None:
+                return self.client_factory.get_async_collection(database_id, name)
+            return self.database.get_collection(name)
+        
+        print(f"📦 檢查 {len(collections_config)} 個集合...")
+        setup = await ensure_collections(
+            self.database,
+            collections_config,
+            get_collection=get_collection,
+            create_options=create_options,
+            concurrency=int(self.config['astra_db'].get('settings', {}).get('max_concurrency', 4))
+        )
+        
+        for collection_name in setup.created:
+            if self.client_factory is not None:
+                self.client_factory.cache_collection(database_id, setup.collections[collection_name],
+                                                     asynchronous=True)
+            print(f"✅ 集合 '{collection_name}' 創建成功")
+        for collection_name in setup.existing:
+            print(f"ℹ️  集合 '{collection_name}' 已存在，結構與配置相符")
+        for collection_name, problems in setup.mismatched.items():
+            print(f"❌ 集合 '{collection_name}' 的結構與配置不符: {'；'.join(problems)}")
+        for collection_name, error in setup.failed.items():
+            print(f"❌ 創建集合 '{collection_name}' 失敗: {error}")
+        if setup.error:
+            print(f"❌ 創建集合失敗: {setup.error}")
+        
+        self.collections.update(setup.collections)
+        return setup
     
-    async def create_collections(self) -> bool:
-        """創建向量集合"""
+    def attach_collections(self) -> bool:
+        """取得已存在集合的句柄（不重新創建），供匯入等只需讀寫的場景使用"""
         try:
+            database_id = self.config['astra_db']['database_id']
             for collection_name, collection_config in self.config['astra_db']['collections'].items():
-                print(f"📦 創建集合: {collection_name}")
-                
-                # 設置向量服務選項
-                vector_service = CollectionVectorServiceOptions(
-                    provider=collection_config['service']
-                )
-                
-                # 創建集合
-                collection = await self.database.create_collection(
-                    collection_config['name'],
-                    metric=VectorMetric[collection_config['vector_metric'].upper()],
-                    dimension=collection_config['dimension'],
-                    service=vector_service
-                )
-                
+                if self.client_factory is not None:
+                    collection = self.client_factory.get_async_collection(database_id, collection_config['name'])
+                else:
+                    collection = self.database.get_collection(collection_config['name'])
                 self.collections[collection_name] = collection
-                print(f"✅ 集合 '{collection_name}' 創建成功")
-            
             return True
         except Exception as e:
-            print(f"❌ 創建集合失敗: {e}")
+            print(f"❌ 取得集合失敗: {e}")
             return False
     
-    def get_embedding_openai(self, text: str) -> List[float]:
-        """使用 OpenAI 獲取嵌入向量"""
-        if not self.openai_client:
+    def get_embedding_openai(self, text: str, dimension: int = OPENAI_EMBEDDING_DIMENSION) -> List[float]:
+        """使用 OpenAI 獲取嵌入向量（dimension 小於 1536 時由 API 直接回傳縮短的向量）"""
+        return self.get_embeddings_openai([text], dimension)[0]
+    
+    def get_embedding_sentence_transformers(self, text: str) -> List[float]:
+        """使用 Sentence Transformers 獲取嵌入向量"""
+        return self.get_embeddings_sentence_transformers([text])[0]
+    
+    def get_embeddings_openai(self, texts: List[str],
+                              dimension: int = OPENAI_EMBEDDING_DIMENSION) -> List[List[float]]:
+        """使用 OpenAI 批量獲取嵌入向量（一次 HTTP 請求處理整批文字）"""
+        with self._time("embedding", service="openai"):
+            return self._cached_embed(OPENAI_EMBEDDING_MODEL, dimension, texts,
+                                      self._timed(functools.partial(self._request_openai_embeddings,
+                                                                    dimension=dimension),
+                                                  "embedding_request", service="openai"))
+    
+    def get_embeddings_sentence_transformers(self, texts: List[str]) -> List[List[float]]:
+        """使用 Sentence Transformers 批量獲取嵌入向量（一次前向傳播處理整批文字）"""
+        with self._time("embedding", service="sentence_transformers"):
+            return self._cached_embed(SENTENCE_TRANSFORMERS_MODEL, SENTENCE_TRANSFORMERS_DIMENSION, texts,
+                                      self._timed(self._request_sentence_transformers_embeddings,
+                                                  "embedding_request", service="sentence_transformers"))
+    
+    def embed_texts(self, texts: List[str], collection_name: str = "documents") -> List[List[float]]:
+        """依集合配置批量生成嵌入向量，快取未命中的文字按 settings.batch_size 分批請求"""
+        collection_config = self.config['astra_db']['collections'][collection_name]
+        model, dimension = self._embedding_spec(collection_name)
+        if collection_config['service'] == 'openai':
+            request_batch = functools.partial(self._request_openai_embeddings, dimension=dimension)
+        else:
+            request_batch = self._request_sentence_transformers_embeddings
+        
+        batch_size = max(1, int(self.config['astra_db'].get('settings', {}).get('batch_size', 100)))
+        labels = {"collection": collection_name, "service": collection_config['service']}
+        
+        def request_in_batches(pending: List[str]) -> List[List[float]]:
+            vectors = []
+            for start in range(0, len(pending), batch_size):
+                with self._time("embedding_request", **labels):
+                    vectors.extend(request_batch(pending[start:start + batch_size]))
+            return vectors
+        
+        with self._time("embedding", **labels):
+            return self._cached_embed(model, dimension, texts, request_in_batches)
+    
+    async def aembed_texts(self, texts: List[str], collection_name: str = "documents") -> List[List[float]]:
+        """embed_texts 的非阻塞版本：OpenAI 批次以 AsyncOpenAI 並行送出，本地模型在執行緒 / 行程池編碼"""
+        model, dimension, labels, request_in_batches = self._async_embedder(collection_name)
+        with self._time("embedding", **labels):
+            if self.embedding_cache is None:
+                return await request_in_batches(texts)
+            return await self.embedding_cache.get_or_embed_async(model, dimension, texts, request_in_batches)
+    
+    async def aembed_matrix(self, texts: List[str], collection_name: str = "documents") -> "np.ndarray":
+        """aembed_texts 的矩陣版本：回傳 (len(texts), dimension) float32 矩陣，每個請求批次的結果立即轉成陣列"""
+        model, dimension, labels, request_in_batches = self._async_embedder(collection_name, as_matrix=True)
+        with self._time("embedding", **labels):
+            if self.embedding_cache is None:
+                return await request_in_batches(texts)
+            return await self.embedding_cache.get_or_embed_matrix_async(model, dimension, texts, request_in_batches)
+    
+    def _async_embedder(self, collection_name: str, as_matrix: bool = False):
+        """集合的 (模型, 維度, 指標標籤, 分批並行請求的協程函式)；as_matrix 時請求結果合併為 float32 矩陣"""
+        collection_config = self.config['astra_db']['collections'][collection_name]
+        model, dimension = self._embedding_spec(collection_name)
+        if collection_config['service'] == 'openai':
+            request_batch = functools.partial(self._arequest_openai_embeddings, dimension=dimension)
+        else:
+            request_batch = self._arequest_sentence_transformers_embeddings
+        
+        settings = self.config['astra_db'].get('settings', {})
+        batch_size = max(1, int(settings.get('batch_size', 100)))
+        semaphore = asyncio.Semaphore(max(1, int(settings.get('max_concurrency', 4))))
+        labels = {"collection": collection_name, "service": collection_config['service']}
+        
+        async def request(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                with self._time("embedding_request", **labels):
+                    return await request_batch(batch)
+        
+        async def request_into(matrix: "np.ndarray", start: int, batch: List[str]):
+            # 每個回應立即寫入預先配置的矩陣，list[float] 只在單一請求的生命週期內存在
+            matrix[start:start + len(batch)] = await request(batch)
+        
+        async def request_in_batches(pending: List[str]):
+            if as_matrix:
+                np = require_package("numpy")
+                matrix = np.empty((len(pending), dimension), dtype=np.float32)
+                await asyncio.gather(*(
+                    request_into(matrix, start, pending[start:start + batch_size])
+                    for start in range(0, len(pending), batch_size)
+                ))
+                return matrix
+            batches = await asyncio.gather(*(
+                request(pending[start:start + batch_size]) for start in range(0, len(pending), batch_size)
+            ))
+            return [vector for batch in batches for vector in batch]
+        
+        return model, dimension, labels, request_in_batches
+    
+    def _embedding_spec(self, collection_name: str):
+        """集合使用的嵌入模型與向量維度；OpenAI 集合的維度取自集合配置的 dimension（可縮短至 1536 以下）"""
+        collection_config = self.config['astra_db']['collections'][collection_name]
+        if collection_config['service'] != 'openai':
+            return SENTENCE_TRANSFORMERS_MODEL, SENTENCE_TRANSFORMERS_DIMENSION
+        
+        dimension = int(collection_config.get('dimension', OPENAI_EMBEDDING_DIMENSION))
+        if not 1 <= dimension <= OPENAI_EMBEDDING_DIMENSION:
+            raise ValueError(f"集合 '{collection_name}' 的 dimension 必須介於 1 與 {OPENAI_EMBEDDING_DIMENSION} 之間")
+        return OPENAI_EMBEDDING_MODEL, dimension
+    
+    def _time(self, stage: str, **labels: str):
+        """階段計時器；停用指標時為空操作"""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.time(stage, **labels)
+    
+    def _timed(self, function: Callable, stage: str, **labels: str) -> Callable:
+        """包裝函式使每次呼叫都記入指定階段"""
+        if self.metrics is None:
+            return function
+        
+        def timed(*args, **kwargs):
+            with self.metrics.time(stage, **labels):
+                return function(*args, **kwargs)
+        return timed
+    
+    def _stage_labels(self, collection_name: str) -> Dict[str, str]:
+        """集合名稱與其嵌入服務，作為指標標籤"""
+        collection_config = self.config['astra_db']['collections'].get(collection_name, {})
+        return {"collection": collection_name, "service": collection_config.get('service', 'unknown')}
+    
+    def _cached_embed(self, model: str, dimension: int, texts: List[str],
+                      request_batch: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """經由嵌入快取取得向量，僅對未命中的文字發出請求"""
+        if self.embedding_cache is None:
+            return request_batch(texts)
+        return self.embedding_cache.get_or_embed(model, dimension, texts, request_batch)
+    
+    def _request_openai_embeddings(self, texts: List[str],
+                                   dimension: int = OPENAI_EMBEDDING_DIMENSION) -> List[List[float]]:
+        """向 OpenAI 發出一次批量嵌入請求"""
+        openai_client = self._get_openai_client()
+        if not openai_client:
             raise ValueError("OpenAI 客戶端未設置")
         
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
+        response = openai_client.embeddings.create(
+            model=OPENAI_EMBEDDING_MODEL,
+            input=texts,
+            **self._dimension_kwargs(dimension)
         )
-        return response.data[0].embedding
+        # 依 index 排序，確保輸出順序與輸入一致
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     
-    def get_embedding_sentence_transformers(self, text: str) -> List[float]:
-        """使用 Sentence Transformers 獲取嵌入向量"""
-        if not self.embedding_model:
+    async def _arequest_openai_embeddings(self, texts: List[str],
+                                          dimension: int = OPENAI_EMBEDDING_DIMENSION) -> List[List[float]]:
+        """以 AsyncOpenAI 發出一次批量嵌入請求，等待期間不阻塞事件迴圈"""
+        openai_client = self._get_async_openai_client()
+        if not openai_client:
+            raise ValueError("OpenAI 客戶端未設置")
+        
+        response = await openai_client.embeddings.create(
+            model=OPENAI_EMBEDDING_MODEL,
+            input=texts,
+            **self._dimension_kwargs(dimension)
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    @staticmethod
+    def _dimension_kwargs(dimension: int) -> Dict[str, int]:
+        """只有縮短維度時才傳 dimensions 參數，預設維度的請求與原本完全相同"""
+        return {} if dimension == OPENAI_EMBEDDING_DIMENSION else {"dimensions": dimension}
+    
+    async def _arequest_sentence_transformers_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """將 CPU 密集的本地編碼交給執行緒池或行程池"""
+        executor = self._get_encode_executor()
+        loop = asyncio.get_running_loop()
+        if isinstance(executor, ProcessPoolExecutor):
+            # 子行程各自載入模型並快取，只傳送文字與向量
+            return await loop.run_in_executor(executor, encode_in_process, SENTENCE_TRANSFORMERS_MODEL, texts)
+        return await loop.run_in_executor(executor, self._request_sentence_transformers_embeddings, texts)
+    
+    def _request_sentence_transformers_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """以 Sentence Transformers 對整批文字執行一次編碼"""
+        embedding_model = self._get_embedding_model()
+        if not embedding_model:
             raise ValueError("Sentence Transformers 模型未載入")
         
-        return self.embedding_model.encode(text).tolist()
+        return embedding_model.encode(texts, batch_size=len(texts)).tolist()
+    
+    def manifest_scope(self, collection_name: str) -> str:
+        """匯入清單的範圍：資料庫 / 集合 / 嵌入模型:維度（更換模型或維度後所有文檔都會重新嵌入）"""
+        model, dimension = self._embedding_spec(collection_name)
+        return f"{self.config['astra_db'].get('database_id', '')}/{collection_name}/{model}:{dimension}"
+    
+    def _plan_documents(self, documents: Union[List[Dict[str, Any]], DocumentBatch],
+                        collection_name: str) -> Tuple[Any, Dict[Any, str], Set[Any], int]:
+        """為文檔補上 _id（來源鍵或內容雜湊）並對照匯入清單，回傳 (待上傳文檔, _id→雜湊, 清單中已存在的 _id, 未變更的略過數)。
+        
+        同一批中 _id 相同的文檔只保留最後一個（並印出重複數）；傳入 DocumentBatch 時待上傳文檔為其子批次
+        """
+        hashes: Dict[Any, str] = {}
+        unique: Dict[Any, Any] = {}
+        if isinstance(documents, DocumentBatch):
+            for row, digest in enumerate(documents.ensure_ids(self.id_fields)):
+                hashes[documents.ids[row]] = digest
+                unique[documents.ids[row]] = row
+        else:
+            for doc in documents:
+                digest = content_hash(doc)
+                doc_id = ensure_document_id(doc, digest, self.id_fields)
+                hashes[doc_id] = digest
+                unique[doc_id] = doc
+        duplicates = len(documents) - len(unique)
+        if duplicates:
+            print(f"⚠️  集合 '{collection_name}' 有 {duplicates} 個文檔與同批文檔的 _id 重複，只保留最後一個")
+        
+        stored: Dict[Any, str] = {}
+        if self.ingest_manifest is not None:
+            stored = self.ingest_manifest.lookup(self.manifest_scope(collection_name), unique)
+        pending = [item for doc_id, item in unique.items() if stored.get(doc_id) != hashes[doc_id]]
+        if isinstance(documents, DocumentBatch):
+            pending = documents.take(pending)
+        return pending, hashes, set(stored), len(unique) - len(pending)
     
-    async def insert_documents(self, documents: List[Dict[str, Any]], collection_name: str = "documents") -> bool:
-        """插入文檔到向量數據庫"""
+    def filter_unchanged(self, documents: Union[List[Dict[str, Any]], DocumentBatch],
+                         collection_name: str = "documents") -> Union[List[Dict[str, Any]], DocumentBatch]:
+        """去掉匯入清單中內容未變更的文檔（並補上 _id），讓呼叫端在嵌入前就略過它們"""
+        return self._plan_documents(documents, collection_name)[0]
+    
+    async def insert_documents(self, documents: Union[List[Dict[str, Any]], DocumentBatch],
+                               collection_name: str = "documents",
+                               concurrency: Optional[int] = None) -> InsertReport:
+        """以 upsert 語意插入文檔，分區塊並行上傳並回傳逐區塊結果報告。
+        
+        超過 settings.chunking.max_tokens 的文檔先切成帶父文檔 metadata 的片段；
+        沒有 _id 的文檔以 settings.ingest_manifest.id_fields 的來源鍵（未設定時為 text 與 metadata 的內容雜湊）作為 _id；
+        匯入清單中內容未變更的文檔既不嵌入也不上傳。
+        documents 也可以是列式的 DocumentBatch：向量保存在單一 float32 矩陣中，
+        上傳時逐區塊產生 dict，本地索引直接接收矩陣切片
+        """
+        if collection_name not in self.collections:
+            print(f"❌ 集合 '{collection_name}' 不存在")
+            return InsertReport(collection_name, error=f"集合 '{collection_name}' 不存在")
+        
+        collection = self.collections[collection_name]
+        settings = self.config['astra_db'].get('settings', {})
+        labels = self._stage_labels(collection_name)
+        start = time.perf_counter()
+        
+        columnar = isinstance(documents, DocumentBatch)
+        if self.chunker is not None:
+            check_chunk_id_fields(self.id_fields)
+            documents = documents.chunk(self.chunker) if columnar else list(chunk_documents(documents, self.chunker))
+        documents, hashes, existing_ids, skipped = self._plan_documents(documents, collection_name)
+        if not documents:
+            print(f"ℹ️  集合 '{collection_name}' 的 {skipped} 個文檔皆未變更，略過上傳")
+            report = InsertReport(collection_name)
+            report.skipped = skipped
+            return report
+        
         try:
-            if collection_name not in self.collections:
+            if columnar:
+                # 整批嵌入直接寫入矩陣；上傳檢視在切出每個區塊時才產生 dict 並編碼該區塊的向量
+                if documents.vectors is None:
+                    documents.set_vectors(await self.aembed_matrix(documents.texts, collection_name))
+                uploads = documents.wire(self._vector_encoding())
+            else:
+                # 批量生成嵌入向量，取代逐文檔呼叫（已帶 $vector 的文檔不重複嵌入）
+                text_docs = [doc for doc in documents if 'text' in doc and '$vector' not in doc]
+                vectors = await self.aembed_texts([doc['text'] for doc in text_docs], collection_name)
+                for doc, vector in zip(text_docs, vectors):
+                    doc['$vector'] = vector
+                # $vector 以 base64 打包的 float32 傳輸（settings.vector_encoding），不再序列化成十進位 JSON 陣列
+                encode_document_vectors(documents, self._vector_encoding())
+                uploads = documents
+        except Exception as e:
+            print(f"❌ 生成嵌入向量失敗: {e}")
+            return InsertReport(collection_name, error=f"{type(e).__name__}: {e}")
+        
+        # 分區塊並行插入，失敗區塊以指數退避重試
+        report = await insert_many_concurrently(
+            collection,
+            uploads,
+            collection_name,
+            chunk_size=int(settings.get('insert_chunk_size', 20)),
+            concurrency=concurrency or int(settings.get('max_concurrency', 4)),
+            max_retries=int(settings.get('max_retries', 3)),
+            timeout=settings.get('timeout', 30),
+            upsert=True,
+            existing_ids=existing_ids
+        )
+        report.skipped = skipped
+        if self.metrics is not None:
+            # 每個區塊的往返時間（含重試）由上傳報告提供，不另外包裝請求
+            for chunk in report.chunks:
+                self.metrics.observe("astra_insert_many", chunk.seconds, **labels)
+        
+        # 集合內容已變更，使快取的搜索結果失效
+        if self.query_cache is not None:
+            self.query_cache.invalidate(collection_name)
+        
+        # 同步更新本地索引、詞彙索引與匯入清單（僅限成功上傳的區塊）；
+        # 詞彙索引保存文檔內容，只更新已載入或明確啟用的索引，不在插入時建立，串流匯入的記憶體用量才有上限
+        local_index = self.local_indexes.get(collection_name)
+        lexical_index = self.lexical_indexes.get(collection_name)
+        uploaded: Dict[Any, str] = {}
+        for chunk in report.chunks:
+            if chunk.ok:
+                end = chunk.offset + chunk.size
+                if columnar:
+                    chunk_docs = documents.payloads(chunk.offset, end)
+                    if local_index is not None:
+                        local_index.add_vectors(documents.vectors[chunk.offset:end], chunk_docs)
+                else:
+                    chunk_docs = documents[chunk.offset:end]
+                    if local_index is not None:
+                        local_index.add(chunk_docs)
+                if lexical_index is not None:
+                    lexical_index.add(chunk_docs)
+                uploaded.update((doc['_id'], hashes[doc['_id']]) for doc in chunk_docs)
+        if self.ingest_manifest is not None:
+            self.ingest_manifest.record(self.manifest_scope(collection_name), uploaded)
+        
+        skipped_note = f"（略過 {skipped} 個未變更文檔）" if skipped else ""
+        if report.ok:
+            print(f"✅ 成功插入 {report.inserted} 個文檔到集合 '{collection_name}'{skipped_note}")
+        else:
+            print(f"❌ 插入文檔部分失敗: 成功 {report.inserted}, 失敗 {report.failed} "
+                  f"({len(report.failed_chunks)}/{len(report.chunks)} 個區塊)")
+            for chunk in report.failed_chunks:
+                print(f"   - 區塊 {chunk.index}: {chunk.error} (嘗試 {chunk.attempts} 次)")
+        if self.metrics is not None:
+            self.metrics.observe("insert_documents", time.perf_counter() - start, **labels)
+        return report
+    
+    async def delete_documents(self, doc_ids: List[Any], collection_name: str = "documents",
+                               concurrency: Optional[int] = None) -> bool:
+        """依 _id 刪除文檔，並同步更新本地索引、匯入清單與結果快取"""
+        if collection_name not in self.collections:
+            print(f"❌ 集合 '{collection_name}' 不存在")
+            return False
+        if not doc_ids:
+            return True
+        
+        settings = self.config['astra_db'].get('settings', {})
+        try:
+            deleted = await delete_many_concurrently(
+                self.collections[collection_name],
+                list(doc_ids),
+                concurrency=concurrency or int(settings.get('max_concurrency', 4)),
+                max_retries=int(settings.get('max_retries', 3)),
+                timeout=settings.get('timeout', 30)
+            )
+        except Exception as e:
+            print(f"❌ 刪除文檔失敗: {e}")
+            return False
+        
+        local_index = self.local_indexes.get(collection_name)
+        if local_index is not None:
+            local_index.remove(doc_ids)
+        lexical_index = self.lexical_indexes.get(collection_name)
+        if lexical_index is not None:
+            lexical_index.remove(doc_ids)
+        if self.ingest_manifest is not None:
+            self.ingest_manifest.forget(self.manifest_scope(collection_name), doc_ids)
+        if self.query_cache is not None:
+            self.query_cache.invalidate(collection_name)
+        print(f"🗑️  已從集合 '{collection_name}' 刪除 {deleted} 個文檔")
+        return True
+    
+    async def search_similar(self, query: str, collection_name: str = "documents", limit: int = 5,
+                             fields: Optional[List[str]] = None, mode: Optional[str] = None,
+                             filter: Optional[Dict[str, Any]] = None,
+                             threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """搜索相似文檔（先查結果快取；集合已啟用本地索引時在行程內完成，不經網路）。
+        
+        mode: vector 只用向量；lexical 只查 BM25 詞彙索引，不呼叫嵌入；hybrid 以 RRF 融合兩者；
+        auto 讓識別碼與引號查詢只走詞彙索引，其餘走 hybrid；詞彙索引須由 load_local_index / load_lexical_index
+        從整個集合建立，且文檔必須完整含有每個查詢詞，沒有命中時改用向量。
+        預設取自 settings.lexical_index.search_mode（預設 vector），集合沒有詞彙索引時一律使用向量。
+        
+        filter 使用 Data API find 的語法（例如 {"metadata.category": "技術"}），遠端下推到 vector_find，
+        本地索引則先篩出符合的列再計分，回傳的 limit 個結果都符合條件
+        
+        score 一律為向量相似度（0~1）；lexical 模式的 score 為 BM25 分數，hybrid 的融合分數放在 rrf_score、
+        BM25 分數放在 bm25_score，只由詞彙索引找到的結果沒有 score。
+        
+        threshold 為最低相似度分數（與 score 同為 0~1 的尺度）：只回傳分數不低於門檻的結果，最多 limit 個。
+        遠端搜索預設一次取 limit 個結果後在客戶端過濾；settings.adaptive_search.initial_k 小於 limit 時從較少的結果開始，
+        每次放大 growth_factor 倍，出現低於門檻的分數就停止（少傳輸低分結果，但相關結果多的查詢要多幾次往返）。BM25 分數無法與門檻比較，有門檻時 lexical 與 auto
+        改用 hybrid（沒有詞彙索引時為 vector），只回傳相似度達門檻的結果
+        """
+        fields = fields or DEFAULT_SEARCH_FIELDS
+        mode = mode or self._default_search_mode()
+        if self.query_cache is not None:
+            cached = self.query_cache.get(collection_name, query, limit, fields, mode, filter, threshold=threshold)
+            if cached is not None:
+                return cached
+            generation = self.query_cache.generation(collection_name)
+        
+        try:
+            if collection_name not in self.local_indexes and collection_name not in self.collections:
                 print(f"❌ 集合 '{collection_name}' 不存在")
-                return False
+                return []
             
-            collection = self.collections[collection_name]
+            with self._time("search_similar", **self._stage_labels(collection_name)):
+                search_mode = self._search_mode(query, collection_name, mode, threshold)
+                if search_mode == "lexical":
+                    results = self._lexical_search(query, collection_name, limit, fields, filter,
+                                                   exact=mode == "auto")
+                if search_mode != "lexical" or (not results and mode == "auto"):
+                    # 生成查詢向量
+                    query_vector = (await self.aembed_texts([query], collection_name))[0]
+                    
+                    results = await self._search_with_vector(query, query_vector, collection_name, limit, fields,
+                                                             hybrid=search_mode == "hybrid", filter=filter,
+                                                             threshold=threshold)
             
-            # 為每個文檔生成嵌入向量
-            for doc in documents:
-                if 'text' in doc:
-                    # 根據集合配置選擇嵌入模型
-                    collection_config = self.config['astra_db']['collections'][collection_name]
-                    if collection_config['service'] == 'openai':
-                        doc['$vector'] = self.get_embedding_openai(doc['text'])
-                    else:
-                        doc['$vector'] = self.get_embedding_sentence_transformers(doc['text'])
+            if self.query_cache is not None:
+                self.query_cache.put(collection_name, query, limit, fields, results, generation, mode, filter,
+                                     threshold=threshold)
+            print(f"🔍 找到 {len(results)} 個相似文檔")
+            return results
             
-            # 批量插入文檔
-            result = await collection.insert_many(documents)
-            print(f"✅ 成功插入 {len(documents)} 個文檔到集合 '{collection_name}'")
-            return True
+        except Exception as e:
+            print(f"❌ 搜索失敗: {e}")
+            return []
+    
+    async def search_similar_many(self, queries: List[str], collection_name: str = "documents", limit: int = 5,
+                                  fields: Optional[List[str]] = None, concurrency: Optional[int] = None,
+                                  mode: Optional[str] = None,
+                                  filter: Optional[Dict[str, Any]] = None,
+                                  threshold: Optional[float] = None) -> List[List[Dict[str, Any]]]:
+        """批量搜索：所有查詢一次批量嵌入，向量搜索以有限並行度同時執行，結果依輸入順序回傳；
+        mode、filter 與 threshold 與 search_similar 相同（套用到每個查詢），只走詞彙索引的查詢不參與嵌入"""
+        fields = fields or DEFAULT_SEARCH_FIELDS
+        mode = mode or self._default_search_mode()
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        
+        # 快取命中的查詢不需嵌入與搜索
+        pending = []
+        for i, query in enumerate(queries):
+            cached = (self.query_cache.get(collection_name, query, limit, fields, mode, filter, threshold=threshold)
+                      if self.query_cache else None)
+            if cached is None:
+                pending.append(i)
+            else:
+                results[i] = cached
+        cache_hits = len(queries) - len(pending)
+        
+        if pending:
+            if collection_name not in self.local_indexes and collection_name not in self.collections:
+                print(f"❌ 集合 '{collection_name}' 不存在")
+                return [result or [] for result in results]
+            
+            generation = self.query_cache.generation(collection_name) if self.query_cache else None
+            
+            # 詞彙索引能回答的查詢直接完成，其餘才需要嵌入
+            search_modes = {i: self._search_mode(queries[i], collection_name, mode, threshold) for i in pending}
+            lexical = [i for i in pending if search_modes[i] == "lexical"]
+            for i in lexical:
+                results[i] = self._lexical_search(queries[i], collection_name, limit, fields, filter,
+                                                  exact=mode == "auto")
+                if results[i] or mode != "auto":
+                    if self.query_cache is not None:
+                        self.query_cache.put(collection_name, queries[i], limit, fields, results[i], generation,
+                                             mode, filter, threshold=threshold)
+                else:
+                    search_modes[i] = "vector"
+            pending = [i for i in pending if search_modes[i] != "lexical"]
+        
+        if pending:
+            try:
+                query_vectors = await self.aembed_texts([queries[i] for i in pending], collection_name)
+            except Exception as e:
+                print(f"❌ 生成查詢向量失敗: {e}")
+                return [result or [] for result in results]
             
+            settings = self.config['astra_db'].get('settings', {})
+            semaphore = asyncio.Semaphore(max(1, concurrency or int(settings.get('max_concurrency', 4))))
+            
+            async def search_one(i: int, query_vector: List[float]):
+                async with semaphore:
+                    try:
+                        results[i] = await self._search_with_vector(queries[i], query_vector, collection_name, limit,
+                                                                    fields, hybrid=search_modes[i] == "hybrid",
+                                                                    filter=filter, threshold=threshold)
+                    except Exception as e:
+                        print(f"❌ 搜索失敗 (查詢 {i}): {e}")
+                        results[i] = []
+                        return
+                if self.query_cache is not None:
+                    self.query_cache.put(collection_name, queries[i], limit, fields, results[i], generation,
+                                         mode, filter, threshold=threshold)
+            
+            await asyncio.gather(*(search_one(i, vector) for i, vector in zip(pending, query_vectors)))
+        
+        print(f"🔍 完成 {len(queries)} 個查詢（快取命中 {cache_hits}）")
+        return results
+    
+    def _vector_encoding(self) -> str:
+        return self.config['astra_db'].get('settings', {}).get('vector_encoding', 'binary')
+    
+    def _default_search_mode(self) -> str:
+        return self.config['astra_db'].get('settings', {}).get('lexical_index', {}).get('search_mode', 'vector')
+    
+    def _search_mode(self, query: str, collection_name: str, mode: str, threshold: Optional[float] = None) -> str:
+        """決定查詢實際的檢索方式（vector / lexical / hybrid）；集合沒有詞彙索引或索引為空時只能用向量，
+        auto 只在詞彙索引涵蓋整個集合時才讓精確查詢單獨走詞彙索引，有相似度門檻時不單獨走詞彙索引"""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支援的搜索模式: {mode}")
+        if threshold is not None and mode in ("lexical", "auto"):
+            mode = "hybrid"
+        if mode == "lexical":
+            return "lexical"
+        if mode == "vector" or not self.lexical_indexes.get(collection_name):
+            return "vector"
+        if mode == "auto":
+            if is_exact_query(query) and collection_name in self.complete_lexical_indexes:
+                return "lexical"
+            return "hybrid"
+        return mode
+    
+    def _lexical_search(self, query: str, collection_name: str, limit: int, fields: List[str],
+                        filter: Optional[Dict[str, Any]] = None, exact: bool = False) -> List[Dict[str, Any]]:
+        """以本地 BM25 詞彙索引搜索，不需要查詢向量；exact 時只回傳完整含有每個查詢詞的文檔"""
+        lexical_index = self.lexical_indexes.get(collection_name)
+        if lexical_index is None:
+            return []
+        with self._time("lexical_search", **self._stage_labels(collection_name)):
+            return lexical_index.search(query, limit=limit, fields=fields, filter=filter, exact=exact)
+    
+    async def _search_with_vector(self, query: str, query_vector: List[float], collection_name: str, limit: int,
+                                  fields: List[str], hybrid: bool = False,
+                                  filter: Optional[Dict[str, Any]] = None,
+                                  threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """向量搜索；hybrid 時向量與詞彙索引各取 limit × candidate_multiplier 個候選，以 RRF 融合（rrf_score），
+        score 保留向量相似度；有 threshold 時只回傳通過門檻的向量候選，依融合分數排序"""
+        if not hybrid:
+            return await self._search_by_vector(query_vector, collection_name, limit, fields, filter, threshold)
+        
+        lexical_settings = self.config['astra_db'].get('settings', {}).get('lexical_index', {})
+        depth = limit * int(lexical_settings.get('candidate_multiplier', 4))
+        # 以 _id 對齊兩邊的結果，呼叫端沒有要求 _id 時融合後再移除
+        search_fields = fields if "_id" in fields else [*fields, "_id"]
+        vector_hits = await self._search_by_vector(query_vector, collection_name, depth, search_fields, filter,
+                                                   threshold)
+        lexical_hits = self._lexical_search(query, collection_name, depth, search_fields, filter)
+        for hit in lexical_hits:
+            hit['bm25_score'] = hit.pop('score')
+        fused = reciprocal_rank_fusion([vector_hits, lexical_hits], limit if threshold is None else depth,
+                                       k=int(lexical_settings.get('rrf_k', 60)))
+        if threshold is not None:
+            # 只由詞彙索引找到的文檔沒有相似度，無法確認是否達到門檻
+            fused = [hit for hit in fused if 'score' in hit][:limit]
+        if search_fields is not fields:
+            for hit in fused:
+                hit.pop("_id", None)
+        return fused
+    
+    async def _search_by_vector(self, query_vector: List[float], collection_name: str, limit: int,
+                                fields: List[str], filter: Optional[Dict[str, Any]] = None,
+                                threshold: Optional[float] = None) -> List[Dict[str, Any]]:
+        """以查詢向量搜索：有本地索引時在行程內完成（先以 filter 篩選再計分），否則把 filter 下推到 vector_find；
+        有 threshold 時只回傳分數不低於門檻的結果"""
+        local_index = self.local_indexes.get(collection_name)
+        if local_index is not None:
+            with self._time("local_search", **self._stage_labels(collection_name)):
+                results = local_index.search(query_vector, limit=limit, fields=fields, filter=filter)
+            if threshold is None:
+                return results
+            return [result for result in results if result['score'] >= threshold]
+        
+        query_vector = wire_vector(query_vector, self._vector_encoding())
+        if threshold is None:
+            return await self._vector_find(collection_name, query_vector, limit, fields, filter)
+        return await self._adaptive_vector_find(collection_name, query_vector, limit, fields, filter, threshold)
+    
+    async def _vector_find(self, collection_name: str, query_vector: Any, limit: int, fields: List[str],
+                           filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """一次 vector_find；Data API 回傳的 $similarity 統一改名為 score"""
+        collection = self.collections[collection_name]
+        with self._time("astra_vector_find", **self._stage_labels(collection_name)):
+            hits = await collection.vector_find(query_vector, limit=limit, filter=filter, fields=[*fields, "score"])
+        for hit in hits:
+            if 'score' not in hit and '$similarity' in hit:
+                hit['score'] = hit.pop('$similarity')
+        return hits
+    
+    async def _adaptive_vector_find(self, collection_name: str, query_vector: Any, limit: int, fields: List[str],
+                                    filter: Optional[Dict[str, Any]], threshold: float) -> List[Dict[str, Any]]:
+        """分數門檻搜索：先取 initial_k 個結果（預設為 limit，只需一次請求），全部達到門檻且可能還有更多時，
+        把已取得的總數放大 growth_factor 倍繼續取；每次放大都多一次 vector_find 往返。
+        
+        vector_find 沒有 offset，後續請求以 {"_id": {"$nin": 已取得的 _id}} 排除已傳回的文檔，只傳輸新的結果；
+        結果依分數遞減，出現低於門檻的分數、回傳數少於要求（已取盡）或已達 limit 時，後面不會再有符合門檻的結果
+        """
+        adaptive_settings = self.config['astra_db'].get('settings', {}).get('adaptive_search', {})
+        initial_k = adaptive_settings.get('initial_k')
+        page = limit if initial_k is None else max(1, min(limit, int(initial_k)))
+        growth_factor = max(2, int(adaptive_settings.get('growth_factor', 2)))
+        # 以 _id 排除已取得的文檔，呼叫端沒有要求 _id 時回傳前移除
+        search_fields = fields if "_id" in fields else [*fields, "_id"]
+        results: List[Dict[str, Any]] = []
+        page_filter = filter
+        while True:
+            hits = await self._vector_find(collection_name, query_vector, page, search_fields, page_filter)
+            passing = [hit for hit in hits if hit.get('score', 0.0) >= threshold]
+            results.extend(passing)
+            if len(passing) < len(hits) or len(hits) < page or len(results) >= limit:
+                break
+            page = min(limit, len(results) * growth_factor) - len(results)
+            excluded = {"_id": {"$nin": [hit['_id'] for hit in results]}}
+            page_filter = {"$and": [filter, excluded]} if filter else excluded
+        if search_fields is not fields:
+            for hit in results:
+                hit.pop("_id", None)
+        return results
+    
+    def create_local_index(self, collection_name: str) -> "LocalVectorIndex":
+        """為集合建立空的本地索引，之後的搜索與插入都會使用它（離線模式）；
+        存儲精度與精確重新計分倍數取自 settings.local_index，集合配置中的同名欄位優先"""
+        from astra_local_index import LocalVectorIndex
+        
+        collection_config = self.config['astra_db']['collections'][collection_name]
+        index_settings = self.config['astra_db'].get('settings', {}).get('local_index', {})
+        local_index = LocalVectorIndex(
+            collection_config['dimension'],
+            metric=collection_config['vector_metric'],
+            precision=collection_config.get('precision', index_settings.get('precision', 'float32')),
+            rescore=int(collection_config.get('rescore', index_settings.get('rescore', 0)))
+        )
+        self.local_indexes[collection_name] = local_index
+        if self.query_cache is not None:
+            self.query_cache.invalidate(collection_name)
+        return local_index
+    
+    def get_lexical_index(self, collection_name: str) -> Optional[BM25Index]:
+        """集合的 BM25 詞彙索引，第一次呼叫時依 settings.lexical_index 建立（明確啟用，之後的插入會同步更新）；
+        停用時回傳 None。新建立的索引只含之後插入的文檔，需要涵蓋整個集合時改用 load_lexical_index"""
+        lexical_index = self.lexical_indexes.get(collection_name)
+        if lexical_index is None:
+            lexical_index = BM25Index.from_settings(self.config['astra_db'].get('settings', {}))
+            if lexical_index is not None:
+                self.lexical_indexes[collection_name] = lexical_index
+        return lexical_index
+    
+    async def load_lexical_index(self, collection_name: str, batch_size: int = 1000) -> Optional[BM25Index]:
+        """從遠端集合讀取全部文檔內容（不含向量）重建詞彙索引，完成後清除該集合的查詢快取；停用時回傳 None"""
+        try:
+            if collection_name not in self.collections:
+                print(f"❌ 集合 '{collection_name}' 不存在")
+                return None
+            
+            self.lexical_indexes.pop(collection_name, None)
+            self.complete_lexical_indexes.discard(collection_name)
+            lexical_index = self.get_lexical_index(collection_name)
+            if lexical_index is None:
+                return None
+            
+            batch = []
+            async for document in self.collections[collection_name].find(
+                {}, projection={"_id": True, "text": True, "metadata": True}
+            ):
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    lexical_index.add(batch)
+                    batch = []
+            lexical_index.add(batch)
+            self.complete_lexical_indexes.add(collection_name)
+            # 索引載入前的混合搜索退回純向量結果，載入後需要重新查詢
+            if self.query_cache is not None:
+                self.query_cache.invalidate(collection_name)
+            
+            print(f"✅ 詞彙索引已載入: 集合 '{collection_name}', {len(lexical_index)} 個文檔")
+            return lexical_index
         except Exception as e:
-            print(f"❌ 插入文檔失敗: {e}")
-            return False
+            self.lexical_indexes.pop(collection_name, None)
+            self.complete_lexical_indexes.discard(collection_name)
+            print(f"❌ 載入詞彙索引失敗: {e}")
+            return None
     
-    async def search_similar(self, query: str, collection_name: str = "documents", limit: int = 5) -> List[Dict[str, Any]]:
-        """搜索相似文檔"""
+    async def load_local_index(self, collection_name: str, batch_size: int = 1000) -> Optional["LocalVectorIndex"]:
+        """從遠端集合讀取全部向量建立本地索引，同時重建詞彙索引"""
         try:
             if collection_name not in self.collections:
                 print(f"❌ 集合 '{collection_name}' 不存在")
-                return []
+                return None
             
             collection = self.collections[collection_name]
+            local_index = self.create_local_index(collection_name)
+            self.lexical_indexes.pop(collection_name, None)
+            self.complete_lexical_indexes.discard(collection_name)
+            lexical_index = self.get_lexical_index(collection_name)
             
-            # 生成查詢向量
-            collection_config = self.config['astra_db']['collections'][collection_name]
-            if collection_config['service'] == 'openai':
-                query_vector = self.get_embedding_openai(query)
-            else:
-                query_vector = self.get_embedding_sentence_transformers(query)
-            
-            # 執行向量搜索
-            results = await collection.vector_find(
-                query_vector,
-                limit=limit,
-                fields=["text", "metadata", "score"]
-            )
+            batch = []
+            async for document in collection.find(
+                {}, projection={"_id": True, "text": True, "metadata": True, "$vector": True}
+            ):
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    local_index.add(batch)
+                    if lexical_index is not None:
+                        lexical_index.add(batch)
+                    batch = []
+            local_index.add(batch)
+            if lexical_index is not None:
+                lexical_index.add(batch)
+                self.complete_lexical_indexes.add(collection_name)
+            # 載入期間的查詢只看到部分索引（以及尚未完整的詞彙索引），完成後清除這段時間寫入的快取
+            if self.query_cache is not None:
+                self.query_cache.invalidate(collection_name)
             
-            print(f"🔍 找到 {len(results)} 個相似文檔")
-            return results
+            print(f"✅ 本地索引已載入: 集合 '{collection_name}', {len(local_index)} 個向量")
+            return local_index
+        except Exception as e:
+            self.local_indexes.pop(collection_name, None)
+            self.lexical_indexes.pop(collection_name, None)
+            self.complete_lexical_indexes.discard(collection_name)
+            print(f"❌ 載入本地索引失敗: {e}")
+            return None
+    
+    def build_ann_index(self, collection_name: str, nlist: int = 1024, m: int = 64, nprobe: int = 16,
+                        rerank: int = 0, path: Optional[str] = None) -> Optional["IVFPQIndex"]:
+        """以集合的本地精確索引訓練 IVF-PQ 近似索引並取代之，可選擇保存到磁碟（rerank > 0 時保留原始向量）"""
+        from astra_local_index import LocalVectorIndex
+        from astra_ann_index import IVFPQIndex
+        
+        local_index = self.local_indexes.get(collection_name)
+        if not isinstance(local_index, LocalVectorIndex) or len(local_index) == 0:
+            print(f"❌ 集合 '{collection_name}' 沒有可用的本地精確索引，請先呼叫 load_local_index()")
+            return None
+        
+        collection_config = self.config['astra_db']['collections'][collection_name]
+        ann_index = IVFPQIndex(
+            collection_config['dimension'],
+            metric=collection_config['vector_metric'],
+            nlist=nlist,
+            m=m,
+            nprobe=nprobe,
+            rerank=rerank,
+            keep_vectors=rerank > 0
+        )
+        ann_index.build(local_index.vectors, local_index.payloads)
+        self.local_indexes[collection_name] = ann_index
+        if self.query_cache is not None:
+            self.query_cache.invalidate(collection_name)
+        if path:
+            ann_index.save(path)
+        print(f"✅ ANN 索引已建立: 集合 '{collection_name}', {len(ann_index)} 個向量, "
+              f"{ann_index.memory_bytes(include_vectors=False) / len(ann_index):.0f} bytes/向量")
+        return ann_index
+    
+    def load_ann_index(self, collection_name: str, path: str) -> Optional["IVFPQIndex"]:
+        """從磁碟載入先前保存的 IVF-PQ 索引"""
+        try:
+            from astra_ann_index import IVFPQIndex
             
+            ann_index = IVFPQIndex.load(path)
+            self.local_indexes[collection_name] = ann_index
+            if self.query_cache is not None:
+                self.query_cache.invalidate(collection_name)
+            print(f"✅ ANN 索引已載入: 集合 '{collection_name}', {len(ann_index)} 個向量")
+            return ann_index
         except Exception as e:
-            print(f"❌ 搜索失敗: {e}")
-            return []
+            print(f"❌ 載入 ANN 索引失敗: {e}")
+            return None
     
     async def get_collection_info(self, collection_name: str) -> Dict[str, Any]:
         """獲取集合信息"""
@@ -286,6 +1112,41 @@ class LangflowAstraIntegration:
             }
         }
         return flow_config
+    
+    async def retrieve(self, query: str, flow_config: Optional[Dict[str, Any]] = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """執行流程中的向量搜索節點：依節點的 collection_name、limit 與 threshold 檢索，結果帶 score 供上下文構建使用"""
+        flow_config = flow_config or await self.create_knowledge_base_flow()
+        node = self._node_data(flow_config, "AstraVectorSearch")
+        return await self.astra_manager.search_similar(
+            query, node['collection_name'], limit=int(node.get('limit', 5)), fields=fields,
+            threshold=node.get('threshold')
+        )
+    
+    async def build_context(self, query: str, flow_config: Optional[Dict[str, Any]] = None) -> "PackedContext":
+        """執行向量搜索與 ContextBuilder 節點：去除近似重複的片段，在 max_context_length 個 token 內放入分數最高的內容。
+        
+        結果附上 $vector，以向量相似度判斷近似重複：本地索引直接取用索引中的向量，遠端集合每個結果多傳輸一個向量
+        （二進位編碼 1536 維約 8 KB）。settings.context_builder.dedup_threshold 設為 null 時不要求向量，只略過文字相同的片段
+        """
+        from astra_context import ContextBuilder
+        
+        flow_config = flow_config or await self.create_knowledge_base_flow()
+        builder = ContextBuilder.from_settings(
+            self.astra_manager.config['astra_db'].get('settings', {}),
+            max_tokens=self._node_data(flow_config, "ContextBuilder").get('max_context_length'),
+            model=self._node_data(flow_config, "OpenAIChat").get('model')
+        )
+        fields = None if builder.dedup_threshold is None else [*DEFAULT_SEARCH_FIELDS, "$vector"]
+        results = await self.retrieve(query, flow_config, fields=fields)
+        return builder.build(results)
+    
+    @staticmethod
+    def _node_data(flow_config: Dict[str, Any], node_type: str) -> Dict[str, Any]:
+        for node in flow_config['data']['nodes']:
+            if node['type'] == node_type:
+                return node['data']
+        return {}
 
 async def main():
     """主程式"""
@@ -355,14 +1216,39 @@ async def main():
         print(f"   元數據: {result.get('metadata', {})}")
         print()
     
+    # 只搜索特定分類：條件下推到 Data API，不必多取結果再於客戶端過濾
+    results = await astra_manager.search_similar(query, "knowledge_base", 3, filter={"metadata.category": "ML"})
+    print(f"分類 ML 的結果: {[result.get('text', 'N/A') for result in results]}")
+    
     # 創建 Langflow 集成
     integration = LangflowAstraIntegration(astra_manager)
     flow_config = await integration.create_knowledge_base_flow()
     
+    # 流程的向量搜索節點：最多 5 個結果，分數低於 0.7 的不進入上下文
+    results = await integration.retrieve(query, flow_config)
+    print(f"流程檢索結果: {[(result.get('text', 'N/A'), round(result['score'], 3)) for result in results]}")
+    
+    # ContextBuilder 節點：去除近似重複片段，以 token 預算組成送給 LLM 的上下文
+    context = await integration.build_context(query, flow_config)
+    print(f"上下文: {context.tokens}/{context.budget} tokens{'' if context.exact else '（估算）'}, "
+          f"{len(context.sources)} 個片段, 略過重複 {context.duplicates} 個, 構建 {context.seconds * 1e6:.0f} µs")
+    
     # 保存流程配置
     with open("examples/astra-knowledge-flow.json", "w", encoding="utf-8") as f:
         json.dump(flow_config, f, ensure_ascii=False, indent=2)
     
+    if astra_manager.embedding_cache is not None:
+        stats = astra_manager.embedding_cache.stats()
+        print(f"💾 嵌入快取: 命中率 {stats['hit_rate']:.0%} "
+              f"(記憶體 {stats['memory_hits']}, 磁碟 {stats['disk_hits']}, 未命中 {stats['misses']})")
+    
+    if astra_manager.metrics is not None:
+        print("⏱️  各階段延遲:")
+        for series in astra_manager.metrics.summary():
+            labels = ", ".join(f"{key}={value}" for key, value in series['labels'].items())
+            print(f"   - {series['stage']:<20} [{labels}] {series['count']} 次, "
+                  f"p50 {series['p50_ms']:.1f} ms, p95 {series['p95_ms']:.1f} ms")
+    
     print("✅ Astra DB 集成範例完成！")
     print("📁 流程配置已保存到: examples/astra-knowledge-flow.json")
 
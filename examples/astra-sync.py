@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Astra DB 目錄同步工具
+只處理上次同步後新增、修改或刪除的文字檔：變更的片段重新嵌入並 upsert，過時的片段以 delete_many 刪除，
+適合每晚排程更新知識庫
+
+用法:
+    python examples/astra-sync.py docs/ --collection knowledge_base
+    python examples/astra-sync.py docs/ --collection knowledge_base --dry-run
+"""
+
+import argparse
+import asyncio
+import os
+
+from astra_chunking import CHUNK_STRATEGIES, TextChunker
+from astra_ingest import TEXT_FILE_SUFFIXES
+from astra_loader import load_astra_integration
+from astra_sync import DirectorySync
+
+
+async def run_sync(args: argparse.Namespace) -> bool:
+    """連接 Astra DB 並同步目錄"""
+    module = load_astra_integration()
+    astra_manager = module.AstraDBManager(args.config)
+    if not astra_manager.config:
+        print("❌ 配置文件載入失敗")
+        return False
+    if not os.path.isdir(args.source):
+        print(f"❌ 找不到目錄: {args.source}")
+        return False
+
+    # 命令列的分塊參數覆寫 settings.chunking；分塊方式改變時所有檔案的片段 _id 都會改變
+    astra_manager.chunker = TextChunker.from_settings(
+        astra_manager.config['astra_db'].get('settings', {}),
+        strategy=args.chunk_strategy, max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens
+    )
+    sync = DirectorySync(astra_manager, args.source, args.collection, suffixes=args.suffix,
+                         batch_size=args.batch_size)
+    if args.dry_run:
+        plan = sync.plan()
+        print(f"🔎 {args.source} → 集合 '{args.collection}'（僅預覽）")
+        print(f"   - 新增 {len(plan.added)}, 修改 {len(plan.modified)}, 刪除 {len(plan.deleted)}, "
+              f"未變更 {plan.unchanged + len(plan.touched)} 個檔案")
+        for label, paths in (("+", plan.added), ("~", plan.modified), ("-", plan.deleted)):
+            for path in paths:
+                print(f"     {label} {path}")
+        return True
+
+    token = os.getenv("ASTRA_DB_TOKEN") or input("請輸入您的 Astra DB API Token: ").strip()
+    if not token or not astra_manager.connect(token):
+        return False
+
+    astra_manager.setup_embedding_models(os.getenv("OPENAI_API_KEY"))
+    if not astra_manager.attach_collections():
+        return False
+
+    print(f"🔄 同步 {args.source} → 集合 '{args.collection}'")
+    report = await sync.run()
+    plan = report.plan
+    print(f"   - 檔案: 新增 {len(plan.added)}, 修改 {len(plan.modified)}, 刪除 {len(plan.deleted)}, "
+          f"未變更 {plan.unchanged + len(plan.touched)}")
+    print(f"   - 片段: 寫入 {report.upserted_chunks}, 未變更略過 {report.skipped_chunks}, 刪除 {report.deleted_chunks}")
+    if report.ok:
+        print(f"✅ 同步完成，耗時 {report.seconds:.1f} 秒")
+    else:
+        print(f"❌ {len(report.failed_files)} 個檔案同步失敗，下次同步時會重試:")
+        for path in report.failed_files:
+            print(f"   - {path}")
+    return report.ok
+
+
+def main():
+    """主程式"""
+    parser = argparse.ArgumentParser(description="Astra DB 目錄增量同步")
+    parser.add_argument("source", help="文字檔目錄")
+    parser.add_argument("--config", default="config/astra-config.json", help="Astra DB 配置文件")
+    parser.add_argument("--collection", default="documents", help="目標集合")
+    parser.add_argument("--suffix", nargs="+", default=sorted(TEXT_FILE_SUFFIXES), help="要同步的副檔名")
+    parser.add_argument("--batch-size", type=int, default=None, help="每批片段數（預設 settings.batch_size）")
+    parser.add_argument("--chunk-strategy", choices=CHUNK_STRATEGIES, help="分塊策略（預設 settings.chunking.strategy）")
+    parser.add_argument("--max-tokens", type=int, help="片段最大 token 數（預設 settings.chunking.max_tokens）")
+    parser.add_argument("--overlap-tokens", type=int, help="片段重疊 token 數（預設 settings.chunking.overlap_tokens）")
+    parser.add_argument("--dry-run", action="store_true", help="只列出差異，不連接 Astra DB")
+    ok = asyncio.run(run_sync(parser.parse_args()))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
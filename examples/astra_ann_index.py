@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似最近鄰 (ANN) 向量索引
+IVF-PQ：以 k-means 粗分群 (nlist 個倒排列表)，殘差以乘積量化 (m 個子空間，每個 256 個碼字) 壓成 m 位元組，
+查詢時只掃描最近的 nprobe 個列表並以查表 (ADC) 計分；nprobe 越大召回率越高、延遲越長。
+可選擇保留原始向量（保存後以 mmap 載入）對前 limit * rerank 個候選做精確重新計分
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from astra_filters import FilterBitmap
+from astra_local_index import SUPPORTED_METRICS, LocalVectorIndex, similarity_to_score
+from astra_vector_codec import vector_matrix
+
+ASSIGN_CHUNK_ROWS = 8192
+
+
+def nearest_centroid(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """以 L2 距離找每一列最近的中心點（分塊計算以限制暫存矩陣大小）"""
+    half_norms = 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), ASSIGN_CHUNK_ROWS):
+        block = data[start:start + ASSIGN_CHUNK_ROWS]
+        # argmin ||x - c||^2 == argmax (x·c - ||c||^2 / 2)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T - half_norms, axis=1)
+    return assignments
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd k-means，空群以隨機樣本重新播種"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        assignments = nearest_centroid(data, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        order = np.argsort(assignments, kind="stable")
+        nonempty = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+
+    return centroids
+
+
+class IVFPQIndex:
+    """IVF-PQ 近似向量索引，介面與 LocalVectorIndex 相同，可直接放入 AstraDBManager.local_indexes"""
+
+    def __init__(self, dimension: int, metric: str = "cosine", nlist: int = 256, m: int = 16,
+                 nprobe: int = 8, rerank: int = 0, keep_vectors: bool = False,
+                 train_iterations: int = 20, seed: int = 0):
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"不支援的向量度量: {metric}")
+        if dimension % m:
+            raise ValueError(f"維度 {dimension} 必須能被子空間數 m={m} 整除")
+
+        self.dimension = dimension
+        self.metric = metric
+        self.nlist = nlist
+        self.m = m
+        self.dsub = dimension // m
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.keep_vectors = keep_vectors
+        self.train_iterations = train_iterations
+        self.seed = seed
+
+        self.coarse_centroids: Optional[np.ndarray] = None  # (nlist, dimension)
+        self.codebooks: Optional[np.ndarray] = None  # (m, ksub, dsub)
+
+        self._list_codes: List[List[np.ndarray]] = []
+        self._list_rows: List[List[np.ndarray]] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._id_to_row: Dict[Any, int] = {}
+        self._filter_bitmap = FilterBitmap()
+        self._vectors: Optional[np.ndarray] = np.empty((0, dimension), dtype=np.float32) if keep_vectors else None
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    @property
+    def is_trained(self) -> bool:
+        return self.coarse_centroids is not None
+
+    def train(self, vectors: np.ndarray, max_training_rows: int = 100_000):
+        """以樣本訓練粗分群中心點與 PQ 碼本"""
+        vectors = self._prepare(vectors)
+        if len(vectors) > max_training_rows:
+            rng = np.random.default_rng(self.seed)
+            vectors = vectors[rng.choice(len(vectors), max_training_rows, replace=False)]
+
+        self.coarse_centroids = kmeans(vectors, self.nlist, self.train_iterations, self.seed)
+        self.nlist = len(self.coarse_centroids)
+        residuals = vectors - self.coarse_centroids[nearest_centroid(vectors, self.coarse_centroids)]
+        self.codebooks = np.stack([
+            kmeans(residuals[:, j * self.dsub:(j + 1) * self.dsub], 256, self.train_iterations, self.seed + j)
+            for j in range(self.m)
+        ])
+        self._list_codes = [[] for _ in range(self.nlist)]
+        self._list_rows = [[] for _ in range(self.nlist)]
+
+    def build(self, vectors: np.ndarray, payloads: Sequence[Dict[str, Any]]):
+        """訓練並加入全部向量"""
+        self.train(vectors)
+        self.add_vectors(vectors, payloads)
+
+    def add(self, documents: Iterable[Dict[str, Any]]):
+        """加入帶 $vector 的文檔，相同 _id 的舊版本會被標記刪除"""
+        documents = [doc for doc in documents if '$vector' in doc]
+        if not documents:
+            return
+        vectors = vector_matrix([doc['$vector'] for doc in documents])
+        payloads = [{key: value for key, value in doc.items() if key != '$vector'} for doc in documents]
+        self.add_vectors(vectors, payloads)
+
+    def add_vectors(self, vectors: np.ndarray, payloads: Sequence[Dict[str, Any]]):
+        """編碼並加入一批向量"""
+        if not self.is_trained:
+            raise ValueError("索引尚未訓練，請先呼叫 train() 或 build()")
+        vectors = self._prepare(vectors)
+        if len(vectors) != len(payloads):
+            raise ValueError("向量數量與文檔數量不一致")
+        if not len(vectors):
+            return
+
+        lists = nearest_centroid(vectors, self.coarse_centroids)
+        codes = self._encode(vectors - self.coarse_centroids[lists])
+
+        start = len(self._payloads)
+        self._filter_bitmap.reset()
+        rows = np.arange(start, start + len(vectors), dtype=np.int64)
+        self._alive = np.concatenate([self._alive, np.ones(len(vectors), dtype=bool)])
+        if self._vectors is not None:
+            self._vectors = np.concatenate([self._vectors, vectors])
+        for offset, payload in enumerate(payloads):
+            payload = dict(payload)
+            doc_id = payload.get('_id')
+            if doc_id is not None:
+                previous = self._id_to_row.get(doc_id)
+                if previous is not None:
+                    self._alive[previous] = False
+                self._id_to_row[doc_id] = start + offset
+            self._payloads.append(payload)
+
+        order = np.argsort(lists, kind="stable")
+        unique_lists, first = np.unique(lists[order], return_index=True)
+        for list_id, group in zip(unique_lists, np.split(order, first[1:])):
+            self._list_codes[list_id].append(codes[group])
+            self._list_rows[list_id].append(rows[group])
+
+    def remove(self, doc_ids: Iterable[Any]) -> int:
+        """將指定 _id 的文檔標記刪除（與覆寫相同，倒排列表中的碼留到重建索引時才清除），回傳刪除數量"""
+        removed = 0
+        for doc_id in doc_ids:
+            row = self._id_to_row.pop(doc_id, None)
+            if row is not None:
+                self._alive[row] = False
+                removed += 1
+        return removed
+
+    def search(self, query_vector: Sequence[float], limit: int = 5,
+               fields: Optional[List[str]] = None,
+               filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """掃描最近的 nprobe 個倒排列表，回傳近似 top-k，score 與 Astra DB 的 $similarity 同尺度；
+        filter 先與刪除標記合併成遮罩，不符合的碼不做 ADC 計分（條件很窄時被掃描的列表中可能不足 limit 個）"""
+        if not self.is_trained or limit <= 0:
+            return []
+        keep = self._alive
+        if filter:
+            keep = keep & self._filter_bitmap.mask(self._payloads, filter)
+            if not keep.any():
+                return []
+
+        query = self._prepare(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        nprobe = min(self.nprobe, self.nlist)
+        coarse_scores = self.coarse_centroids @ query
+        half_norms = 0.5 * np.einsum('ij,ij->i', self.coarse_centroids, self.coarse_centroids)
+        probe = np.argpartition(-(coarse_scores - half_norms), nprobe - 1)[:nprobe]
+
+        codes, rows, bases = [], [], []
+        for list_id in probe:
+            list_codes, list_rows = self._packed(list_id)
+            if len(list_rows):
+                codes.append(list_codes)
+                rows.append(list_rows)
+                bases.append(np.full(len(list_rows), coarse_scores[list_id], dtype=np.float32))
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        selected = keep[rows]
+        codes, rows, bases = np.concatenate(codes)[selected], rows[selected], np.concatenate(bases)[selected]
+
+        # ADC: <q, x> ≈ <q, c_list> + Σ_j <q_j, codebook_j[code_j]>
+        lookup = np.einsum('md,mkd->mk', query.reshape(self.m, self.dsub), self.codebooks)
+        similarities = bases + lookup[np.arange(self.m), codes].sum(axis=1)
+
+        if self.rerank > 0 and self._vectors is not None:
+            # 先以 PQ 分數取較多候選，再以原始向量精確重新計分
+            candidates, _ = LocalVectorIndex.top_k(similarities, limit * self.rerank)
+            rows = np.sort(rows[candidates])  # 依列號排序，讓 mmap 讀取較連續
+            similarities = self._vectors[rows] @ query
+        top, top_similarities = LocalVectorIndex.top_k(similarities, limit)
+
+        results = []
+        for row, score in zip(rows[top], similarity_to_score(top_similarities)):
+            payload = self._payloads[row]
+            if fields:
+                result = {field: payload[field] for field in fields if field in payload}
+            else:
+                result = dict(payload)
+            result['score'] = float(score)
+            results.append(result)
+        return results
+
+    def memory_bytes(self, include_vectors: bool = True) -> int:
+        """向量相關的記憶體用量（PQ 碼、列號、中心點與碼本，以及常駐記憶體的原始向量；不含文檔內容）"""
+        total = self._alive.nbytes
+        if include_vectors and self._vectors is not None and not isinstance(self._vectors, np.memmap):
+            total += self._vectors.nbytes
+        if self.is_trained:
+            total += self.coarse_centroids.nbytes + self.codebooks.nbytes
+        for list_codes, list_rows in zip(self._list_codes, self._list_rows):
+            total += sum(block.nbytes for block in list_codes) + sum(block.nbytes for block in list_rows)
+        return total
+
+    def save(self, path: str):
+        """將索引保存到目錄（index.npz + payloads.json，保留原始向量時另存 vectors.npy）"""
+        if not self.is_trained:
+            raise ValueError("索引尚未訓練")
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        packed = [self._packed(list_id) for list_id in range(self.nlist)]
+        list_sizes = np.array([len(rows) for _, rows in packed], dtype=np.int64)
+        np.savez(
+            directory / "index.npz",
+            params=np.array([self.dimension, self.nlist, self.m, self.nprobe, self.rerank,
+                             int(self._vectors is not None), self.train_iterations, self.seed], dtype=np.int64),
+            coarse_centroids=self.coarse_centroids,
+            codebooks=self.codebooks,
+            codes=np.concatenate([codes for codes, _ in packed]) if list_sizes.sum() else
+            np.empty((0, self.m), dtype=np.uint8),
+            rows=np.concatenate([rows for _, rows in packed]) if list_sizes.sum() else
+            np.empty(0, dtype=np.int64),
+            list_sizes=list_sizes,
+            alive=self._alive
+        )
+        if self._vectors is not None:
+            np.save(directory / "vectors.npy", np.asarray(self._vectors))
+        with open(directory / "payloads.json", 'w', encoding='utf-8') as f:
+            json.dump({"metric": self.metric, "payloads": self._payloads}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFPQIndex":
+        """從 save() 保存的目錄載入索引，原始向量以 mmap 方式載入"""
+        directory = Path(path)
+        with open(directory / "payloads.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        data = np.load(directory / "index.npz")
+
+        dimension, nlist, m, nprobe, rerank, keep_vectors, train_iterations, seed = (
+            int(value) for value in data["params"]
+        )
+        index = cls(dimension, meta["metric"], nlist, m, nprobe, rerank, bool(keep_vectors), train_iterations, seed)
+        if keep_vectors:
+            index._vectors = np.load(directory / "vectors.npy", mmap_mode='r')
+        index.coarse_centroids = data["coarse_centroids"]
+        index.codebooks = data["codebooks"]
+        index._alive = data["alive"]
+        index._payloads = meta["payloads"]
+
+        offsets = np.concatenate(([0], np.cumsum(data["list_sizes"])))
+        codes, rows = data["codes"], data["rows"]
+        index._list_codes = [[codes[offsets[i]:offsets[i + 1]]] for i in range(nlist)]
+        index._list_rows = [[rows[offsets[i]:offsets[i + 1]]] for i in range(nlist)]
+        for row, payload in enumerate(index._payloads):
+            if payload.get('_id') is not None and index._alive[row]:
+                index._id_to_row[payload['_id']] = row
+        return index
+
+    def _packed(self, list_id: int):
+        """合併倒排列表中累積的區塊，之後的查詢直接使用連續陣列"""
+        list_codes, list_rows = self._list_codes[list_id], self._list_rows[list_id]
+        if len(list_rows) > 1:
+            list_codes[:] = [np.concatenate(list_codes)]
+            list_rows[:] = [np.concatenate(list_rows)]
+        if not list_rows:
+            return np.empty((0, self.m), dtype=np.uint8), np.empty(0, dtype=np.int64)
+        return list_codes[0], list_rows[0]
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        """將殘差量化為每個子空間一個位元組的 PQ 碼"""
+        codes = np.empty((len(residuals), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = nearest_centroid(residuals[:, j * self.dsub:(j + 1) * self.dsub], self.codebooks[j])
+        return codes
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+        return vectors
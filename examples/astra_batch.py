@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式文檔批次
+以平行陣列保存 _id、文字與 metadata，向量以單一連續的 (n, dimension) float32 矩陣保存，
+取代每個文檔一個 dict、每個向量一個 list[float]（每維一個 Python float 物件，約 32 位元組，矩陣只需 4 位元組）。
+上傳時才逐區塊產生 insert_many 需要的 dict，本地索引直接接收矩陣切片，大量匯入時的峰值記憶體與 GC 負擔都只剩一小部分
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TYPE_CHECKING
+
+from astra_chunking import TextChunker, chunk_documents
+from astra_manifest import content_hash, document_id
+from astra_vector_codec import VECTOR_ENCODINGS, encode_matrix, vector_matrix
+
+if TYPE_CHECKING:
+    import numpy as np
+
+RESERVED_FIELDS = ("_id", "text", "metadata", "$vector")
+
+
+class DocumentBatch:
+    """一批文檔的列式表示：ids / texts / metadata / extras 為等長串列，vectors 為 (n, dimension) 矩陣或 None。
+
+    metadata 與 extras（其他欄位）為 None 表示該文檔沒有這些欄位，轉回 dict 時與原文檔相同
+    """
+
+    def __init__(self, texts: List[str], ids: Optional[List[Any]] = None,
+                 metadata: Optional[List[Optional[Dict[str, Any]]]] = None,
+                 vectors: Optional["np.ndarray"] = None,
+                 extras: Optional[List[Optional[Dict[str, Any]]]] = None):
+        count = len(texts)
+        self.texts = list(texts)
+        self.ids = list(ids) if ids is not None else [None] * count
+        self.metadata = list(metadata) if metadata is not None else [None] * count
+        self.extras = list(extras) if extras is not None else [None] * count
+        if not len(self.ids) == len(self.metadata) == len(self.extras) == count:
+            raise ValueError("ids / metadata / extras 的長度必須與 texts 相同")
+        self.vectors: Optional["np.ndarray"] = None
+        if vectors is not None:
+            self.set_vectors(vectors)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "DocumentBatch":
+        """由文檔 dict 建立批次；只有每個文檔都帶 $vector 時才保留向量，否則整批視為待嵌入"""
+        texts, ids, metadata, extras, vectors = [], [], [], [], []
+        for doc in documents:
+            texts.append(doc.get("text"))
+            ids.append(doc.get("_id"))
+            metadata.append(doc.get("metadata"))
+            extra = {key: value for key, value in doc.items() if key not in RESERVED_FIELDS}
+            extras.append(extra or None)
+            vectors.append(doc.get("$vector"))
+        has_vectors = bool(vectors) and all(vector is not None for vector in vectors)
+        return cls(texts, ids, metadata, vector_matrix(vectors) if has_vectors else None, extras)
+
+    def set_vectors(self, vectors: Any):
+        """設定整批向量（轉為 C 連續的 float32 矩陣）"""
+        import numpy as np
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(self):
+            raise ValueError(f"向量矩陣形狀 {vectors.shape} 與文檔數 {len(self)} 不一致")
+        self.vectors = vectors
+
+    def document(self, row: int) -> Dict[str, Any]:
+        """第 row 個文檔的內容（不含 $vector）"""
+        doc: Dict[str, Any] = {}
+        if self.ids[row] is not None:
+            doc["_id"] = self.ids[row]
+        if self.texts[row] is not None:
+            doc["text"] = self.texts[row]
+        if self.metadata[row] is not None:
+            doc["metadata"] = self.metadata[row]
+        if self.extras[row] is not None:
+            doc.update(self.extras[row])
+        return doc
+
+    def payloads(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """[start, stop) 範圍內文檔的內容，作為本地索引與詞彙索引的 payload"""
+        return [self.document(row) for row in range(*slice(start, stop).indices(len(self)))]
+
+    def iter_documents(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self.document(row)
+
+    def take(self, rows: Sequence[int]) -> "DocumentBatch":
+        """依列號取出子批次（向量以一次花式索引複製）"""
+        rows = list(rows)
+        if len(rows) == len(self) and rows == list(range(len(self))):
+            return self
+        return DocumentBatch(
+            [self.texts[row] for row in rows],
+            [self.ids[row] for row in rows],
+            [self.metadata[row] for row in rows],
+            self.vectors[rows] if self.vectors is not None else None,
+            [self.extras[row] for row in rows]
+        )
+
+    def chunk(self, chunker: TextChunker) -> "DocumentBatch":
+        """以 chunk_documents 分塊；已帶向量或沒有文檔需要切分時回傳原批次"""
+        if self.vectors is not None:
+            return self
+        chunks = DocumentBatch.from_documents(chunk_documents(self.iter_documents(), chunker))
+        return self if len(chunks) == len(self) else chunks
+
+    def ensure_ids(self, id_fields: Optional[Sequence[str]] = None) -> List[str]:
+        """計算每個文檔的內容雜湊，沒有 _id 的文檔補上 document_id（來源鍵或內容雜湊）；回傳雜湊串列"""
+        digests = []
+        for row in range(len(self)):
+            document = self.document(row)
+            digest = content_hash(document)
+            if self.ids[row] is None:
+                self.ids[row] = document_id(document, digest, id_fields)
+            digests.append(digest)
+        return digests
+
+    def wire(self, encoding: str = "binary") -> "WireDocuments":
+        """insert_many 使用的文檔檢視，切片時才產生 dict 並編碼該區塊的向量"""
+        return WireDocuments(self, encoding)
+
+
+class WireDocuments:
+    """DocumentBatch 的唯讀序列檢視：documents[offset:offset + size] 回傳帶 $vector 的 dict 串列"""
+
+    def __init__(self, batch: DocumentBatch, encoding: str = "binary"):
+        if encoding not in VECTOR_ENCODINGS:
+            raise ValueError(f"不支援的向量編碼: {encoding}")
+        self.batch = batch
+        self.encoding = encoding
+
+    def __len__(self) -> int:
+        return len(self.batch)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.batch))
+            if step != 1:
+                raise ValueError("只支援連續切片")
+            return self._documents(start, stop)
+        if index < 0:
+            index += len(self.batch)
+        if not 0 <= index < len(self.batch):
+            raise IndexError(index)
+        return self._documents(index, index + 1)[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self.batch)):
+            yield self[row]
+
+    def _documents(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        documents = self.batch.payloads(start, stop)
+        vectors = self.batch.vectors
+        if vectors is None or not documents:
+            return documents
+        if self.encoding == "binary":
+            encoded = encode_matrix(vectors[start:stop])
+        else:
+            encoded = vectors[start:stop].tolist()
+        for doc, vector in zip(documents, encoded):
+            doc["$vector"] = vector
+        return documents
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文字分塊
+依段落、句子或 token 視窗把長文檔切成不超過 max_tokens 的片段，片段之間保留 overlap_tokens 的重疊；
+句子邊界同時辨識中日韓全形標點（。！？；）與英文句點，token 以近似 BPE 的規則估算：
+中日韓文字每字算 CJK_TOKEN_WEIGHT（2）個，其他標點與符號各算 1 個，英數字每 4 個字元算 1 個。
+OpenAI cl100k 對繁體中文平均每字約 1.3 個 token，常用字多為 1 個、罕用字可能到 3 個，
+因此這只是偏保守的估算，不保證不超過模型的實際上限；需要精確計數時請以 tiktoken 驗證。
+以字串長度與 regex 計數算出，不逐 token 配對。片段以生成器逐文檔產生，記憶體用量與語料總量無關
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from astra_manifest import content_hash, DOCUMENT_ID_LENGTH
+
+CHUNK_STRATEGIES = ("sentence", "paragraph", "token")
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_OVERLAP_TOKENS = 64
+
+# 每個 match 為一個 token：英數字每 4 個字元一組，其他非空白字元（含中日韓字元與標點）各自一個
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]{1,4}|[^\sA-Za-z0-9]")
+ALNUM_RUN = re.compile(r"[A-Za-z0-9]+")
+# 中日韓文字（假名、漢字、諺文）；全形標點不在此列，cl100k 大多編為單一 token
+CJK_CHAR = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+# 每個中日韓字元估為 2 個 token（cl100k 的常用字為 1 個，罕用字為 2~3 個）
+CJK_TOKEN_WEIGHT = 2
+# 句末：全形 / 半形終止標點（英文句點後須接空白，避免切開 3.14 這類數字），連同其後的右引號、右括號與空白；或換行
+SENTENCE_END = re.compile(r"(?:[。！？!?；;…]+|\.(?=\s|$))[」』”’）)\]\"']*\s*|\n\s*")
+PARAGRAPH_END = re.compile(r"\n[ \t　]*\n\s*")
+
+Span = Tuple[int, int]
+
+
+def count_tokens(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    """估算 text[start:end] 的 token 數，結果與逐一配對 TOKEN_PATTERN 並以 token_weight 加權相同：
+    非空白字元數 - 英數字數 + 每段英數字的 ceil(長度 / 4) + 中日韓字元數 × (CJK_TOKEN_WEIGHT - 1)"""
+    if start or end is not None:
+        text = text[start:end]
+    runs = ALNUM_RUN.findall(text)
+    alnum = sum(map(len, runs))
+    whitespace = len(text) - len("".join(text.split()))
+    cjk = len(CJK_CHAR.findall(text))
+    return (len(text) - whitespace - alnum + sum((len(run) + 3) // 4 for run in runs)
+            + cjk * (CJK_TOKEN_WEIGHT - 1))
+
+
+def token_weight(token: str) -> int:
+    """TOKEN_PATTERN 單一配對估算的 token 數"""
+    return CJK_TOKEN_WEIGHT if CJK_CHAR.match(token) else 1
+
+
+def token_bounds(text: str, start: int = 0, end: Optional[int] = None) -> Tuple[List[Span], List[int]]:
+    """text[start:end] 中每個 TOKEN_PATTERN 配對的位置，以及配對權重的前綴和（長度多 1，從 0 開始）"""
+    end = len(text) if end is None else end
+    bounds = [match.span() for match in TOKEN_PATTERN.finditer(text, start, end)]
+    prefix = [0, *accumulate(token_weight(text[left:right]) for left, right in bounds)]
+    return bounds, prefix
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """保留 text 開頭估算不超過 max_tokens 個 token 的部分"""
+    bounds, prefix = token_bounds(text)
+    count = bisect_right(prefix, max_tokens) - 1
+    if count >= len(bounds):
+        return text
+    return text[:bounds[count][0]].rstrip()
+
+
+def split_spans(pattern: "re.Pattern", text: str, start: int = 0, end: Optional[int] = None) -> List[Span]:
+    """以邊界樣式切分 text[start:end]，回傳包含邊界字元的區段（去掉只有空白的區段）"""
+    end = len(text) if end is None else end
+    bounds = [start, *(match.end() for match in pattern.finditer(text, start, end)), end]
+    return [(left, right) for left, right in zip(bounds, bounds[1:])
+            if right > left and not text[left:right].isspace()]
+
+
+class TextChunker:
+    """依策略把文字切成帶重疊的片段：
+    - paragraph：以空行分段，段落過長時改以句子切分
+    - sentence：以句子為單位合併，直到接近 max_tokens
+    - token：固定大小的 token 視窗
+    任何單位超過 max_tokens 時都會再以 token 視窗切開
+    """
+
+    def __init__(self, strategy: str = "sentence", max_tokens: int = DEFAULT_MAX_TOKENS,
+                 overlap_tokens: int = DEFAULT_OVERLAP_TOKENS):
+        if strategy not in CHUNK_STRATEGIES:
+            raise ValueError(f"不支援的分塊策略: {strategy}")
+        if max_tokens <= 0 or not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("max_tokens 必須大於 0，overlap_tokens 必須介於 0 與 max_tokens 之間")
+        self.strategy = strategy
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], **overrides: Any) -> Optional["TextChunker"]:
+        """依 settings.chunking 建立分塊器，停用時回傳 None；overrides 中不是 None 的值（例如命令列參數）優先"""
+        chunk_settings = settings.get('chunking', {})
+        if not chunk_settings.get('enabled', True):
+            return None
+        options = {
+            "strategy": chunk_settings.get('strategy', 'sentence'),
+            "max_tokens": int(chunk_settings.get('max_tokens', DEFAULT_MAX_TOKENS)),
+            "overlap_tokens": int(chunk_settings.get('overlap_tokens', DEFAULT_OVERLAP_TOKENS))
+        }
+        options.update((key, value) for key, value in overrides.items() if value is not None)
+        return cls(**options)
+
+    def split(self, text: str) -> List[Span]:
+        """回傳片段在原文中的 (起點, 終點)；不超過 max_tokens 的文字回傳單一區段"""
+        if not text.strip():
+            return []
+        # 每個字元最多 CJK_TOKEN_WEIGHT 個 token，不超過上限時不必計數
+        if len(text) * CJK_TOKEN_WEIGHT <= self.max_tokens:
+            return [(0, len(text))]
+        if self.strategy == "token":
+            windows = self._token_windows(text, 0, len(text))
+            return windows if len(windows) > 1 else [(0, len(text))]
+
+        units: List[Tuple[int, int, int]] = []
+        if self.strategy == "paragraph":
+            for start, end in split_spans(PARAGRAPH_END, text):
+                tokens = count_tokens(text, start, end)
+                if tokens <= self.max_tokens:
+                    units.append((start, end, tokens))
+                else:
+                    units.extend(self._count(text, split_spans(SENTENCE_END, text, start, end)))
+        else:
+            units = self._count(text, split_spans(SENTENCE_END, text))
+        if sum(tokens for _, _, tokens in units) <= self.max_tokens:
+            return [(0, len(text))]
+        return self._pack(units)
+
+    def chunks(self, text: str) -> List[str]:
+        """回傳去除首尾空白後的片段文字"""
+        return [text[start:end].strip() for start, end in self.split(text)]
+
+    def _count(self, text: str, spans: List[Span]) -> List[Tuple[int, int, int]]:
+        """為每個單位計算 token 數，超過 max_tokens 的單位再切成 token 視窗"""
+        counted: List[Tuple[int, int, int]] = []
+        for start, end in spans:
+            tokens = count_tokens(text, start, end)
+            if tokens <= self.max_tokens:
+                counted.append((start, end, tokens))
+            else:
+                counted.extend((window_start, window_end, count_tokens(text, window_start, window_end))
+                               for window_start, window_end in self._token_windows(text, start, end))
+        return counted
+
+    def _pack(self, counted: List[Tuple[int, int, int]]) -> List[Span]:
+        """依序合併單位直到再加一個就會超過 max_tokens；下一個片段從結尾不超過 overlap_tokens 的單位開始"""
+        spans: List[Span] = []
+        first, total = 0, 0
+        for i, (_, _, tokens) in enumerate(counted):
+            if total + tokens > self.max_tokens and i > first:
+                spans.append((counted[first][0], counted[i - 1][1]))
+                # 往回取重疊的單位，但至少前進一個單位
+                overlap_start, overlap = i, 0
+                while overlap_start - 1 > first and overlap + counted[overlap_start - 1][2] <= self.overlap_tokens:
+                    overlap_start -= 1
+                    overlap += counted[overlap_start][2]
+                first, total = overlap_start, overlap
+                while first < i and total + tokens > self.max_tokens:
+                    total -= counted[first][2]
+                    first += 1
+            total += tokens
+        if counted:
+            spans.append((counted[first][0], counted[-1][1]))
+        return spans
+
+    def _token_windows(self, text: str, start: int, end: int) -> List[Span]:
+        """估算 token 數不超過 max_tokens 的視窗，相鄰視窗重疊不超過 overlap_tokens（至少前進一個配對）"""
+        bounds, prefix = token_bounds(text, start, end)
+        if not bounds:
+            return []
+        spans = []
+        first = 0
+        while True:
+            # 最後一個配對：前綴和不超過 prefix[first] + max_tokens（至少包含一個配對）
+            last = max(first, bisect_right(prefix, prefix[first] + self.max_tokens) - 2)
+            spans.append((bounds[first][0], bounds[last][1]))
+            if last == len(bounds) - 1:
+                break
+            first = max(first + 1, bisect_left(prefix, prefix[last + 1] - self.overlap_tokens))
+        return spans
+
+
+def chunk_documents(documents: Iterable[Dict[str, Any]], chunker: TextChunker) -> Iterator[Dict[str, Any]]:
+    """逐文檔分塊；不需切分（或已帶 $vector）的文檔原樣輸出，片段的 metadata 記錄父文檔與在原文中的位置"""
+    for doc in documents:
+        text = doc.get("text")
+        if not isinstance(text, str) or '$vector' in doc:
+            yield doc
+            continue
+        spans = chunker.split(text)
+        if len(spans) <= 1:
+            yield doc
+            continue
+
+        metadata = doc.get("metadata", {})
+        parent_id = doc.get("_id")
+        if parent_id is None:
+            parent_id = content_hash(doc)[:DOCUMENT_ID_LENGTH]
+        for chunk_index, (start, end) in enumerate(spans):
+            chunk = {key: value for key, value in doc.items() if key not in ("_id", "text", "metadata")}
+            chunk["text"] = text[start:end].strip()
+            chunk["metadata"] = {
+                **metadata,
+                "parent_id": parent_id,
+                "chunk_index": chunk_index,
+                "chunk_count": len(spans),
+                "char_start": start,
+                "char_end": end,
+                "chunk_strategy": chunker.strategy
+            }
+            yield chunk
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共用 Data API 客戶端
+同一行程內所有入口（連接測試、設置腳本、AstraDBManager）共用一個 DataAPIClient，
+資料庫與集合句柄依資料庫 ID 與集合名稱快取，底層 HTTP 連線池保持 keep-alive（可用時啟用 HTTP/2），
+重複操作不再重新付出 TCP 與 TLS 握手成本
+"""
+
+import importlib
+import importlib.util
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_SECONDS = 60.0
+
+_factories: Dict[str, "AstraClientFactory"] = {}
+_factories_lock = threading.Lock()
+_http_pool_configured = False
+_http2_enabled = False
+
+
+def http2_available() -> bool:
+    """httpx 需要 h2 套件才能使用 HTTP/2（uv pip install "httpx[http2]"）"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def configure_http_pool(max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                        keepalive_seconds: float = DEFAULT_KEEPALIVE_SECONDS,
+                        http2: Optional[bool] = None) -> bool:
+    """以保持連線的 httpx 客戶端取代 astrapy 的共用 HTTP 客戶端，每個行程只設定一次。
+
+    astrapy 1.x 的 APICommander 以類別屬性持有共用的 httpx 客戶端；版本不符或缺少 httpx 時保留預設並回傳 False
+    """
+    global _http_pool_configured, _http2_enabled
+    if _http_pool_configured:
+        return True
+
+    try:
+        httpx = importlib.import_module("httpx")
+        commander = importlib.import_module("astrapy.api_commander").APICommander
+    except (ImportError, AttributeError):
+        return False
+    if not (hasattr(commander, "client") and hasattr(commander, "async_client")):
+        return False
+
+    http2 = http2_available() if http2 is None else http2
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=keepalive_seconds
+    )
+    commander.client = httpx.Client(http2=http2, limits=limits)
+    commander.async_client = httpx.AsyncClient(http2=http2, limits=limits)
+    _http_pool_configured = True
+    _http2_enabled = http2
+    return True
+
+
+class AstraClientFactory:
+    """以單一 Token 建立的 DataAPIClient，並快取資料庫與集合句柄"""
+
+    def __init__(self, token: str):
+        self.token = token
+        self._client = None
+        self._databases: Dict[Tuple[str, bool], Any] = {}
+        self._collections: Dict[Tuple[str, str, bool], Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """第一次使用時才匯入 astrapy 並建立客戶端"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        astrapy = importlib.import_module("astrapy")
+                    except ImportError as e:
+                        raise ImportError(f"缺少必要的套件: {e}，請執行: uv pip install astrapy") from e
+                    configure_http_pool()
+                    self._client = astrapy.DataAPIClient(self.token)
+        return self._client
+
+    def get_database(self, database_id: str, asynchronous: bool = False, **kwargs):
+        """取得資料庫句柄，相同 ID 重複呼叫時回傳同一個物件；asynchronous=True 時為 AsyncDatabase"""
+        key = (database_id, asynchronous)
+        database = self._databases.get(key)
+        if database is None:
+            client = self.client
+            with self._lock:
+                database = self._databases.get(key)
+                if database is None:
+                    get_database = client.get_async_database if asynchronous else client.get_database
+                    database = self._databases[key] = get_database(database_id, **kwargs)
+        return database
+
+    def get_async_database(self, database_id: str, **kwargs):
+        """取得 AsyncDatabase 句柄（其集合為 AsyncCollection，所有請求都可 await）"""
+        return self.get_database(database_id, asynchronous=True, **kwargs)
+
+    def get_collection(self, database_id: str, collection_name: str, asynchronous: bool = False):
+        """取得集合句柄，依 (資料庫 ID, 集合名稱) 快取"""
+        key = (database_id, collection_name, asynchronous)
+        collection = self._collections.get(key)
+        if collection is None:
+            database = self.get_database(database_id, asynchronous=asynchronous)
+            with self._lock:
+                collection = self._collections.get(key)
+                if collection is None:
+                    collection = self._collections[key] = database.get_collection(collection_name)
+        return collection
+
+    def get_async_collection(self, database_id: str, collection_name: str):
+        """取得 AsyncCollection 句柄"""
+        return self.get_collection(database_id, collection_name, asynchronous=True)
+
+    def cache_collection(self, database_id: str, collection, asynchronous: bool = False):
+        """記住 create_collection 回傳的句柄，之後的 get_collection 直接重用"""
+        with self._lock:
+            self._collections[(database_id, collection.name, asynchronous)] = collection
+        return collection
+
+    def forget_collection(self, database_id: str, collection_name: str):
+        """集合被刪除後移除快取的同步與非同步句柄"""
+        with self._lock:
+            self._collections.pop((database_id, collection_name, False), None)
+            self._collections.pop((database_id, collection_name, True), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "databases": len(self._databases),
+            "collections": len(self._collections),
+            "http_pool": _http_pool_configured,
+            "http2": _http2_enabled
+        }
+
+
+def get_client_factory(token: str) -> AstraClientFactory:
+    """取得行程內共用的客戶端工廠，相同 Token 永遠回傳同一個實例"""
+    factory = _factories.get(token)
+    if factory is None:
+        with _factories_lock:
+            factory = _factories.get(token)
+            if factory is None:
+                factory = _factories[token] = AstraClientFactory(token)
+    return factory
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+集合設置
+以一次 list_collections 取得現有集合，只並行創建缺少的集合；已存在的集合比對向量維度與相似度度量是否與配置一致，
+重複執行不會重新創建或逐一探測集合。創建時若遇到其他行程剛建好的同名集合，再列出一次確認結構相符即視為成功，
+不依賴例外訊息的文字
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class CollectionSetup:
+    """ensure_collections 的結果，可直接當作布林值判斷是否全部可用"""
+
+    def __init__(self, error: Optional[str] = None):
+        self.error = error
+        self.created: List[str] = []
+        self.existing: List[str] = []
+        # 配置鍵 → 結構不符的說明
+        self.mismatched: Dict[str, List[str]] = {}
+        # 配置鍵 → 創建失敗的錯誤
+        self.failed: Dict[str, str] = {}
+        # 配置鍵 → 集合句柄（僅限可用的集合）
+        self.collections: Dict[str, Any] = {}
+        self.seconds = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.mismatched and not self.failed
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ok": self.ok,
+            "error": self.error,
+            "created": self.created,
+            "existing": self.existing,
+            "mismatched": self.mismatched,
+            "failed": self.failed,
+            "seconds": self.seconds
+        }
+
+
+def descriptor_name(descriptor: Any) -> str:
+    """list_collections 回傳的集合描述（astrapy 物件或 dict）的名稱"""
+    if isinstance(descriptor, dict):
+        return descriptor["name"]
+    return descriptor.name
+
+
+def vector_options(descriptor: Any) -> Optional[Dict[str, Any]]:
+    """集合描述中的向量選項 {"dimension", "metric"}；不是向量集合時回傳 None。
+
+    相容 astrapy 1.x（options.vector）、2.x（definition.vector）與 Data API 原始 JSON（options.vector）
+    """
+    options = descriptor.get("options") if isinstance(descriptor, dict) else (
+        getattr(descriptor, "definition", None) or getattr(descriptor, "options", None)
+    )
+    if options is None:
+        return None
+    vector = options.get("vector", options) if isinstance(options, dict) else getattr(options, "vector", None)
+    if vector is None:
+        return None
+    if isinstance(vector, dict):
+        dimension, metric = vector.get("dimension"), vector.get("metric")
+    else:
+        dimension, metric = getattr(vector, "dimension", None), getattr(vector, "metric", None)
+    if dimension is None and metric is None:
+        return None
+    return {"dimension": dimension, "metric": normalize_metric(metric)}
+
+
+def normalize_metric(metric: Any) -> Optional[str]:
+    """度量名稱轉為小寫字串（VectorMetric 列舉取其值）"""
+    if metric is None:
+        return None
+    return str(getattr(metric, "value", metric)).lower()
+
+
+def schema_mismatches(descriptor: Any, spec: Dict[str, Any]) -> List[str]:
+    """比對現有集合與配置（dimension / vector_metric），回傳不一致的說明；一致時為空串列"""
+    options = vector_options(descriptor)
+    if options is None:
+        return ["不是向量集合"]
+    problems = []
+    if options["dimension"] is not None and int(options["dimension"]) != int(spec["dimension"]):
+        problems.append(f"dimension 為 {options['dimension']}，配置為 {spec['dimension']}")
+    expected_metric = normalize_metric(spec.get("vector_metric", "cosine"))
+    if options["metric"] is not None and options["metric"] != expected_metric:
+        problems.append(f"metric 為 {options['metric']}，配置為 {expected_metric}")
+    return problems
+
+
+def default_create_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {"dimension": spec["dimension"], "metric": spec.get("vector_metric", "cosine")}
+
+
+async def ensure_collections(database, specs: Dict[str, Dict[str, Any]],
+                             get_collection: Optional[Callable[[str], Any]] = None,
+                             create_options: Callable[[Dict[str, Any]], Dict[str, Any]] = default_create_options,
+                             concurrency: int = 4) -> CollectionSetup:
+    """確保 specs（配置鍵 → {"name", "dimension", "vector_metric", ...}）中的集合都存在且結構相符。
+
+    get_collection 取得已存在集合的句柄（預設 database.get_collection），create_options 產生 create_collection 的參數
+    """
+    start = time.perf_counter()
+    setup = CollectionSetup()
+    get_collection = get_collection or database.get_collection
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    def attach(key: str, descriptor: Any):
+        problems = schema_mismatches(descriptor, specs[key])
+        if problems:
+            setup.mismatched[key] = problems
+        else:
+            setup.collections[key] = get_collection(specs[key]['name'])
+            setup.existing.append(key)
+
+    async def create(key: str):
+        async with semaphore:
+            setup.collections[key] = await database.create_collection(specs[key]['name'], **create_options(specs[key]))
+
+    try:
+        existing = {descriptor_name(descriptor): descriptor for descriptor in await database.list_collections()}
+        missing = []
+        for key, spec in specs.items():
+            if spec['name'] in existing:
+                attach(key, existing[spec['name']])
+            else:
+                missing.append(key)
+
+        results = await asyncio.gather(*(create(key) for key in missing), return_exceptions=True)
+        errors = {key: result for key, result in zip(missing, results) if isinstance(result, Exception)}
+        setup.created = [key for key in missing if key not in errors]
+
+        if errors:
+            # 可能是其他行程同時創建了同名集合：再列出一次，結構相符就當作已存在
+            existing = {descriptor_name(descriptor): descriptor for descriptor in await database.list_collections()}
+            for key, error in errors.items():
+                descriptor = existing.get(specs[key]['name'])
+                if descriptor is None:
+                    setup.failed[key] = f"{type(error).__name__}: {error}"
+                else:
+                    attach(key, descriptor)
+    except Exception as e:
+        setup.error = f"{type(e).__name__}: {e}"
+
+    setup.seconds = time.perf_counter() - start
+    return setup
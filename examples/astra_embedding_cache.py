@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+嵌入向量快取
+兩層快取：記憶體 LRU 在前、SQLite 磁碟存儲在後，鍵為 (模型, 維度, 正規化文字雜湊)；
+向量可選擇以 float16 或逐向量縮放的 int8 存儲，以少量精度換取 2~4 倍的容量；
+列式批次匯入時命中的向量直接解碼進 (n, dimension) 矩陣，不經過 list[float]
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_CACHE_PATH = ".cache/embeddings.sqlite3"
+CACHE_PRECISIONS = ("float32", "float16", "int8")
+
+
+def normalize_text(text: str) -> str:
+    """正規化文字（NFKC、去除首尾空白、合併連續空白），讓等價文字共用快取"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model: str, dimension: int, text: str, precision: str = "float32") -> str:
+    """產生快取鍵: 模型:維度:正規化文字的 SHA-256（非 float32 精度另加後綴，避免與既有項目混用）"""
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    key = f"{model}:{dimension}:{digest}"
+    return key if precision == "float32" else f"{key}:{precision}"
+
+
+def encode_vector(vector: Sequence[float], precision: str = "float32") -> bytes:
+    """將向量編碼為位元組：float32 / float16，或 int8 碼前置 float32 縮放係數"""
+    # NumPy 只在需要時匯入：尚未載入時傳入的向量不可能是 ndarray
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(vector, numpy.ndarray):
+        return encode_array(vector, precision)
+    if precision == "float32":
+        return array('f', vector).tobytes()
+    if precision == "float16":
+        return struct.pack(f"<{len(vector)}e", *vector)
+    if precision == "int8":
+        scale = max((abs(value) for value in vector), default=0.0) / 127.0 or 1.0
+        return struct.pack("<f", scale) + array('b', [round(value / scale) for value in vector]).tobytes()
+    raise ValueError(f"不支援的精度: {precision}")
+
+
+def decode_vector(blob: bytes, precision: str = "float32") -> List[float]:
+    """encode_vector 的反向操作"""
+    if precision == "float32":
+        return array('f', blob).tolist()
+    if precision == "float16":
+        return list(struct.unpack(f"<{len(blob) // 2}e", blob))
+    if precision == "int8":
+        scale = struct.unpack_from("<f", blob)[0]
+        return [code * scale for code in array('b', blob[4:])]
+    raise ValueError(f"不支援的精度: {precision}")
+
+
+def encode_array(vector: "np.ndarray", precision: str = "float32") -> bytes:
+    """encode_vector 的 NumPy 版本，位元組與 encode_vector 相同"""
+    import numpy as np
+    if precision == "float32":
+        return np.asarray(vector, dtype=np.float32).tobytes()
+    if precision == "float16":
+        return np.asarray(vector, dtype="<f2").tobytes()
+    if precision == "int8":
+        vector = np.asarray(vector, dtype=np.float32)
+        scale = float(np.abs(vector).max(initial=0.0)) / 127.0 or 1.0
+        return struct.pack("<f", scale) + np.round(vector / scale).astype(np.int8).tobytes()
+    raise ValueError(f"不支援的精度: {precision}")
+
+
+def decode_array(blob: bytes, precision: str = "float32") -> "np.ndarray":
+    """decode_vector 的 NumPy 版本：直接回傳 float32 向量，不建立逐維的 Python float"""
+    import numpy as np
+    if precision == "float32":
+        return np.frombuffer(blob, dtype=np.float32)
+    if precision == "float16":
+        return np.frombuffer(blob, dtype="<f2").astype(np.float32)
+    if precision == "int8":
+        scale = struct.unpack_from("<f", blob)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=4) * np.float32(scale)
+    raise ValueError(f"不支援的精度: {precision}")
+
+
+class EmbeddingCache:
+    """兩層嵌入向量快取，記憶體與磁碟皆依位元組大小淘汰最久未使用的項目。
+
+    precision 為 float16 / int8 時快取回傳的是近似向量；這些向量也會被寫入 Astra DB，
+    因此只建議在可接受少量召回率損失時啟用
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH,
+                 max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = 1024 * 1024 * 1024,
+                 precision: str = "float32"):
+        if precision not in CACHE_PRECISIONS:
+            raise ValueError(f"不支援的精度: {precision}")
+        self.path = path
+        self.precision = precision
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+        self._conn = None
+        self._disk_bytes = 0
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+            self._conn.commit()
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["EmbeddingCache"]:
+        """依 config/astra-config.json 的 settings.embedding_cache 建立快取，停用時回傳 None"""
+        cache_settings = settings.get('embedding_cache', {})
+        if not cache_settings.get('enabled', True):
+            return None
+        return cls(
+            path=cache_settings.get('path', DEFAULT_CACHE_PATH),
+            max_memory_bytes=int(cache_settings.get('max_memory_mb', 64) * 1024 * 1024),
+            max_disk_bytes=int(cache_settings.get('max_disk_mb', 1024) * 1024 * 1024),
+            precision=cache_settings.get('precision', 'float32')
+        )
+
+    def get_many(self, model: str, dimension: int, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """批量查詢快取，未命中的位置回傳 None"""
+        return self._lookup(model, dimension, texts, decode_vector)
+
+    def _lookup(self, model: str, dimension: int, texts: Sequence[str],
+                decode: Callable[[bytes, str], Any]) -> List[Any]:
+        """查詢記憶體層與磁碟層，命中的位元組以 decode 解碼（list 或 NumPy 向量）"""
+        keys = [cache_key(model, dimension, text, self.precision) for text in texts]
+        results: List[Any] = [None] * len(keys)
+        disk_lookups: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                blob = self._memory.get(key)
+                if blob is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = decode(blob, self.precision)
+                else:
+                    disk_lookups.setdefault(key, []).append(i)
+
+            if disk_lookups and self._conn is not None:
+                found = self._read_disk(list(disk_lookups))
+                for key, blob in found.items():
+                    self._remember(key, blob)
+                    vector = decode(blob, self.precision)
+                    for i in disk_lookups.pop(key):
+                        self.disk_hits += 1
+                        results[i] = vector
+
+            self.misses += sum(len(positions) for positions in disk_lookups.values())
+
+        return results
+
+    def put_many(self, model: str, dimension: int, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """批量寫入快取"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(model, dimension, text, self.precision)
+                blob = encode_vector(vector, self.precision)
+                self._remember(key, blob)
+                rows.append((key, blob, len(blob), now))
+
+            if rows and self._conn is not None:
+                existing = self._read_sizes([row[0] for row in rows])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.commit()
+                self._disk_bytes += sum(row[2] for row in rows) - sum(existing.values())
+                self._evict_disk()
+
+    def get_or_embed(self, model: str, dimension: int, texts: Sequence[str],
+                     embed_batch: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """查詢快取，僅對未命中（且去重後）的文字呼叫 embed_batch，並回填快取"""
+        results = self.get_many(model, dimension, texts)
+        pending = self._pending(texts, results)
+
+        if pending:
+            pending_texts = [texts[positions[0]] for positions in pending.values()]
+            vectors = embed_batch(pending_texts)
+            self.put_many(model, dimension, pending_texts, vectors)
+            self._fill(results, pending, vectors)
+
+        return results
+
+    async def get_or_embed_async(self, model: str, dimension: int, texts: Sequence[str],
+                                 embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]]
+                                 ) -> List[List[float]]:
+        """get_or_embed 的非阻塞版本：SQLite 讀寫在執行緒池進行，embed_batch 為協程函式"""
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, self.get_many, model, dimension, texts)
+        pending = self._pending(texts, results)
+
+        if pending:
+            pending_texts = [texts[positions[0]] for positions in pending.values()]
+            vectors = await embed_batch(pending_texts)
+            await loop.run_in_executor(None, self.put_many, model, dimension, pending_texts, vectors)
+            self._fill(results, pending, vectors)
+
+        return results
+
+    async def get_or_embed_matrix_async(self, model: str, dimension: int, texts: Sequence[str],
+                                        embed_batch: Callable[[List[str]], Awaitable[Any]]) -> "np.ndarray":
+        """get_or_embed_async 的矩陣版本：回傳 (len(texts), dimension) float32 矩陣，
+        命中的向量由位元組直接解碼，embed_batch 可回傳矩陣或 list[list[float]]"""
+        import numpy as np
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, self._lookup, model, dimension, texts, decode_array)
+        matrix = np.empty((len(texts), dimension), dtype=np.float32)
+        for i, vector in enumerate(results):
+            if vector is not None:
+                matrix[i] = vector
+        pending = self._pending(texts, results)
+
+        if pending:
+            pending_texts = [texts[positions[0]] for positions in pending.values()]
+            vectors = np.asarray(await embed_batch(pending_texts), dtype=np.float32).reshape(len(pending_texts), -1)
+            await loop.run_in_executor(None, self.put_many, model, dimension, pending_texts, vectors)
+            for positions, vector in zip(pending.values(), vectors):
+                matrix[positions] = vector
+
+        return matrix
+
+    @staticmethod
+    def _pending(texts: Sequence[str], results: List[Optional[List[float]]]) -> Dict[str, List[int]]:
+        """未命中的文字依正規化結果去重，對應到其在輸入中的位置"""
+        pending: Dict[str, List[int]] = {}
+        for i, vector in enumerate(results):
+            if vector is None:
+                pending.setdefault(normalize_text(texts[i]), []).append(i)
+        return pending
+
+    @staticmethod
+    def _fill(results: List[Optional[List[float]]], pending: Dict[str, List[int]],
+              vectors: Sequence[Sequence[float]]):
+        for positions, vector in zip(pending.values(), vectors):
+            for i in positions:
+                results[i] = list(vector)
+
+    def stats(self) -> Dict[str, Any]:
+        """回傳命中/未命中計數與目前佔用大小"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "memory_evictions": self.memory_evictions,
+                "disk_evictions": self.disk_evictions
+            }
+
+    def close(self):
+        """關閉磁碟存儲"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, blob: bytes):
+        """放入記憶體層，超出上限時淘汰最久未使用的項目"""
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = blob
+        self._memory_bytes += len(blob)
+
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.memory_evictions += 1
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, bytes]:
+        """從 SQLite 讀取向量並更新存取時間"""
+        found: Dict[str, bytes] = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, blob in self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ):
+                found[key] = blob
+
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in found]
+            )
+            self._conn.commit()
+        return found
+
+    def _read_sizes(self, keys: List[str]) -> Dict[str, int]:
+        """查詢已存在鍵的大小，用於覆寫時修正磁碟用量"""
+        sizes: Dict[str, int] = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, size in self._conn.execute(
+                f"SELECT key, size FROM embeddings WHERE key IN ({placeholders})", chunk
+            ):
+                sizes[key] = size
+        return sizes
+
+    def _evict_disk(self):
+        """磁碟超出上限時，淘汰最久未使用的項目直到降至上限的 90%"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        target = int(self.max_disk_bytes * 0.9)
+        evicted_keys = []
+        freed = 0
+        for key, size in self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_access"):
+            if self._disk_bytes - freed <= target:
+                break
+            evicted_keys.append((key,))
+            freed += size
+
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted_keys)
+        self._conn.commit()
+        self._disk_bytes -= freed
+        self.disk_evictions += len(evicted_keys)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+行程池編碼
+供 ProcessPoolExecutor 呼叫的 Sentence Transformers 編碼函式；每個子行程只載入一次模型，
+讓 CPU 密集的本地編碼不受主行程 GIL 與事件迴圈影響
+"""
+
+import importlib
+from typing import Any, Dict, List
+
+_models: Dict[str, Any] = {}
+
+
+def encode_in_process(model_name: str, texts: List[str]) -> List[List[float]]:
+    """在子行程中以快取的模型編碼整批文字"""
+    model = _models.get(model_name)
+    if model is None:
+        sentence_transformers = importlib.import_module("sentence_transformers")
+        model = _models[model_name] = sentence_transformers.SentenceTransformer(model_name)
+    return model.encode(texts, batch_size=len(texts)).tolist()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文檔過濾條件
+在本地索引上套用與 Data API find 相同語法的過濾條件（例如 {"metadata.category": "技術"}），
+讓 search_similar 的 filter 參數在遠端下推到 vector_find，在本地則先產生布林遮罩（bitmap），只對符合的列計分。
+支援以點號表示的巢狀欄位、$eq / $ne / $in / $nin / $exists / $lt / $lte / $gt / $gte，以及 $and / $or / $not
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MISSING = object()
+
+LOGICAL_OPERATORS = ("$and", "$or", "$not")
+COMPARISON_OPERATORS = ("$eq", "$ne", "$in", "$nin", "$exists", "$lt", "$lte", "$gt", "$gte")
+
+
+def get_path(document: Optional[Dict[str, Any]], path: str) -> Any:
+    """取出點號路徑的值（陣列可用數字索引），不存在時回傳 MISSING"""
+    value: Any = document
+    for segment in path.split("."):
+        if isinstance(value, dict) and segment in value:
+            value = value[segment]
+        elif isinstance(value, list) and segment.isdigit() and int(segment) < len(value):
+            value = value[int(segment)]
+        else:
+            return MISSING
+    return value
+
+
+def filter_key(document_filter: Optional[Dict[str, Any]]) -> Optional[str]:
+    """過濾條件的正規化表示，作為快取鍵"""
+    if not document_filter:
+        return None
+    return json.dumps(document_filter, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def matches(document: Dict[str, Any], document_filter: Optional[Dict[str, Any]]) -> bool:
+    """單一文檔是否符合過濾條件"""
+    if not document_filter:
+        return True
+    for key, condition in document_filter.items():
+        if key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$not":
+            if matches(document, condition):
+                return False
+        elif not all(_compare(get_path(document, key), op, operand) for op, operand in _operators(condition)):
+            return False
+    return True
+
+
+class FilterBitmap:
+    """payload 欄位值 → 列號 的倒排表，把過濾條件轉成布林遮罩。
+
+    等值類條件（$eq / $ne / $in / $nin）查倒排表，其他條件逐列比對；倒排表在第一次以該欄位過濾時建立，
+    索引內容變更時由索引呼叫 reset() 清除
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[Any, "np.ndarray"]] = {}
+
+    def reset(self):
+        self._postings.clear()
+
+    def mask(self, payloads: Sequence[Dict[str, Any]], document_filter: Dict[str, Any]) -> "np.ndarray":
+        """回傳長度等於 payloads 的布林遮罩"""
+        # 只有本地索引需要遮罩，延遲匯入 NumPy，只用 matches / filter_key 的程式不必載入
+        import numpy as np
+
+        result = np.ones(len(payloads), dtype=bool)
+        for key, condition in document_filter.items():
+            if key == "$and":
+                for clause in condition:
+                    result &= self.mask(payloads, clause)
+            elif key == "$or":
+                any_match = np.zeros(len(payloads), dtype=bool)
+                for clause in condition:
+                    any_match |= self.mask(payloads, clause)
+                result &= any_match
+            elif key == "$not":
+                result &= ~self.mask(payloads, condition)
+            else:
+                for op, operand in _operators(condition):
+                    result &= self._field_mask(payloads, key, op, operand)
+        return result
+
+    def _field_mask(self, payloads: Sequence[Dict[str, Any]], path: str, op: str, operand: Any) -> "np.ndarray":
+        import numpy as np
+
+        if op in ("$eq", "$ne") and _hashable(operand):
+            mask = self._rows_mask(payloads, path, [operand])
+            return mask if op == "$eq" else ~mask
+        if op in ("$in", "$nin") and isinstance(operand, list) and all(_hashable(value) for value in operand):
+            mask = self._rows_mask(payloads, path, operand)
+            return mask if op == "$in" else ~mask
+        return np.fromiter((_compare(get_path(payload, path), op, operand) for payload in payloads),
+                           dtype=bool, count=len(payloads))
+
+    def _rows_mask(self, payloads: Sequence[Dict[str, Any]], path: str, values: Iterable[Any]) -> "np.ndarray":
+        import numpy as np
+
+        postings = self._postings.get(path)
+        if postings is None:
+            postings = self._build(payloads, path)
+        mask = np.zeros(len(payloads), dtype=bool)
+        for value in values:
+            rows = postings.get(_value_key(value))
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def _build(self, payloads: Sequence[Dict[str, Any]], path: str) -> Dict[Any, "np.ndarray"]:
+        import numpy as np
+
+        rows_by_value: Dict[Any, List[int]] = {}
+        for row, payload in enumerate(payloads):
+            value = get_path(payload, path)
+            for element in (value if isinstance(value, list) else [value]):
+                if element is not MISSING and _hashable(element):
+                    rows_by_value.setdefault(_value_key(element), []).append(row)
+        postings = {key: np.asarray(rows, dtype=np.int64) for key, rows in rows_by_value.items()}
+        self._postings[path] = postings
+        return postings
+
+
+def _operators(condition: Any):
+    """{"$in": [...], "$ne": ...} 形式的條件逐一回傳 (運算子, 值)，其他值視為 $eq"""
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for op, operand in condition.items():
+            if op not in COMPARISON_OPERATORS:
+                raise ValueError(f"不支援的過濾運算子: {op}")
+            yield op, operand
+    else:
+        yield "$eq", condition
+
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    """Data API 的比較語意：陣列欄位只要有一個元素符合即可（$ne / $nin 為其否定）"""
+    if op == "$exists":
+        return (value is not MISSING) == bool(operand)
+    if op == "$eq":
+        return _equals(value, operand)
+    if op == "$ne":
+        return not _equals(value, operand)
+    if op == "$in":
+        return any(_equals(value, candidate) for candidate in operand)
+    if op == "$nin":
+        return not any(_equals(value, candidate) for candidate in operand)
+    if value is MISSING:
+        return False
+    for element in (value if isinstance(value, list) else [value]):
+        try:
+            if ((op == "$lt" and element < operand) or (op == "$lte" and element <= operand)
+                    or (op == "$gt" and element > operand) or (op == "$gte" and element >= operand)):
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def _equals(value: Any, operand: Any) -> bool:
+    if value is MISSING:
+        return False
+    if _hashable(value) and _hashable(operand):
+        if _value_key(value) == _value_key(operand):
+            return True
+    elif value == operand:
+        return True
+    return isinstance(value, list) and not isinstance(operand, list) and any(
+        _equals(element, operand) for element in value
+    )
+
+
+def _value_key(value: Any) -> Any:
+    """布林值與數字分開比較（True 不等於 1）"""
+    return (isinstance(value, bool), value)
+
+
+def _hashable(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
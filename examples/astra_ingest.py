@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串流匯入管線
+以生成器逐筆讀取 JSONL / CSV / 文字檔目錄，分塊、嵌入並以固定批量經由 AstraDBManager 寫入，
+記憶體用量只與批量大小有關，與語料總量無關；每批轉成列式 DocumentBatch，向量以 float32 矩陣保存
+"""
+
+import asyncio
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from astra_batch import DocumentBatch
+
+TEXT_FILE_SUFFIXES = {".txt", ".md"}
+
+
+def read_jsonl(path: str, text_field: str = "text") -> Iterator[Dict[str, Any]]:
+    """逐行讀取 JSONL，每行一個文檔物件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            doc = json.loads(line)
+            if text_field != "text" and text_field in doc:
+                doc["text"] = doc.pop(text_field)
+            if "text" not in doc:
+                print(f"⚠️  {path}:{line_number} 缺少 '{text_field}' 欄位，已略過")
+                continue
+            yield doc
+
+
+def read_csv(path: str, text_field: str = "text") -> Iterator[Dict[str, Any]]:
+    """逐列讀取 CSV，text_field 欄為文字，其餘欄位放入 metadata"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            text = row.pop(text_field, None)
+            if not text:
+                continue
+            yield {"text": text, "metadata": {**row, "source": os.path.basename(path)}}
+
+
+def read_text_dir(path: str, suffixes: Iterable[str] = TEXT_FILE_SUFFIXES) -> Iterator[Dict[str, Any]]:
+    """以穩定順序走訪目錄，每個文字檔為一個文檔"""
+    suffixes = set(suffixes)
+    root = Path(path)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = Path(dirpath) / filename
+            if file_path.suffix.lower() not in suffixes:
+                continue
+            text = file_path.read_text(encoding='utf-8')
+            if text.strip():
+                yield {"text": text, "metadata": {"source": file_path.relative_to(root).as_posix()}}
+
+
+def iter_documents(source: str, text_field: str = "text") -> Iterator[Dict[str, Any]]:
+    """依來源類型（目錄 / .jsonl / .csv）選擇讀取器"""
+    if os.path.isdir(source):
+        return read_text_dir(source)
+    suffix = Path(source).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return read_jsonl(source, text_field)
+    if suffix == ".csv":
+        return read_csv(source, text_field)
+    raise ValueError(f"不支援的來源格式: {source}")
+
+
+def batched(items: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """將生成器切成固定大小的批次，一次只持有一批"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class StreamingIngestor:
+    """串流匯入器：下一批非同步嵌入的同時，上一批正在上傳"""
+
+    def __init__(self, astra_manager, collection_name: str = "documents", batch_size: Optional[int] = None):
+        self.astra_manager = astra_manager
+        self.collection_name = collection_name
+        settings = astra_manager.config['astra_db'].get('settings', {})
+        self.batch_size = batch_size or int(settings.get('batch_size', 100))
+        self.stats = {"documents": 0, "skipped": 0, "batches": 0, "failed_batches": 0}
+
+    async def ingest(self, documents: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """匯入文檔串流，回傳統計資訊"""
+        upload_task = None
+
+        try:
+            for documents_batch in batched(documents, self.batch_size):
+                # 匯入清單中內容未變更的文檔在嵌入前就略過
+                batch = DocumentBatch.from_documents(documents_batch)
+                pending = self.astra_manager.filter_unchanged(batch, self.collection_name)
+                self.stats["skipped"] += len(batch) - len(pending)
+                if not pending:
+                    continue
+                batch = pending
+
+                # 非同步嵌入不阻塞事件迴圈，與進行中的上傳重疊；向量直接寫入批次的矩陣
+                if batch.vectors is None:
+                    batch.set_vectors(await self.astra_manager.aembed_matrix(batch.texts, self.collection_name))
+
+                if upload_task is not None:
+                    await upload_task
+                upload_task = asyncio.create_task(self._upload(batch))
+        except BaseException:
+            # 讀取或嵌入失敗時先等進行中的上傳結束（已送出的文檔照常記入匯入清單），
+            # 不留下沒有取回例外的任務，再拋出原本的錯誤
+            if upload_task is not None:
+                await asyncio.gather(upload_task, return_exceptions=True)
+            raise
+
+        if upload_task is not None:
+            await upload_task
+        return self.stats
+
+    async def _upload(self, batch: DocumentBatch):
+        """經由 AstraDBManager 上傳一批已嵌入的文檔"""
+        report = await self.astra_manager.insert_documents(batch, self.collection_name)
+        self.stats["documents"] += report.inserted
+        if not report.ok:
+            self.stats["failed_batches"] += 1
+        self.stats["batches"] += 1
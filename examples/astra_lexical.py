@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地詞彙索引
+以 BM25 倒排索引回答精確詞彙與識別碼查詢，並以倒數排名融合（RRF）與向量結果合併成混合檢索。
+中日韓文字沒有空白分詞，以重疊的二字組（bigram）建立索引；英數字以小寫單字建立索引，
+帶 _ . - : 的識別碼（例如 user_id、ERR-1042）同時保留完整識別碼與其組成部分
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from astra_filters import matches
+
+SEARCH_MODES = ("vector", "lexical", "hybrid", "auto")
+
+CJK_RUN = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]+")
+WORD = re.compile(r"[A-Za-z0-9_]+(?:[.\-:]+[A-Za-z0-9_]+)*")
+WORD_PART = re.compile(r"[A-Za-z0-9]+")
+# 識別碼：含數字、底線、分隔符號或內部大寫的單字（ERR-1042、user_id、getUserName、v2.3）
+IDENTIFIER = re.compile(r"[A-Za-z0-9]*(?:\d|_|[.\-:][A-Za-z0-9]|[a-z][A-Z])[\w.\-:]*")
+QUOTED = re.compile(r"^[\"'「『“](.+)[\"'」』”]$")
+
+
+def tokenize(text: str, parts: bool = True) -> List[str]:
+    """把文字切成索引詞：英數字單字（小寫）、識別碼的組成部分（parts 為 False 時不拆），以及中日韓二字組（單字時為單字）"""
+    tokens = []
+    for match in WORD.finditer(text):
+        word = match.group().lower()
+        tokens.append(word)
+        if parts and not word.isalnum():
+            word_parts = WORD_PART.findall(word)
+            if len(word_parts) > 1:
+                tokens.extend(word_parts)
+    for match in CJK_RUN.finditer(text):
+        run = match.group()
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def is_exact_query(query: str) -> bool:
+    """查詢是否為引號包住的詞語，或只由 1~3 個識別碼組成（這類查詢由詞彙索引回答，不需要嵌入）"""
+    query = query.strip()
+    if QUOTED.match(query):
+        return True
+    words = query.split()
+    return 0 < len(words) <= 3 and all(IDENTIFIER.fullmatch(word) for word in words)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Dict[str, Any]]], limit: int, k: int = 60,
+                           key: str = "_id") -> List[Dict[str, Any]]:
+    """倒數排名融合：每份結果中排第 r 名的文檔得 1 / (k + r)，依總分排序；融合分數放在 rrf_score，
+    其餘欄位（包括 score）保留，同一文檔出現在多份結果時以前面的結果為準"""
+    fused: Dict[Any, float] = {}
+    documents: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            doc_key = document.get(key, document.get("text"))
+            fused[doc_key] = fused.get(doc_key, 0.0) + 1.0 / (k + rank)
+            documents[doc_key] = {**document, **documents[doc_key]} if doc_key in documents else document
+    top = heapq.nlargest(limit, fused.items(), key=lambda item: item[1])
+    return [{**documents[doc_key], "rrf_score": score} for doc_key, score in top]
+
+
+class BM25Index:
+    """文檔內容的 BM25 倒排索引：詞 → {列號: 詞頻}，刪除時只更新該文檔出現過的詞"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, text_field: str = "text"):
+        self.k1 = k1
+        self.b = b
+        self.text_field = text_field
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._payloads: List[Optional[Dict[str, Any]]] = []
+        self._lengths: List[int] = []
+        self._terms: List[Sequence[str]] = []
+        self._id_to_row: Dict[Any, int] = {}
+        self._free_rows: List[int] = []
+        self._total_length = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["BM25Index"]:
+        """依 settings.lexical_index 建立空索引，停用時回傳 None"""
+        lexical_settings = settings.get('lexical_index', {})
+        if not lexical_settings.get('enabled', True):
+            return None
+        return cls(k1=float(lexical_settings.get('k1', 1.2)), b=float(lexical_settings.get('b', 0.75)))
+
+    def add(self, documents: Iterable[Dict[str, Any]]):
+        """加入文檔（不保存 $vector），相同 _id 的文檔會被覆寫"""
+        for doc in documents:
+            text = doc.get(self.text_field)
+            if not isinstance(text, str):
+                continue
+            doc_id = doc.get('_id')
+            if doc_id is not None and doc_id in self._id_to_row:
+                self._remove_row(self._id_to_row.pop(doc_id))
+
+            counts = Counter(tokenize(text))
+            row = self._free_rows.pop() if self._free_rows else len(self._payloads)
+            payload = {key: value for key, value in doc.items() if key != '$vector'}
+            length = sum(counts.values())
+            if row == len(self._payloads):
+                self._payloads.append(payload)
+                self._lengths.append(length)
+                self._terms.append(tuple(counts))
+            else:
+                self._payloads[row] = payload
+                self._lengths[row] = length
+                self._terms[row] = tuple(counts)
+            for term, frequency in counts.items():
+                self._postings.setdefault(term, {})[row] = frequency
+            if doc_id is not None:
+                self._id_to_row[doc_id] = row
+            self._total_length += length
+            self._size += 1
+
+    def remove(self, doc_ids: Iterable[Any]) -> int:
+        """刪除指定 _id 的文檔，回傳實際刪除的數量"""
+        removed = 0
+        for doc_id in set(doc_ids):
+            row = self._id_to_row.pop(doc_id, None)
+            if row is not None:
+                self._remove_row(row)
+                removed += 1
+        return removed
+
+    def search(self, query: str, limit: int = 5, fields: Optional[List[str]] = None,
+               filter: Optional[Dict[str, Any]] = None, exact: bool = False) -> List[Dict[str, Any]]:
+        """回傳 BM25 分數最高的 limit 個文檔（score 為 BM25 分數，沒有任何查詢詞的文檔不會出現）；
+        filter 只需比對含有查詢詞的文檔。
+        exact 時文檔必須含有每個查詢詞，識別碼只比對完整識別碼：ERR-1005 不會因共同的 err 命中 ERR-9999"""
+        terms = set(tokenize(query, parts=not exact))
+        if not terms or self._size == 0 or limit <= 0:
+            return []
+        rows = None
+        if exact:
+            if any(term not in self._postings for term in terms):
+                return []
+            rows = set.intersection(*(set(self._postings[term]) for term in terms))
+
+        average_length = self._total_length / self._size or 1.0
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1.0 + (self._size - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, frequency in postings.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self._lengths[row] / average_length)
+                scores[row] = scores.get(row, 0.0) + idf * frequency * (self.k1 + 1.0) / (frequency + norm)
+        if rows is not None:
+            scores = {row: score for row, score in scores.items() if row in rows}
+        if filter:
+            scores = {row: score for row, score in scores.items() if matches(self._payloads[row], filter)}
+
+        results = []
+        for row, score in heapq.nlargest(limit, scores.items(), key=lambda item: item[1]):
+            payload = self._payloads[row]
+            if fields:
+                result = {field: payload[field] for field in fields if field in payload}
+            else:
+                result = dict(payload)
+            result['score'] = score
+            results.append(result)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self._size,
+            "terms": len(self._postings),
+            "average_length": self._total_length / self._size if self._size else 0.0
+        }
+
+    def _remove_row(self, row: int):
+        for term in self._terms[row]:
+            postings = self._postings[term]
+            del postings[row]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths[row]
+        self._payloads[row] = None
+        self._lengths[row] = 0
+        self._terms[row] = ()
+        self._free_rows.append(row)
+        self._size -= 1
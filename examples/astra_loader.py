@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+載入 examples/astra-integration.py
+檔名含連字號無法直接 import，供基準測試與命令列工具共用
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+
+def load_astra_integration():
+    """載入 astra-integration.py 模組（重複呼叫回傳同一個模組）"""
+    if "astra_integration" in sys.modules:
+        return sys.modules["astra_integration"]
+
+    path = Path(__file__).with_name("astra-integration.py")
+    spec = importlib.util.spec_from_file_location("astra_integration", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["astra_integration"] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地精確向量索引
+將集合的向量保存在連續矩陣中（float32，或 float16 / int8 量化以節省記憶體），以一次矩陣乘法加 argpartition
+回答 top-k 查詢，可作為熱門集合的低延遲檢索、離線測試，以及衡量遠端索引召回率的基準答案
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from astra_filters import FilterBitmap
+from astra_quantization import QuantizedMatrix
+from astra_vector_codec import vector_matrix
+
+SUPPORTED_METRICS = ("cosine", "dot_product")
+
+
+def similarity_to_score(similarity: np.ndarray) -> np.ndarray:
+    """換算成與 Astra DB $similarity 相同的 0~1 分數: (1 + s) / 2"""
+    return (1.0 + similarity) / 2.0
+
+
+class LocalVectorIndex:
+    """以 NumPy 矩陣實作的暴力向量索引，依集合的 vector_metric 計分。
+
+    precision 為 float16 或 int8 時以量化向量計分；rescore > 0 時另外保留 float32 原始向量，
+    對前 limit * rescore 個候選精確重新計分（保存後原始向量以 mmap 載入，不佔常駐記憶體）
+    """
+
+    def __init__(self, dimension: int, metric: str = "cosine", initial_capacity: int = 1024,
+                 precision: str = "float32", rescore: int = 0):
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"不支援的向量度量: {metric}")
+
+        self.dimension = dimension
+        self.metric = metric
+        self.precision = precision
+        self.rescore = rescore if precision != "float32" else 0
+        self._matrix = QuantizedMatrix(dimension, precision, initial_capacity)
+        self._exact: Optional[QuantizedMatrix] = (
+            QuantizedMatrix(dimension, "float32", initial_capacity) if self.rescore > 0 else None
+        )
+        self._payloads: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[Any, int] = {}
+        self._filter_bitmap = FilterBitmap()
+
+    def __len__(self) -> int:
+        return len(self._matrix)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """目前所有向量（cosine 度量下為已正規化的向量；量化且未保留原始向量時為還原後的近似值）"""
+        if self._exact is not None:
+            return self._exact.rows()
+        return self._matrix.rows()
+
+    @property
+    def payloads(self) -> List[Dict[str, Any]]:
+        """與向量列對應的文檔內容（不含 $vector）"""
+        return self._payloads
+
+    def add(self, documents: Iterable[Dict[str, Any]]):
+        """加入帶 $vector（JSON 陣列或二進位形式）的文檔，相同 _id 的文檔會被覆寫"""
+        documents = [doc for doc in documents if '$vector' in doc]
+        if not documents:
+            return
+        vectors = vector_matrix([doc['$vector'] for doc in documents])
+        payloads = [{key: value for key, value in doc.items() if key != '$vector'} for doc in documents]
+        self.add_vectors(vectors, payloads)
+
+    def add_vectors(self, vectors: np.ndarray, payloads: Sequence[Dict[str, Any]]):
+        """加入一批向量與對應內容"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if len(vectors) != len(payloads):
+            raise ValueError("向量數量與文檔數量不一致")
+        if self.metric == "cosine":
+            vectors = self._normalize(vectors)
+        self._filter_bitmap.reset()
+
+        new_rows, replaced_rows, replaced = [], [], []
+        for i, payload in enumerate(payloads):
+            doc_id = payload.get('_id')
+            row = self._id_to_row.get(doc_id) if doc_id is not None else None
+            if row is None:
+                new_rows.append(i)
+            else:
+                replaced_rows.append(row)
+                replaced.append(i)
+                self._payloads[row] = dict(payload)
+
+        if replaced:
+            self._matrix.assign(replaced_rows, vectors[replaced])
+            if self._exact is not None:
+                self._exact.assign(replaced_rows, vectors[replaced])
+
+        if new_rows:
+            start = len(self._matrix)
+            self._matrix.append(vectors[new_rows])
+            if self._exact is not None:
+                self._exact.append(vectors[new_rows])
+            for offset, i in enumerate(new_rows):
+                payload = dict(payloads[i])
+                self._payloads.append(payload)
+                if payload.get('_id') is not None:
+                    self._id_to_row[payload['_id']] = start + offset
+
+    def remove(self, doc_ids: Iterable[Any]) -> int:
+        """刪除指定 _id 的文檔並壓實矩陣，回傳實際刪除的數量"""
+        rows = [self._id_to_row[doc_id] for doc_id in set(doc_ids) if doc_id in self._id_to_row]
+        if not rows:
+            return 0
+        keep = np.ones(len(self._payloads), dtype=bool)
+        keep[rows] = False
+        keep = np.flatnonzero(keep)
+
+        self._matrix = self._matrix.take(keep)
+        if self._exact is not None:
+            self._exact = self._exact.take(keep)
+        self._payloads = [self._payloads[row] for row in keep]
+        self._filter_bitmap.reset()
+        self._id_to_row = {
+            payload['_id']: row for row, payload in enumerate(self._payloads) if payload.get('_id') is not None
+        }
+        return len(rows)
+
+    def scores(self, query_vector: Sequence[float]) -> np.ndarray:
+        """計算查詢向量對所有文檔的原始相似度（內積或餘弦；量化時為近似值）"""
+        return self._matrix.dot(self._prepare_query(query_vector))
+
+    def search(self, query_vector: Sequence[float], limit: int = 5,
+               fields: Optional[List[str]] = None,
+               filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """回傳最相似的 limit 個文檔，score 與 Astra DB 的 $similarity 同尺度；
+        filter 使用 Data API 語法，先以布林遮罩篩出符合的列，只對這些列計分；
+        fields 包含 $vector 時附上向量（float32 陣列，量化且未保留原始向量時為還原後的近似值）"""
+        if len(self) == 0 or limit <= 0:
+            return []
+
+        query = self._prepare_query(query_vector)
+        candidates = None
+        if filter:
+            candidates = np.flatnonzero(self._filter_bitmap.mask(self._payloads, filter))
+            if not len(candidates):
+                return []
+        similarities = self._matrix.dot(query, candidates)
+        if self._exact is not None:
+            # 先以量化分數取較多候選，再以原始向量精確重新計分
+            top, _ = self.top_k(similarities, limit * self.rescore)
+            rescored = np.sort(top if candidates is None else candidates[top])  # 依列號排序，讓 mmap 讀取較連續
+            top, top_similarities = self.top_k(self._exact.rows(rescored) @ query, limit)
+            rows = rescored[top]
+        else:
+            top, top_similarities = self.top_k(similarities, limit)
+            rows = top if candidates is None else candidates[top]
+        scores = similarity_to_score(top_similarities)
+        vectors = None
+        if fields and '$vector' in fields:
+            vectors = (self._exact if self._exact is not None else self._matrix).rows(np.asarray(rows))
+
+        results = []
+        for position, (row, score) in enumerate(zip(rows, scores)):
+            payload = self._payloads[row]
+            if fields:
+                result = {field: payload[field] for field in fields if field in payload}
+            else:
+                result = dict(payload)
+            if vectors is not None:
+                result['$vector'] = vectors[position]
+            result['score'] = float(score)
+            results.append(result)
+        return results
+
+    def memory_bytes(self, include_vectors: bool = True) -> int:
+        """向量佔用的常駐記憶體（量化矩陣，以及未以 mmap 載入的原始向量；不含文檔內容）"""
+        total = self._matrix.nbytes
+        if include_vectors and self._exact is not None and not self._exact.is_mapped:
+            total += self._exact.nbytes
+        return total
+
+    def save(self, path: str):
+        """將索引保存到目錄（index.npz + payloads.json，保留原始向量時另存 vectors.npy）"""
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.savez(directory / "index.npz", **self._matrix.state())
+        if self._exact is not None:
+            np.save(directory / "vectors.npy", np.asarray(self._exact.rows()))
+        with open(directory / "payloads.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                "dimension": self.dimension,
+                "metric": self.metric,
+                "precision": self.precision,
+                "rescore": self.rescore,
+                "payloads": self._payloads
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        """從 save() 保存的目錄載入索引，原始向量以 mmap 方式載入"""
+        directory = Path(path)
+        with open(directory / "payloads.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        data = np.load(directory / "index.npz")
+
+        index = cls(meta["dimension"], meta["metric"], precision=meta["precision"], rescore=meta["rescore"])
+        index._matrix = QuantizedMatrix.from_state(
+            index.dimension, index.precision, data["codes"], data["scales"] if "scales" in data else None
+        )
+        if index.rescore > 0:
+            index._exact = QuantizedMatrix.from_state(
+                index.dimension, "float32", np.load(directory / "vectors.npy", mmap_mode='r')
+            )
+        index._payloads = meta["payloads"]
+        for row, payload in enumerate(index._payloads):
+            if payload.get('_id') is not None:
+                index._id_to_row[payload['_id']] = row
+        return index
+
+    @staticmethod
+    def top_k(scores: np.ndarray, limit: int):
+        """以 argpartition 取前 limit 名，再只對這些候選排序"""
+        k = min(limit, len(scores))
+        if k < len(scores):
+            rows = np.argpartition(scores, -k)[-k:]
+        else:
+            rows = np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return rows, scores[rows]
+
+    def _prepare_query(self, query_vector: Sequence[float]) -> np.ndarray:
+        query = np.asarray(query_vector, dtype=np.float32).reshape(self.dimension)
+        if self.metric == "cosine":
+            query = self._normalize(query[None, :])[0]
+        return query
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+匯入清單
+以內容雜湊（text 與 metadata）或設定的來源鍵欄位為文檔產生確定性的 _id，並在本地 SQLite 記錄每個集合已存入的 _id 與內容雜湊；
+重新匯入時內容未變更的文檔既不嵌入也不上傳，成本只與變更的文檔數成正比。
+目錄同步另外記錄每個來源檔案的 mtime、大小、雜湊與其片段 _id，用來偵測新增、修改與刪除
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+DEFAULT_MANIFEST_PATH = ".cache/ingest-manifest.sqlite3"
+DOCUMENT_ID_LENGTH = 32
+# 內容雜湊只涵蓋這些欄位：timestamp 之類每次匯入都不同的欄位不影響 _id 與變更偵測
+CONTENT_FIELDS = ("text", "metadata")
+# 分塊片段之間互不相同的 metadata 欄位：分塊啟用時來源鍵必須包含其中之一
+CHUNK_ID_FIELDS = ("metadata.chunk_index", "metadata.char_start")
+
+# SQLite 預設單一語句最多 999 個參數
+_LOOKUP_BATCH = 500
+
+
+def content_hash(document: Dict[str, Any], fields: Sequence[str] = CONTENT_FIELDS) -> str:
+    """文檔內容欄位（預設 text 與 metadata）的 SHA-256，以排序鍵的 JSON 表示計算，與欄位順序無關"""
+    content = {key: document[key] for key in fields if key in document}
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def source_key(document: Dict[str, Any], id_fields: Optional[Sequence[str]] = None) -> Optional[str]:
+    """以 id_fields（點號路徑，例如 metadata.source、metadata.chunk_index）的值組成來源鍵；
+    沒有設定或第一個欄位不存在時回傳 None，其餘欄位不存在時以 null 表示"""
+    if not id_fields:
+        return None
+    values = [_get_path(document, path) for path in id_fields]
+    if values[0] is None:
+        return None
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def check_chunk_id_fields(id_fields: Optional[Sequence[str]]) -> None:
+    """分塊啟用時檢查 id_fields：沒有片段層級的欄位時同一來源的所有片段會得到相同的 _id，互相覆寫後只剩最後一個"""
+    if id_fields and not any(path in CHUNK_ID_FIELDS for path in id_fields):
+        raise ValueError(
+            f"分塊啟用時 id_fields 必須包含 {' 或 '.join(CHUNK_ID_FIELDS)}，"
+            f"否則同一來源的片段共用 _id: {list(id_fields)}"
+        )
+
+
+def document_id(document: Dict[str, Any], digest: Optional[str] = None,
+                id_fields: Optional[Sequence[str]] = None) -> str:
+    """文檔的確定性 _id：有來源鍵時為來源鍵的雜湊（內容修改後 _id 不變，以 upsert 覆寫舊版本），
+    否則為內容雜湊的前 32 個字元"""
+    key = source_key(document, id_fields)
+    if key is not None:
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:DOCUMENT_ID_LENGTH]
+    return (digest or content_hash(document))[:DOCUMENT_ID_LENGTH]
+
+
+def ensure_document_id(document: Dict[str, Any], digest: Optional[str] = None,
+                       id_fields: Optional[Sequence[str]] = None) -> Any:
+    """沒有 _id 的文檔補上 document_id，回傳文檔的 _id"""
+    if document.get('_id') is None:
+        document['_id'] = document_id(document, digest, id_fields)
+    return document['_id']
+
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for segment in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(segment)
+    return value
+
+
+class IngestManifest:
+    """以 (範圍, _id) 為鍵記錄內容雜湊的本地清單；範圍通常為 資料庫/集合/嵌入模型:維度"""
+
+    def __init__(self, path: str = DEFAULT_MANIFEST_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "scope TEXT NOT NULL, doc_id TEXT NOT NULL, hash TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (scope, doc_id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "scope TEXT NOT NULL, path TEXT NOT NULL, mtime REAL NOT NULL, size INTEGER NOT NULL, "
+            "hash TEXT NOT NULL, doc_ids TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (scope, path))"
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["IngestManifest"]:
+        """依 settings.ingest_manifest 建立清單，停用時回傳 None"""
+        manifest_settings = settings.get('ingest_manifest', {})
+        if not manifest_settings.get('enabled', True):
+            return None
+        return cls(manifest_settings.get('path', DEFAULT_MANIFEST_PATH))
+
+    def lookup(self, scope: str, doc_ids: Iterable[Any]) -> Dict[Any, str]:
+        """查詢已記錄的內容雜湊，只回傳清單中存在的 _id"""
+        keys = {_key(doc_id): doc_id for doc_id in doc_ids}
+        found: Dict[Any, str] = {}
+        key_list = list(keys)
+        with self._lock:
+            for start in range(0, len(key_list), _LOOKUP_BATCH):
+                batch = key_list[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT doc_id, hash FROM documents WHERE scope = ? AND doc_id IN ({placeholders})",
+                    [scope, *batch]
+                ).fetchall()
+                for key, digest in rows:
+                    found[keys[key]] = digest
+        return found
+
+    def record(self, scope: str, hashes: Dict[Any, str]):
+        """記錄已成功上傳的文檔"""
+        if not hashes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (scope, doc_id, hash, updated_at) VALUES (?, ?, ?, ?)",
+                [(scope, _key(doc_id), digest, now) for doc_id, digest in hashes.items()]
+            )
+            self._conn.commit()
+
+    def forget(self, scope: str, doc_ids: Iterable[Any]):
+        """移除指定文檔的記錄（文檔已從集合刪除）"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM documents WHERE scope = ? AND doc_id = ?",
+                [(scope, _key(doc_id)) for doc_id in doc_ids]
+            )
+            self._conn.commit()
+
+    def forget_scope(self, scope: str):
+        """清除整個範圍的記錄；集合被刪除並重建後必須呼叫，否則文檔會被誤判為已存在"""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE scope = ?", (scope,))
+            self._conn.execute("DELETE FROM files WHERE scope = ?", (scope,))
+            self._conn.commit()
+
+    def files(self, scope: str) -> Dict[str, Dict[str, Any]]:
+        """範圍內已同步的來源檔案: 相對路徑 → {mtime, size, hash, doc_ids}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, mtime, size, hash, doc_ids FROM files WHERE scope = ?", (scope,)
+            ).fetchall()
+        return {
+            path: {"mtime": mtime, "size": size, "hash": digest, "doc_ids": json.loads(doc_ids)}
+            for path, mtime, size, digest, doc_ids in rows
+        }
+
+    def record_files(self, scope: str, files: Dict[str, Dict[str, Any]]):
+        """記錄同步完成的來源檔案（格式與 files() 相同）"""
+        if not files:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (scope, path, mtime, size, hash, doc_ids, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(scope, path, entry["mtime"], entry["size"], entry["hash"],
+                  json.dumps(entry["doc_ids"], ensure_ascii=False), now)
+                 for path, entry in files.items()]
+            )
+            self._conn.commit()
+
+    def forget_files(self, scope: str, paths: Iterable[str]):
+        """移除已刪除來源檔案的記錄"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM files WHERE scope = ? AND path = ?", [(scope, path) for path in paths])
+            self._conn.commit()
+
+    def count(self, scope: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents WHERE scope = ?", (scope,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _key(doc_id: Any) -> str:
+    """以 JSON 表示存放 _id，讓整數 1 與字串 "1" 不會混用"""
+    return json.dumps(doc_id, ensure_ascii=False)
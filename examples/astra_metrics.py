@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分階段延遲指標
+為 RAG 路徑的每個階段（嵌入、Astra 往返、JSON 解碼、流程執行）累積延遲直方圖，
+以集合名稱與嵌入服務等作為標籤，可匯出為 Prometheus 文字格式或定期寫出 JSON 快照
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 與 Prometheus 客戶端預設相近的延遲桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+SeriesKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Histogram:
+    """固定桶的延遲直方圖，observe 只做一次二分搜尋與兩次加法"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """以桶內線性插值估計分位數（秒）"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip([str(bucket) for bucket in self.buckets] + ["+Inf"], self.counts)),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99)
+        }
+
+
+class StageTimer:
+    """計時上下文管理器，離開時將經過時間記入對應的直方圖"""
+
+    __slots__ = ("_metrics", "_key", "_start")
+
+    def __init__(self, metrics: "LatencyMetrics", key: SeriesKey):
+        self._metrics = metrics
+        self._key = key
+
+    def __enter__(self) -> "StageTimer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._metrics._observe_key(self._key, time.perf_counter() - self._start)
+
+
+class LatencyMetrics:
+    """以 (階段, 標籤) 區分的延遲直方圖集合"""
+
+    def __init__(self, namespace: str = "astra_rag", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._series: Dict[SeriesKey, Histogram] = {}
+        self._lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._snapshot_stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["LatencyMetrics"]:
+        """依 settings.metrics 建立指標，停用時回傳 None；設定 snapshot_path 時啟動定期 JSON 快照"""
+        metrics_settings = settings.get('metrics', {})
+        if not metrics_settings.get('enabled', True):
+            return None
+        metrics = cls(namespace=metrics_settings.get('namespace', 'astra_rag'))
+        if metrics_settings.get('snapshot_path'):
+            metrics.start_snapshots(
+                metrics_settings['snapshot_path'],
+                float(metrics_settings.get('snapshot_interval_seconds', 60))
+            )
+        return metrics
+
+    def time(self, stage: str, **labels: str) -> StageTimer:
+        """回傳計時器：`with metrics.time("embedding", collection="documents", service="openai"): ...`"""
+        return StageTimer(self, (stage, tuple(sorted(labels.items()))))
+
+    def observe(self, stage: str, seconds: float, **labels: str):
+        """直接記錄一次已量測的延遲（秒）"""
+        self._observe_key((stage, tuple(sorted(labels.items()))), seconds)
+
+    def _observe_key(self, key: SeriesKey, seconds: float):
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                histogram = self._series[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """目前所有序列的 JSON 可序列化快照"""
+        with self._lock:
+            series = [
+                {"stage": stage, "labels": dict(labels), **histogram.to_dict()}
+                for (stage, labels), histogram in sorted(self._series.items())
+            ]
+        return {"timestamp": datetime.now().isoformat(), "namespace": self.namespace, "series": series}
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """各序列的次數與 p50/p95/p99（毫秒），供終端輸出"""
+        return [
+            {
+                "stage": series["stage"],
+                "labels": series["labels"],
+                "count": series["count"],
+                "p50_ms": series["p50"] * 1000,
+                "p95_ms": series["p95"] * 1000,
+                "p99_ms": series["p99"] * 1000
+            }
+            for series in self.snapshot()["series"]
+        ]
+
+    def to_prometheus(self) -> str:
+        """匯出為 Prometheus 文字格式（單一 histogram 指標族，stage 為標籤）"""
+        name = f"{self.namespace}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Latency of each RAG pipeline stage in seconds.",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            items = sorted((key, list(histogram.counts), histogram.sum, histogram.count)
+                           for key, histogram in self._series.items())
+
+        for (stage, labels), counts, total, count in items:
+            label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in (("stage", stage), *labels))
+            cumulative = 0
+            for bucket, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{label_text},le="{bucket}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text}}} {total}")
+            lines.append(f"{name}_count{{{label_text}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """寫出 Prometheus 文字檔（可供 node_exporter textfile collector 讀取），以暫存檔替換避免讀到半份內容"""
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+    def write_snapshot(self, path: str):
+        """將目前快照附加到 JSON Lines 檔案"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+
+    def start_snapshots(self, path: str, interval_seconds: float = 60):
+        """以背景執行緒每隔 interval_seconds 寫出一次快照"""
+        if self._snapshot_thread is not None:
+            return
+
+        def run():
+            while not self._snapshot_stop.wait(interval_seconds):
+                self.write_snapshot(path)
+
+        self._snapshot_stop.clear()
+        self._snapshot_thread = threading.Thread(target=run, name="latency-snapshots", daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_stop.set()
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
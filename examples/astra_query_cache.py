@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查詢結果快取
+以 (集合, 正規化查詢文字, limit, fields, 搜索模式, 過濾條件, 分數門檻) 為鍵快取 search_similar 的結果，
+支援 TTL 與最大項目數淘汰，寫入集合時自動失效該集合的所有項目
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from astra_embedding_cache import normalize_text
+from astra_filters import filter_key
+
+QueryKey = Tuple[str, str, int, Optional[Tuple[str, ...]], str, Optional[str], Optional[float]]
+
+
+class QueryResultCache:
+    """LRU + TTL 的搜索結果快取"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[QueryKey, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._keys_by_collection: Dict[str, Set[QueryKey]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional["QueryResultCache"]:
+        """依 settings.query_cache 建立快取，停用時回傳 None"""
+        cache_settings = settings.get('query_cache', {})
+        if not cache_settings.get('enabled', True):
+            return None
+        return cls(
+            max_entries=int(cache_settings.get('max_entries', 1024)),
+            ttl_seconds=float(cache_settings.get('ttl_seconds', 300))
+        )
+
+    @staticmethod
+    def make_key(collection_name: str, query: str, limit: int,
+                 fields: Optional[Sequence[str]] = None, mode: str = "vector",
+                 filter: Optional[Dict[str, Any]] = None, threshold: Optional[float] = None) -> QueryKey:
+        return (collection_name, normalize_text(query), limit, tuple(fields) if fields else None, mode,
+                filter_key(filter), threshold)
+
+    def get(self, collection_name: str, query: str, limit: int,
+            fields: Optional[Sequence[str]] = None, mode: str = "vector",
+            filter: Optional[Dict[str, Any]] = None,
+            threshold: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """查詢快取，未命中或已過期時回傳 None；命中時回傳深複本，呼叫端修改結果（例如移除 $vector）不影響快取"""
+        key = self.make_key(collection_name, query, limit, fields, mode, filter, threshold)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, results = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(results)
+
+    def generation(self, collection_name: str) -> int:
+        """集合的失效世代，每次 invalidate 加一"""
+        with self._lock:
+            return self._generations.get(collection_name, 0)
+
+    def put(self, collection_name: str, query: str, limit: int,
+            fields: Optional[Sequence[str]], results: List[Dict[str, Any]],
+            generation: Optional[int] = None, mode: str = "vector",
+            filter: Optional[Dict[str, Any]] = None, threshold: Optional[float] = None):
+        """寫入結果，超過 max_entries 時淘汰最久未使用的項目；
+        若查詢開始後集合已失效（generation 不符），結果可能過時而不寫入；
+        快取保存結果的深複本，寫入後呼叫端繼續修改 results 也不影響快取"""
+        key = self.make_key(collection_name, query, limit, fields, mode, filter, threshold)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(collection_name, 0):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(results))
+            self._entries.move_to_end(key)
+            self._keys_by_collection.setdefault(collection_name, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, collection_name: str):
+        """清除某集合的所有快取項目（集合內容變更時呼叫）"""
+        with self._lock:
+            for key in self._keys_by_collection.pop(collection_name, set()):
+                self._entries.pop(key, None)
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_collection.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """回傳命中/未命中計數與目前項目數"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+    def _remove(self, key: QueryKey):
+        self._entries.pop(key, None)
+        keys = self._keys_by_collection.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_collection[key[0]]
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Astra DB 本地替身
+以可注入延遲的假客戶端取代 OpenAI、Sentence Transformers 與 Data API 集合，供離線基準測試使用
+"""
+
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from astra_filters import matches
+from astra_vector_codec import decode_vector, vector_matrix
+
+
+def fake_vector(text: str, dimension: int) -> np.ndarray:
+    """依文字內容產生確定性的單位向量（相同文字永遠得到相同向量）"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddingsAPI:
+    """模擬 OpenAI `client.embeddings`，每次呼叫付出一次請求延遲加上逐文字成本"""
+
+    def __init__(self, dimension: int, request_latency: float, per_text_latency: float):
+        self.dimension = dimension
+        self.request_latency = request_latency
+        self.per_text_latency = per_text_latency
+        self.calls = 0
+        self.texts = 0
+
+    def create(self, model: str, input: Union[str, List[str]], **kwargs) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else list(input)
+        time.sleep(self.latency(texts))
+        return self._respond(model, texts, **kwargs)
+
+    def latency(self, texts: List[str]) -> float:
+        return self.request_latency + self.per_text_latency * len(texts)
+
+    def _respond(self, model: str, texts: List[str], **kwargs) -> SimpleNamespace:
+        self.calls += 1
+        self.texts += len(texts)
+        # 與 text-embedding-3 相同：縮短維度等於截斷完整向量後重新正規化；
+        # 完整向量的各維度權重遞減，模擬前段維度攜帶較多資訊的 Matryoshka 表徵
+        dimension = kwargs.get('dimensions') or self.dimension
+        weights = 1.0 / np.sqrt(1.0 + np.arange(dimension, dtype=np.float32) / 64.0)
+        data = []
+        for i, text in enumerate(texts):
+            vector = fake_vector(text, self.dimension)[:dimension] * weights
+            data.append(SimpleNamespace(index=i, embedding=(vector / np.linalg.norm(vector)).tolist()))
+        return SimpleNamespace(data=data, model=model)
+
+
+class FakeOpenAIClient:
+    """模擬 `openai.OpenAI` 客戶端"""
+
+    def __init__(self, dimension: int = 1536, request_latency: float = 0.02, per_text_latency: float = 0.0002):
+        self.embeddings = FakeEmbeddingsAPI(dimension, request_latency, per_text_latency)
+
+
+class FakeAsyncEmbeddingsAPI(FakeEmbeddingsAPI):
+    """模擬 `AsyncOpenAI.embeddings`；blocking=True 時以 time.sleep 重現在協程中呼叫同步客戶端的效果"""
+
+    def __init__(self, dimension: int, request_latency: float, per_text_latency: float, blocking: bool = False):
+        super().__init__(dimension, request_latency, per_text_latency)
+        self.blocking = blocking
+
+    async def create(self, model: str, input: Union[str, List[str]], **kwargs) -> SimpleNamespace:
+        texts = [input] if isinstance(input, str) else list(input)
+        if self.blocking:
+            time.sleep(self.latency(texts))
+        else:
+            await asyncio.sleep(self.latency(texts))
+        return self._respond(model, texts, **kwargs)
+
+
+class FakeAsyncOpenAIClient:
+    """模擬 `openai.AsyncOpenAI` 客戶端"""
+
+    def __init__(self, dimension: int = 1536, request_latency: float = 0.02, per_text_latency: float = 0.0002,
+                 blocking: bool = False):
+        self.embeddings = FakeAsyncEmbeddingsAPI(dimension, request_latency, per_text_latency, blocking)
+
+
+class FakeSentenceTransformer:
+    """模擬 `SentenceTransformer`，每次 encode 付出一次呼叫開銷加上逐文字成本"""
+
+    def __init__(self, dimension: int = 384, call_latency: float = 0.005, per_text_latency: float = 0.0005):
+        self.dimension = dimension
+        self.call_latency = call_latency
+        self.per_text_latency = per_text_latency
+        self.calls = 0
+        self.texts = 0
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.call_latency + self.per_text_latency * len(texts))
+
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        matrix = np.stack([fake_vector(text, self.dimension) for text in texts])
+        return matrix[0] if single else matrix
+
+
+class ThrottledError(Exception):
+    """模擬 Data API 因同時請求過多而拒絕（類似 HTTP 429）"""
+
+
+class DuplicateIdError(Exception):
+    """模擬 astrapy 的 InsertManyException：ordered=False 時其餘文檔照常插入，partial_result 記錄已插入的 _id"""
+
+    def __init__(self, duplicate_ids: List, inserted_ids: List):
+        super().__init__(f"Document already exists with the given _id: {duplicate_ids[:3]}")
+        self.partial_result = SimpleNamespace(inserted_ids=inserted_ids)
+
+
+class FakeCollection:
+    """模擬 Data API 集合：每次 insert_many 付出請求延遲加逐文檔成本，超過容量時拒絕請求，_id 重複時拒絕該文檔；
+    keep_documents=False 時只回應請求、不保存文檔，讓記憶體量測只反映客戶端"""
+
+    def __init__(self, name: str = "documents", request_latency: float = 0.05,
+                 per_doc_latency: float = 0.0005, max_in_flight: int = 0, keep_documents: bool = True):
+        self.name = name
+        self.keep_documents = keep_documents
+        self.request_latency = request_latency
+        self.per_doc_latency = per_doc_latency
+        self.max_in_flight = max_in_flight
+        self.documents: List[dict] = []
+        self.options: dict = {}
+        self._matrix = None
+        self._positions: Dict = {}
+        self.in_flight = 0
+        self.requests = 0
+        self.rejected = 0
+
+    async def insert_many(self, documents: List[dict], **kwargs) -> SimpleNamespace:
+        self.requests += 1
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            raise ThrottledError(f"同時請求數超過 {self.max_in_flight}")
+
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.request_latency + self.per_doc_latency * len(documents))
+            if not self.keep_documents:
+                return SimpleNamespace(inserted_ids=[doc.get("_id") for doc in documents])
+            positions = self._id_positions()
+            duplicates = [doc for doc in documents if doc.get("_id") is not None and doc["_id"] in positions]
+            accepted = [doc for doc in documents if doc.get("_id") is None or doc["_id"] not in positions]
+            self._append_vectors(accepted)
+            for doc in accepted:
+                positions[doc.get("_id")] = len(self.documents)
+                self.documents.append(doc)
+        finally:
+            self.in_flight -= 1
+        inserted_ids = [doc.get("_id") for doc in accepted]
+        if duplicates:
+            raise DuplicateIdError([doc["_id"] for doc in duplicates], inserted_ids)
+        return SimpleNamespace(inserted_ids=inserted_ids)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **kwargs) -> SimpleNamespace:
+        """以 _id 覆寫文檔，upsert=True 時不存在則插入"""
+        self.requests += 1
+        await asyncio.sleep(self.request_latency + self.per_doc_latency)
+        positions = self._id_positions()
+        row = positions.get(filter.get("_id"))
+        if row is not None:
+            self.documents[row] = {**replacement, "_id": filter["_id"]}
+            self._matrix = None
+            return SimpleNamespace(update_info={"n": 1, "updatedExisting": True})
+        if upsert:
+            self._append_vectors([replacement])
+            positions[filter.get("_id")] = len(self.documents)
+            self.documents.append({**replacement, "_id": filter.get("_id")})
+            return SimpleNamespace(update_info={"n": 1, "updatedExisting": False})
+        return SimpleNamespace(update_info={"n": 0, "updatedExisting": False})
+
+    async def delete_many(self, filter: dict, **kwargs) -> SimpleNamespace:
+        """只支援 {"_id": {"$in": [...]}} 篩選"""
+        self.requests += 1
+        await asyncio.sleep(self.request_latency)
+        doc_ids = set(filter.get("_id", {}).get("$in", []))
+        remaining = [doc for doc in self.documents if doc.get("_id") not in doc_ids]
+        deleted_count = len(self.documents) - len(remaining)
+        self.documents = remaining
+        self._matrix = None
+        return SimpleNamespace(deleted_count=deleted_count)
+
+    def _id_positions(self) -> Dict:
+        """_id 到列號的對照；documents 被外部直接替換時重建"""
+        if len(self._positions) != len(self.documents):
+            self._positions = {doc.get("_id"): row for row, doc in enumerate(self.documents)}
+        return self._positions
+
+    def _append_vectors(self, documents: List[dict]):
+        """增量擴充快取的向量矩陣，避免每次插入後重建整個矩陣"""
+        if self._matrix is None or len(self._matrix) != sum('$vector' in doc for doc in self.documents):
+            self._matrix = None
+            return
+        vectors = [doc['$vector'] for doc in documents if '$vector' in doc]
+        if vectors:
+            self._matrix = np.vstack([self._matrix, vector_matrix(vectors)])
+
+    async def vector_find(self, vector: List[float], limit: int = 5, fields: List[str] = None,
+                          filter: Optional[dict] = None, **kwargs) -> List[dict]:
+        """以暴力內積搜索已插入的文檔（伺服器端套用 filter），付出一次請求延遲；$vector 只在 fields 明確要求時回傳"""
+        self.requests += 1
+        await asyncio.sleep(self.request_latency)
+        candidates = [doc for doc in self.documents if '$vector' in doc]
+        if not candidates:
+            return []
+
+        # 快取向量矩陣，避免替身本身的轉換成本掩蓋被量測的延遲
+        if self._matrix is None or len(self._matrix) != len(candidates):
+            self._matrix = vector_matrix([doc['$vector'] for doc in candidates])
+        scores = self._matrix @ decode_vector(vector)
+        if filter:
+            scores = np.where([matches(doc, filter) for doc in candidates], scores, -np.inf)
+            limit = min(limit, int(np.isfinite(scores).sum()))
+        results = []
+        for row in np.argsort(-scores)[:limit]:
+            doc = candidates[row]
+            result = {key: doc[key] for key in (fields or doc) if key in doc and (fields or key != '$vector')}
+            result['score'] = float((1 + scores[row]) / 2)
+            results.append(result)
+        return results
+
+    async def find(self, filter: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        """依 filter 逐頁產生文檔（每頁 20 個，各付出一次請求延遲）；projection 只支援列出要回傳的欄位，
+        省略時與 Data API 相同不回傳 $vector"""
+        documents = [doc for doc in self.documents if not filter or matches(doc, filter)]
+        for start in range(0, len(documents), 20):
+            self.requests += 1
+            await asyncio.sleep(self.request_latency)
+            for doc in documents[start:start + 20]:
+                yield {key: value for key, value in doc.items()
+                       if (projection.get(key) if projection else key != '$vector')}
+
+
+class FakeDatabase:
+    """模擬 Data API 資料庫：創建集合與列出集合各付出一次請求延遲"""
+
+    def __init__(self, request_latency: float = 0.2, collection_latency: float = 0.05,
+                 max_in_flight: int = 0):
+        self.request_latency = request_latency
+        self.collection_latency = collection_latency
+        self.max_in_flight = max_in_flight
+        self.collections: Dict[str, FakeCollection] = {}
+        self.requests = 0
+
+    async def create_collection(self, name: str, **kwargs) -> FakeCollection:
+        self.requests += 1
+        await asyncio.sleep(self.request_latency)
+        if name in self.collections:
+            raise ValueError(f"Collection '{name}' already exists")
+        collection = FakeCollection(name, request_latency=self.collection_latency, max_in_flight=self.max_in_flight)
+        collection.options = kwargs
+        self.collections[name] = collection
+        return collection
+
+    def get_collection(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(
+                name, request_latency=self.collection_latency, max_in_flight=self.max_in_flight
+            )
+        return self.collections[name]
+
+    async def list_collections(self) -> List[SimpleNamespace]:
+        self.requests += 1
+        await asyncio.sleep(self.request_latency)
+        return [SimpleNamespace(name=name, options=collection.options)
+                for name, collection in self.collections.items()]
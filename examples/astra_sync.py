@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目錄同步
+比對來源目錄與匯入清單中記錄的 (路徑, mtime, 大小, 雜湊)，只處理差異：
+新增或修改的檔案分塊後以 upsert 寫入（內容未變的片段不重新嵌入），不再存在的片段以 delete_many 刪除
+"""
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from astra_chunking import chunk_documents
+from astra_ingest import TEXT_FILE_SUFFIXES
+from astra_manifest import IngestManifest, ensure_document_id
+
+
+class SyncPlan:
+    """一次同步要處理的差異"""
+
+    def __init__(self):
+        self.added: List[str] = []
+        self.modified: List[str] = []
+        self.deleted: List[str] = []
+        self.unchanged = 0
+        # 內容未變但 mtime 改變的檔案，只需更新清單
+        self.touched: Dict[str, Dict[str, Any]] = {}
+        # 新增 / 修改檔案的新清單項目與片段
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.chunks: Dict[str, List[Dict[str, Any]]] = {}
+        # 同步前清單中的記錄，用來找出過時的片段
+        self.previous: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.modified or self.deleted or self.touched)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "added": self.added,
+            "modified": self.modified,
+            "deleted": self.deleted,
+            "unchanged": self.unchanged + len(self.touched),
+            "chunks": sum(len(chunks) for chunks in self.chunks.values())
+        }
+
+
+class SyncReport:
+    """同步結果；失敗的檔案不寫入清單，下次同步會再處理"""
+
+    def __init__(self, plan: SyncPlan):
+        self.plan = plan
+        self.upserted_chunks = 0
+        self.skipped_chunks = 0
+        self.deleted_chunks = 0
+        self.failed_files: List[str] = []
+        self.seconds = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed_files
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.plan.to_dict(),
+            "upserted_chunks": self.upserted_chunks,
+            "skipped_chunks": self.skipped_chunks,
+            "deleted_chunks": self.deleted_chunks,
+            "failed_files": self.failed_files,
+            "ok": self.ok,
+            "seconds": self.seconds
+        }
+
+
+class DirectorySync:
+    """將文字檔目錄同步到集合，清單範圍為 集合範圍 + 目錄絕對路徑"""
+
+    def __init__(self, astra_manager, root: str, collection_name: str = "documents",
+                 suffixes: Iterable[str] = TEXT_FILE_SUFFIXES, batch_size: Optional[int] = None,
+                 manifest: Optional[IngestManifest] = None):
+        self.astra_manager = astra_manager
+        self.root = Path(root).resolve()
+        self.collection_name = collection_name
+        self.suffixes = {suffix.lower() for suffix in suffixes}
+        settings = astra_manager.config['astra_db'].get('settings', {})
+        self.batch_size = batch_size or int(settings.get('batch_size', 100))
+        self.manifest = manifest or astra_manager.ingest_manifest or IngestManifest()
+        self.scope = f"{astra_manager.manifest_scope(collection_name)}|{self.root.as_posix()}"
+
+    def scan(self) -> Dict[str, os.stat_result]:
+        """以穩定順序走訪目錄，回傳 相對路徑 → stat"""
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = Path(dirpath) / filename
+                if path.suffix.lower() in self.suffixes:
+                    files[path.relative_to(self.root).as_posix()] = path.stat()
+        return files
+
+    def plan(self) -> SyncPlan:
+        """比對目錄與清單；mtime 與大小都沒變的檔案不讀取內容"""
+        plan = SyncPlan()
+        recorded = self.manifest.files(self.scope)
+        current = self.scan()
+
+        for path, stat in current.items():
+            entry = recorded.get(path)
+            if entry is not None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                plan.unchanged += 1
+                continue
+
+            data = (self.root / path).read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            if entry is not None and entry["hash"] == digest:
+                plan.touched[path] = {**entry, "mtime": stat.st_mtime, "size": stat.st_size}
+                continue
+            try:
+                text = data.decode('utf-8')
+            except UnicodeDecodeError:
+                print(f"⚠️  {path} 不是 UTF-8 文字檔，已略過")
+                continue
+
+            chunks = self._chunk(path, text)
+            (plan.modified if entry is not None else plan.added).append(path)
+            plan.chunks[path] = chunks
+            plan.entries[path] = {
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "hash": digest,
+                "doc_ids": [chunk['_id'] for chunk in chunks]
+            }
+
+        plan.deleted = sorted(set(recorded) - set(current))
+        plan.previous = recorded
+        return plan
+
+    async def run(self, dry_run: bool = False) -> SyncReport:
+        """執行同步：先 upsert 新片段，再刪除過時片段，最後才更新清單"""
+        start = time.perf_counter()
+        plan = self.plan()
+        report = SyncReport(plan)
+        if dry_run or not plan.has_changes:
+            report.seconds = time.perf_counter() - start
+            return report
+
+        self.manifest.record_files(self.scope, plan.touched)
+
+        # 逐批 upsert，批次以檔案為單位，讓每個檔案的片段同批成功或失敗
+        synced: List[str] = []
+        for paths in self._file_batches(plan):
+            chunks = [chunk for path in paths for chunk in plan.chunks[path]]
+            if not chunks:  # 只剩空白的檔案：沒有片段要寫入，舊片段在下面刪除
+                synced.extend(paths)
+                continue
+            result = await self.astra_manager.insert_documents(chunks, self.collection_name)
+            report.upserted_chunks += result.inserted
+            report.skipped_chunks += result.skipped
+            if result.ok:
+                synced.extend(paths)
+            else:
+                report.failed_files.extend(paths)
+
+        # 修改檔案不再出現的片段，以及刪除檔案的全部片段
+        synced_modified = set(synced) & set(plan.modified)
+        stale_ids = set()
+        for path in synced_modified:
+            stale_ids.update(set(plan.previous[path]["doc_ids"]) - set(plan.entries[path]["doc_ids"]))
+        for path in plan.deleted:
+            stale_ids.update(plan.previous[path]["doc_ids"])
+
+        deleted = await self.astra_manager.delete_documents(sorted(stale_ids, key=str), self.collection_name)
+        if deleted:
+            report.deleted_chunks = len(stale_ids)
+            self.manifest.forget_files(self.scope, plan.deleted)
+        else:
+            # 過時片段尚未刪除：修改的檔案保留舊記錄，下次同步再處理（未變的片段會被略過，不重新嵌入）
+            report.failed_files.extend(sorted(synced_modified))
+            report.failed_files.extend(plan.deleted)
+            synced = [path for path in synced if path not in synced_modified]
+
+        self.manifest.record_files(self.scope, {path: plan.entries[path] for path in synced})
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def _chunk(self, path: str, text: str) -> List[Dict[str, Any]]:
+        """以 AstraDBManager 的分塊器切分（與 insert_documents 相同，片段不會被再次切分），片段以內容雜湊作為 _id"""
+        if not text.strip():
+            return []
+        chunks = [{"text": text, "metadata": {"source": path}}]
+        if self.astra_manager.chunker is not None:
+            chunks = list(chunk_documents(chunks, self.astra_manager.chunker))
+        for chunk in chunks:
+            ensure_document_id(chunk)
+        return chunks
+
+    def _file_batches(self, plan: SyncPlan) -> Iterable[List[str]]:
+        batch, size = [], 0
+        for path in plan.added + plan.modified:
+            batch.append(path)
+            size += len(plan.chunks[path])
+            if size >= self.batch_size:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
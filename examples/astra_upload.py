@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+並行上傳
+將文檔切成多個 insert_many 區塊，以 asyncio.Semaphore 限制同時進行的請求數，
+失敗的區塊以指數退避加隨機抖動重試，並回傳逐區塊的結果報告；
+upsert 模式下已存在的 _id 以 replace_one 覆寫，重複執行不會產生重複文檔；
+刪除同樣分區塊並行呼叫 delete_many
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Collection, Dict, List, Optional, Sequence, Set
+
+
+class ChunkResult:
+    """單一 insert_many 區塊的結果"""
+
+    def __init__(self, index: int, offset: int, size: int):
+        self.index = index
+        self.offset = offset
+        self.size = size
+        self.attempts = 0
+        self.ok = False
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "offset": self.offset,
+            "size": self.size,
+            "attempts": self.attempts,
+            "ok": self.ok,
+            "error": self.error,
+            "seconds": self.seconds
+        }
+
+
+class InsertReport:
+    """insert_documents 的結果報告，可直接當作布林值判斷是否全部成功"""
+
+    def __init__(self, collection_name: str, error: Optional[str] = None):
+        self.collection_name = collection_name
+        self.error = error
+        self.chunks: List[ChunkResult] = []
+        self.skipped = 0
+        self.seconds = 0.0
+
+    @property
+    def inserted(self) -> int:
+        return sum(chunk.size for chunk in self.chunks if chunk.ok)
+
+    @property
+    def failed(self) -> int:
+        return sum(chunk.size for chunk in self.chunks if not chunk.ok)
+
+    @property
+    def failed_chunks(self) -> List[ChunkResult]:
+        return [chunk for chunk in self.chunks if not chunk.ok]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.failed_chunks
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection_name,
+            "ok": self.ok,
+            "error": self.error,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "seconds": self.seconds,
+            "chunks": [chunk.to_dict() for chunk in self.chunks]
+        }
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """指數退避加完整抖動 (full jitter): 0 ~ min(max_delay, base_delay * 2^attempt)"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def inserted_ids_from_error(error: Exception) -> Optional[Set[Any]]:
+    """從 insert_many 的部分失敗例外取出已插入的 _id（astrapy 1.x 為 partial_result.inserted_ids，
+    2.x 為 inserted_ids）；不是部分失敗的例外（逾時、節流）回傳 None"""
+    partial_result = getattr(error, "partial_result", None)
+    inserted_ids = getattr(partial_result, "inserted_ids", None)
+    if inserted_ids is None:
+        inserted_ids = getattr(error, "inserted_ids", None)
+    return set(inserted_ids) if inserted_ids is not None else None
+
+
+async def upsert_many(collection, documents: List[Dict[str, Any]], existing_ids: Collection[Any] = ()):
+    """新文檔以一次 insert_many(ordered=False) 送出；已知存在、或插入時 _id 衝突的文檔以 replace_one(upsert=True) 覆寫。
+
+    整個操作可重複執行：重試時已寫入的文檔只會被相同內容覆寫
+    """
+    replacements = [doc for doc in documents if doc.get('_id') in existing_ids]
+    new_documents = [doc for doc in documents if doc.get('_id') not in existing_ids]
+    if new_documents:
+        try:
+            await collection.insert_many(new_documents, ordered=False)
+        except Exception as e:
+            inserted = inserted_ids_from_error(e)
+            if inserted is None:
+                raise
+            replacements.extend(doc for doc in new_documents if doc.get('_id') not in inserted)
+    if replacements:
+        await asyncio.gather(*(
+            collection.replace_one({"_id": doc['_id']}, doc, upsert=True) for doc in replacements
+        ))
+
+
+async def insert_many_concurrently(collection, documents: Sequence[Dict[str, Any]], collection_name: str,
+                                   chunk_size: int = 20, concurrency: int = 4, max_retries: int = 3,
+                                   timeout: Optional[float] = 30, base_delay: float = 0.5,
+                                   max_delay: float = 10.0, upsert: bool = False,
+                                   existing_ids: Collection[Any] = ()) -> InsertReport:
+    """分區塊並行呼叫 collection.insert_many（upsert=True 時改用 upsert_many），回傳逐區塊結果。
+
+    區塊在取得並行名額後才從 documents 切出，documents 為 DocumentBatch.wire() 這類延遲產生 dict 的序列時，
+    同一時間只有進行中的區塊存在於記憶體
+    """
+    report = InsertReport(collection_name)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    chunk_size = max(1, chunk_size)
+
+    async def upload(result: ChunkResult):
+        async with semaphore:
+            chunk = documents[result.offset:result.offset + result.size]
+            start = time.perf_counter()
+            for attempt in range(max_retries + 1):
+                result.attempts += 1
+                try:
+                    if upsert:
+                        await asyncio.wait_for(upsert_many(collection, chunk, existing_ids), timeout)
+                    else:
+                        await asyncio.wait_for(collection.insert_many(chunk), timeout)
+                    result.ok = True
+                    result.error = None
+                    break
+                except Exception as e:
+                    result.error = f"{type(e).__name__}: {e}"
+                    if attempt < max_retries:
+                        await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+            result.seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tasks = []
+    for index, offset in enumerate(range(0, len(documents), chunk_size)):
+        result = ChunkResult(index, offset, min(chunk_size, len(documents) - offset))
+        report.chunks.append(result)
+        tasks.append(upload(result))
+
+    await asyncio.gather(*tasks)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+async def delete_many_concurrently(collection, doc_ids: List[Any], chunk_size: int = 100, concurrency: int = 4,
+                                   max_retries: int = 3, timeout: Optional[float] = 30, base_delay: float = 0.5,
+                                   max_delay: float = 10.0) -> int:
+    """依 _id 分區塊並行呼叫 collection.delete_many（Data API 的 $in 每次最多 100 個值），回傳刪除數。
+
+    刪除可安全重試；任一區塊重試用盡時拋出最後的例外
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    chunk_size = max(1, chunk_size)
+
+    async def delete(chunk: List[Any]) -> int:
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                try:
+                    result = await asyncio.wait_for(collection.delete_many({"_id": {"$in": chunk}}), timeout)
+                    return getattr(result, "deleted_count", 0) or 0
+                except Exception:
+                    if attempt >= max_retries:
+                        raise
+                    await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+        return 0
+
+    counts = await asyncio.gather(*(
+        delete(doc_ids[offset:offset + chunk_size]) for offset in range(0, len(doc_ids), chunk_size)
+    ))
+    return sum(counts)
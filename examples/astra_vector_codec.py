@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量傳輸編碼
+Data API 接受 {"$binary": "<base64>"} 形式的 $vector：大端序 float32 緊密排列後以 base64 編碼，
+每維固定 4 位元組 × 4/3，取代每維約 20 個字元的十進位 JSON 陣列；整批向量由 NumPy 緩衝區一次轉換，
+不需逐一格式化浮點數，伺服器端也不必解析十進位文字
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+VECTOR_ENCODINGS = ("binary", "json")
+
+# Data API 的二進位向量為大端序 float32（NumPy 在第一次編解碼時才匯入，不拖慢匯入管理器的冷啟動）
+WIRE_DTYPE = ">f4"
+
+
+def encode_vector(vector: Any) -> Dict[str, str]:
+    """單一向量 → {"$binary": base64}"""
+    import numpy as np
+    return {"$binary": base64.b64encode(np.asarray(vector, dtype=WIRE_DTYPE).tobytes()).decode("ascii")}
+
+
+def encode_matrix(vectors: "np.ndarray") -> List[Dict[str, str]]:
+    """(n, dimension) 矩陣一次轉成大端序緩衝區，再逐列切片編碼"""
+    import numpy as np
+    vectors = np.ascontiguousarray(vectors, dtype=WIRE_DTYPE)
+    if vectors.ndim != 2:
+        raise ValueError("向量矩陣必須是二維")
+    buffer = memoryview(vectors.tobytes())
+    row_bytes = vectors.shape[1] * vectors.itemsize
+    return [
+        {"$binary": base64.b64encode(buffer[start:start + row_bytes]).decode("ascii")}
+        for start in range(0, len(buffer), row_bytes)
+    ]
+
+
+def is_binary_vector(value: Any) -> bool:
+    return isinstance(value, dict) and "$binary" in value
+
+
+def decode_vector(value: Any) -> "np.ndarray":
+    """$vector 欄位（JSON 陣列或 {"$binary": ...}）→ 原生位元組序的 float32 向量"""
+    import numpy as np
+    if is_binary_vector(value):
+        return np.frombuffer(base64.b64decode(value["$binary"]), dtype=WIRE_DTYPE).astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def vector_matrix(values: Sequence[Any]) -> "np.ndarray":
+    """一批 $vector 欄位 → (n, dimension) float32 矩陣；全部是 JSON 陣列時直接轉換"""
+    import numpy as np
+    if not any(is_binary_vector(value) for value in values):
+        return np.asarray(values, dtype=np.float32)
+    return np.stack([decode_vector(value) for value in values])
+
+
+def encode_document_vectors(documents: Sequence[Dict[str, Any]], encoding: str = "binary") -> int:
+    """把文檔中仍為 JSON 陣列的 $vector 就地改為二進位形式，回傳轉換的數量；encoding 為 json 時不變"""
+    if encoding not in VECTOR_ENCODINGS:
+        raise ValueError(f"不支援的向量編碼: {encoding}")
+    if encoding == "json":
+        return 0
+    pending = [doc for doc in documents if '$vector' in doc and not is_binary_vector(doc['$vector'])]
+    if not pending:
+        return 0
+    import numpy as np
+    for doc, encoded in zip(pending, encode_matrix(np.asarray([doc['$vector'] for doc in pending], dtype=np.float32))):
+        doc['$vector'] = encoded
+    return len(pending)
+
+
+def wire_vector(vector: Any, encoding: Optional[str] = "binary") -> Any:
+    """查詢向量的傳輸形式（vector_find 的排序向量）"""
+    if encoding == "json" or is_binary_vector(vector):
+        return vector
+    return encode_vector(vector)
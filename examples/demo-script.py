@@ -12,6 +12,8 @@ import os
 from typing import Dict, Any, List
 from datetime import datetime
 
+from astra_metrics import LatencyMetrics
+
 class LangflowMCPDemo:
     """Langflow MCP 案例演示類"""
     
@@ -22,6 +24,7 @@ class LangflowMCPDemo:
         self.api_url = f"{self.base_url}/api/v1"
         self.mcp_url = f"{self.base_url}/mcp"
         self.session = requests.Session()
+        self.metrics = LatencyMetrics(namespace="langflow_demo")
     
     def check_server_status(self) -> bool:
         """檢查 Langflow 伺服器狀態"""
@@ -53,13 +56,16 @@ class LangflowMCPDemo:
                 "inputs": inputs,
                 "tweaks": {}
             }
-            response = self.session.post(
-                f"{self.api_url}/flows/{flow_id}/run",
-                json=payload,
-                timeout=60
-            )
+            # 流程執行（含伺服器端的向量搜索與 LLM 呼叫）與回應 JSON 解碼分開計時
+            with self.metrics.time("flow_run", flow=str(flow_id)):
+                response = self.session.post(
+                    f"{self.api_url}/flows/{flow_id}/run",
+                    json=payload,
+                    timeout=60
+                )
             if response.status_code == 200:
-                return response.json()
+                with self.metrics.time("flow_decode", flow=str(flow_id)):
+                    return response.json()
             else:
                 return {"error": f"HTTP {response.status_code}: {response.text}"}
         except requests.exceptions.RequestException as e:
@@ -154,6 +160,18 @@ class LangflowMCPDemo:
             
             print("-" * 30)
             time.sleep(1)  # 避免請求過於頻繁
+        
+        self.show_latency_summary()
+    
+    def show_latency_summary(self, prometheus_path: str = "examples/demo-metrics.prom") -> None:
+        """顯示流程執行各階段的延遲分佈，並寫出 Prometheus 文字格式"""
+        print("\n⏱️  流程延遲統計")
+        print("=" * 50)
+        for series in self.metrics.summary():
+            print(f"   - {series['stage']:<12} {series['count']} 次, "
+                  f"p50 {series['p50_ms']:.0f} ms, p95 {series['p95_ms']:.0f} ms, p99 {series['p99_ms']:.0f} ms")
+        self.metrics.write_prometheus(prometheus_path)
+        print(f"📁 Prometheus 指標已保存到: {prometheus_path}")
     
     def demonstrate_mcp_tools(self) -> None:
         """演示 MCP 工具功能"""
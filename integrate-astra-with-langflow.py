@@ -203,11 +203,16 @@ Astra DB 設置腳本
 為 Langflow 流程準備 Astra DB 數據
 """
 
+import os
+import sys
 import asyncio
 import json
-from astrapy import DataAPIClient
+from pathlib import Path
 from openai import OpenAI
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "examples"))
+from astra_client import get_client_factory
+
 # 配置
 ASTRA_DB_ID = "ef4581e5-f997-44ce-8432-e56636786548"
 CHATGPT_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY_HERE")
@@ -225,18 +230,18 @@ async def setup_astra_for_langflow():
     
     try:
         # 連接到 Astra DB
-        client = DataAPIClient(token)
-        database = client.get_database(ASTRA_DB_ID)
+        client_factory = get_client_factory(token)
+        database = client_factory.get_async_database(ASTRA_DB_ID)
         
         # 創建集合
         collection_name = "langflow_documents"
         print(f"📦 創建集合: {collection_name}")
         
-        collection = await database.create_collection(
+        collection = client_factory.cache_collection(ASTRA_DB_ID, await database.create_collection(
             collection_name,
             dimension=1536,  # OpenAI 嵌入維度
             metric="cosine"
-        )
+        ), asynchronous=True)
         
         # 設置 OpenAI 客戶端
         openai_client = OpenAI(api_key=CHATGPT_API_KEY)
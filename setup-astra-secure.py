@@ -6,12 +6,20 @@
 """
 
 import os
+import sys
 import json
 import asyncio
 from pathlib import Path
-from astrapy import DataAPIClient
 from openai import OpenAI
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "examples"))
+from astra_client import get_client_factory
+from astra_collections import ensure_collections
+from astra_embedding_cache import EmbeddingCache
+from astra_manifest import IngestManifest, content_hash, ensure_document_id
+from astra_upload import upsert_many
+from astra_vector_codec import encode_document_vectors, wire_vector
+
 # 您的配置
 ASTRA_DB_ID = "ef4581e5-f997-44ce-8432-e56636786548"
 CHATGPT_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY_HERE")
@@ -68,8 +76,8 @@ async def setup_astra_database():
     try:
         # 連接到 Astra DB
         print("📡 連接到 Astra DB...")
-        client = DataAPIClient(token)
-        database = client.get_database(ASTRA_DB_ID)
+        client_factory = get_client_factory(token)
+        database = client_factory.get_async_database(ASTRA_DB_ID)
         
         # 測試連接
         print("✅ 成功連接到 Astra DB!")
@@ -81,23 +89,26 @@ async def setup_astra_database():
         print(f"   - 區域: {info.get('region', 'N/A')}")
         print(f"   - 狀態: {info.get('status', 'N/A')}")
         
-        # 創建集合
+        # 創建集合（一次 list_collections 判斷是否已存在，已存在時檢查維度與度量）
         collection_name = "langflow_documents"
         print(f"\n📦 創建集合: {collection_name}")
         
-        try:
-            collection = await database.create_collection(
-                collection_name,
-                dimension=1536,  # OpenAI 嵌入維度
-                metric="cosine"
-            )
+        setup = await ensure_collections(
+            database,
+            # 1536 為 OpenAI 嵌入維度
+            {collection_name: {"name": collection_name, "dimension": 1536, "vector_metric": "cosine"}},
+            get_collection=lambda name: client_factory.get_async_collection(ASTRA_DB_ID, name)
+        )
+        if not setup:
+            reason = setup.error or setup.failed.get(collection_name) or "；".join(setup.mismatched[collection_name])
+            print(f"❌ 集合 '{collection_name}' 無法使用: {reason}")
+            return False
+        collection = setup.collections[collection_name]
+        if collection_name in setup.created:
+            client_factory.cache_collection(ASTRA_DB_ID, collection, asynchronous=True)
             print(f"✅ 集合 '{collection_name}' 創建成功")
-        except Exception as e:
-            if "already exists" in str(e).lower():
-                print(f"ℹ️  集合 '{collection_name}' 已存在")
-                collection = database.get_collection(collection_name)
-            else:
-                raise e
+        else:
+            print(f"ℹ️  集合 '{collection_name}' 已存在")
         
         # 設置 OpenAI 客戶端
         print("\n🤖 設置 OpenAI 客戶端...")
@@ -122,31 +133,55 @@ async def setup_astra_database():
             }
         ]
         
-        # 為文檔生成嵌入向量
-        print("🔄 生成嵌入向量...")
-        for doc in sample_docs:
+        # 嵌入快取：重複執行時已嵌入過的文字不再呼叫 OpenAI
+        embedding_cache = EmbeddingCache()
+        
+        def embed_batch(texts):
             response = openai_client.embeddings.create(
                 model="text-embedding-3-small",
-                input=doc["text"]
+                input=texts
             )
-            doc["$vector"] = response.data[0].embedding
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        
+        # 以內容雜湊作為 _id，匯入清單中內容未變更的文檔不再嵌入與上傳
+        manifest = IngestManifest()
+        manifest_scope = f"{ASTRA_DB_ID}/{collection_name}/text-embedding-3-small:1536"
+        hashes = {}
+        for doc in sample_docs:
+            digest = content_hash(doc)
+            hashes[ensure_document_id(doc, digest)] = digest
+        stored = manifest.lookup(manifest_scope, hashes)
+        pending_docs = [doc for doc in sample_docs if stored.get(doc["_id"]) != hashes[doc["_id"]]]
         
-        # 插入文檔
-        print("📝 插入文檔到 Astra DB...")
-        result = await collection.insert_many(sample_docs)
-        print(f"✅ 成功插入 {len(sample_docs)} 個文檔")
+        if pending_docs:
+            # 為文檔生成嵌入向量
+            print("🔄 生成嵌入向量...")
+            vectors = embedding_cache.get_or_embed(
+                "text-embedding-3-small", 1536, [doc["text"] for doc in pending_docs], embed_batch
+            )
+            for doc, vector in zip(pending_docs, vectors):
+                doc["$vector"] = vector
+            # 以 base64 打包的 float32 傳輸向量，請求比十進位 JSON 陣列小數倍
+            encode_document_vectors(pending_docs)
+            
+            # 以 upsert 寫入，重複執行不會產生重複文檔
+            print("📝 寫入文檔到 Astra DB...")
+            await upsert_many(collection, pending_docs, existing_ids=set(stored))
+            manifest.record(manifest_scope, {doc["_id"]: hashes[doc["_id"]] for doc in pending_docs})
+            print(f"✅ 成功寫入 {len(pending_docs)} 個文檔（略過 {len(sample_docs) - len(pending_docs)} 個未變更文檔）")
+        else:
+            print(f"ℹ️  {len(sample_docs)} 個文檔皆未變更，略過嵌入與上傳")
+        manifest.close()
         
         # 測試搜索
         print("\n🔍 測試向量搜索...")
         test_query = "什麼是 Langflow？"
-        query_response = openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=test_query
-        )
-        query_vector = query_response.data[0].embedding
+        query_vector = embedding_cache.get_or_embed(
+            "text-embedding-3-small", 1536, [test_query], embed_batch
+        )[0]
         
         search_results = await collection.vector_find(
-            query_vector,
+            wire_vector(query_vector),
             limit=2,
             fields=["text", "metadata"]
         )
@@ -158,6 +193,10 @@ async def setup_astra_database():
             print(f"   元數據: {result.get('metadata', {})}")
             print()
         
+        stats = embedding_cache.stats()
+        print(f"💾 嵌入快取: 命中 {stats['memory_hits'] + stats['disk_hits']}, 未命中 {stats['misses']}")
+        embedding_cache.close()
+        
         print("🎉 Astra DB 設置完成！")
         print("現在您可以在 Langflow 中使用這個向量數據庫了。")
         
@@ -5,9 +5,13 @@ Astra DB 連接測試腳本
 快速測試您的 Astra DB 是否正常工作
 """
 
+import sys
 import json
 import asyncio
-from astrapy import DataAPIClient
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "examples"))
+from astra_client import get_client_factory
 
 async def test_astra_connection():
     """測試 Astra DB 連接"""
@@ -26,8 +30,7 @@ async def test_astra_connection():
     try:
         # 創建客戶端
         print("📡 連接到 Astra DB...")
-        client = DataAPIClient(token)
-        database = client.get_database(database_id)
+        database = get_client_factory(token).get_async_database(database_id)
         
         # 測試連接
         print("✅ 成功連接到 Astra DB!")
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""astra_lexical 分詞與 BM25 索引的回歸測試"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "examples"))
+
+from astra_lexical import BM25Index, tokenize
+
+
+def test_tokenize_splits_identifiers_after_token_without_alphanumerics():
+    # 沒有英數字組成部分的詞（__）不應關閉之後識別碼的拆分
+    tokens = tokenize("__ user_id ERR-1042")
+    assert tokens == ["__", "user_id", "user", "id", "err-1042", "err", "1042"]
+
+
+def test_tokenize_without_parts_keeps_whole_identifiers():
+    assert tokenize("__ user_id ERR-1042", parts=False) == ["__", "user_id", "err-1042"]
+
+
+def test_bm25_finds_identifier_part_after_token_without_alphanumerics():
+    index = BM25Index()
+    index.add([{"_id": "a", "text": "__ user_id ERR-1042"}, {"_id": "b", "text": "機器學習"}])
+    assert [hit["_id"] for hit in index.search("1042")] == ["a"]